@@ -0,0 +1,61 @@
+"""create file_data table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Les bases existantes ont été créées au démarrage de l'application
+    # (ancien create_tables_if_not_exist): on les adopte telles quelles
+    if sa.inspect(op.get_bind()).has_table("file_data"):
+        return
+
+    op.create_table(
+        "file_data",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("reference", sa.String(), nullable=True),
+        sa.Column("id_lin", sa.String(), nullable=True),
+        sa.Column("id_ccu", sa.String(), nullable=True),
+        sa.Column("etat", sa.String(), nullable=True),
+        sa.Column("creation", sa.String(), nullable=True),
+        sa.Column("mise_a_jour", sa.String(), nullable=True),
+        sa.Column("idrh", sa.String(), nullable=True),
+        sa.Column("device_id", sa.String(), nullable=True),
+        sa.Column("retour_metier", sa.String(), nullable=True),
+        sa.Column("commentaires_cloture", sa.String(), nullable=True),
+        sa.Column("nom_bureau_poste", sa.String(), nullable=True),
+        sa.Column("regate", sa.String(), nullable=True),
+        sa.Column("source", sa.String(), nullable=True),
+        sa.Column("solution_scan", sa.String(), nullable=True),
+        sa.Column("rg", sa.String(), nullable=True),
+        sa.Column("ruo", sa.String(), nullable=True),
+        sa.Column("file_name", sa.String(), nullable=True),
+        sa.Column("import_date", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_file_data_id", "file_data", ["id"])
+    op.create_index("ix_file_data_reference", "file_data", ["reference"])
+    op.create_index("ix_file_data_file_name", "file_data", ["file_name"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_file_data_file_name", table_name="file_data")
+    op.drop_index("ix_file_data_reference", table_name="file_data")
+    op.drop_index("ix_file_data_id", table_name="file_data")
+    op.drop_table("file_data")
@@ -0,0 +1,78 @@
+"""dictionary encoding of low-cardinality file_data columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Figé ici pour que la migration ne dépende pas du code de l'application
+DICTIONARY_COLUMNS = [
+    "etat",
+    "source",
+    "solution_scan",
+    "regate",
+    "rg",
+    "ruo",
+    "nom_bureau_poste",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in DICTIONARY_COLUMNS:
+        op.create_table(
+            f"dict_{column}",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("value", sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("value"),
+        )
+        op.add_column("file_data", sa.Column(f"{column}_id", sa.Integer(), nullable=True))
+
+        # Dictionnaire des valeurs existantes
+        op.execute(
+            f"INSERT INTO dict_{column} (value) "
+            f"SELECT DISTINCT {column} FROM file_data WHERE {column} IS NOT NULL"
+        )
+
+    # Une seule réécriture de la table pour toutes les colonnes
+    assignments = ", ".join(
+        f"{column}_id = (SELECT d.id FROM dict_{column} d WHERE d.value = file_data.{column})"
+        for column in DICTIONARY_COLUMNS
+    )
+    op.execute(f"UPDATE file_data SET {assignments}")
+
+    for column in DICTIONARY_COLUMNS:
+        op.create_foreign_key(
+            f"fk_file_data_{column}_id", "file_data", f"dict_{column}", [f"{column}_id"], ["id"]
+        )
+        op.drop_column("file_data", column)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in DICTIONARY_COLUMNS:
+        op.add_column("file_data", sa.Column(column, sa.String(), nullable=True))
+
+    assignments = ", ".join(
+        f"{column} = (SELECT d.value FROM dict_{column} d WHERE d.id = file_data.{column}_id)"
+        for column in DICTIONARY_COLUMNS
+    )
+    op.execute(f"UPDATE file_data SET {assignments}")
+
+    for column in DICTIONARY_COLUMNS:
+        op.drop_constraint(f"fk_file_data_{column}_id", "file_data", type_="foreignkey")
+        op.drop_column("file_data", f"{column}_id")
+        op.drop_table(f"dict_{column}")
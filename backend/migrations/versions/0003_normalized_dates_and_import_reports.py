@@ -0,0 +1,131 @@
+"""typed creation dates, canonical dictionary values and import quality reports
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Figé ici pour que la migration ne dépende pas du code de l'application
+DICTIONARY_COLUMNS = [
+    "etat",
+    "source",
+    "solution_scan",
+    "regate",
+    "rg",
+    "ruo",
+    "nom_bureau_poste",
+]
+
+TEXT_COLUMNS = [
+    "reference", "id_lin", "id_ccu", "creation", "mise_a_jour", "idrh",
+    "device_id", "retour_metier", "commentaires_cloture",
+]
+
+# Même règle que src.utils.normalization.parse_dates: DD/MM/YYYY ou ISO,
+# NULL pour une date absente ou invalide (sans faire échouer la migration)
+SAFE_DATE_FUNCTION = r"""
+CREATE FUNCTION pg_temp.parse_import_date(value text) RETURNS date AS $$
+BEGIN
+    value := btrim(value);
+    IF value ~ '^\d{2}/\d{2}/\d{4}' THEN
+        RETURN to_date(substring(value, 1, 10), 'DD/MM/YYYY');
+    ELSIF value ~ '^\d{4}-\d{2}-\d{2}' THEN
+        RETURN to_date(substring(value, 1, 10), 'YYYY-MM-DD');
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("file_data", sa.Column("creation_date", sa.Date(), nullable=True))
+    op.add_column("file_data", sa.Column("mise_a_jour_date", sa.Date(), nullable=True))
+
+    # Nombre d'utilisations de chaque code, en un seul parcours de la table
+    op.execute(f"""
+        CREATE TEMPORARY TABLE dict_usage ON COMMIT DROP AS
+        SELECT {", ".join(f"{column}_id, GROUPING({column}_id) AS grouping_{column}" for column in DICTIONARY_COLUMNS)},
+            COUNT(*) AS usage
+        FROM file_data
+        GROUP BY GROUPING SETS ({", ".join(f"({column}_id)" for column in DICTIONARY_COLUMNS)})
+    """)
+
+    # Variantes de casse/espaces des dictionnaires: la valeur la plus utilisée
+    # devient canonique, les valeurs vides deviennent NULL
+    for column in DICTIONARY_COLUMNS:
+        op.execute(f"""
+            CREATE TEMPORARY TABLE remap_{column} ON COMMIT DROP AS
+            SELECT id, CASE WHEN key = '' THEN NULL ELSE first_value(id) OVER (
+                PARTITION BY key ORDER BY usage DESC, id
+            ) END AS canonical
+            FROM (
+                SELECT d.id, lower(regexp_replace(btrim(d.value), '\\s+', ' ', 'g')) AS key, COALESCE(u.usage, 0) AS usage
+                FROM dict_{column} d
+                LEFT JOIN dict_usage u ON u.grouping_{column} = 0 AND u.{column}_id = d.id
+            ) keys
+        """)
+        op.execute(f"DELETE FROM remap_{column} WHERE canonical = id")
+
+    op.execute(SAFE_DATE_FUNCTION)
+
+    # Une seule réécriture de la table pour les dates, les codes et les textes
+    assignments = [
+        "creation_date = pg_temp.parse_import_date(creation)",
+        "mise_a_jour_date = pg_temp.parse_import_date(mise_a_jour)",
+    ]
+    assignments += [
+        f"{column}_id = CASE WHEN {column}_id IN (SELECT id FROM remap_{column}) "
+        f"THEN (SELECT canonical FROM remap_{column} r WHERE r.id = {column}_id) ELSE {column}_id END"
+        for column in DICTIONARY_COLUMNS
+    ]
+    assignments += [f"{column} = NULLIF(btrim({column}), '')" for column in TEXT_COLUMNS]
+    op.execute(f"UPDATE file_data SET {', '.join(assignments)}")
+
+    for column in DICTIONARY_COLUMNS:
+        op.execute(f"DELETE FROM dict_{column} WHERE id IN (SELECT id FROM remap_{column})")
+        op.execute(f"UPDATE dict_{column} SET value = regexp_replace(btrim(value), '\\s+', ' ', 'g')")
+        op.create_index(
+            f"ix_dict_{column}_lower_value", f"dict_{column}", [sa.text("lower(value)")], unique=True
+        )
+
+    op.create_index("ix_file_data_creation_date", "file_data", ["creation_date"])
+
+    op.create_table(
+        "import_reports",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("file_name", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("total_rows", sa.Integer(), nullable=False),
+        sa.Column("invalid_rows", sa.Integer(), nullable=False),
+        sa.Column("report", sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_import_reports_file_name", "import_reports", ["file_name"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Le nettoyage des valeurs n'est pas annulé
+    op.drop_index("ix_import_reports_file_name", table_name="import_reports")
+    op.drop_table("import_reports")
+    for column in DICTIONARY_COLUMNS:
+        op.drop_index(f"ix_dict_{column}_lower_value", table_name=f"dict_{column}")
+    op.drop_index("ix_file_data_creation_date", table_name="file_data")
+    op.drop_column("file_data", "mise_a_jour_date")
+    op.drop_column("file_data", "creation_date")
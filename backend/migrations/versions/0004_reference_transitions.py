@@ -0,0 +1,75 @@
+"""reference state history (reference_transitions)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Figé ici (même calcul que src.utils.history) pour que la migration ne
+# dépende pas du code de l'application
+BACKFILL_SQL = """
+INSERT INTO reference_transitions (
+    reference, sequence, file_data_id, file_name, from_etat_id, to_etat_id, transition_date
+)
+SELECT
+    reference,
+    row_number() OVER (PARTITION BY reference ORDER BY observation),
+    id, file_name, from_etat_id, to_etat_id, observed_date
+FROM (
+    SELECT
+        id, reference, file_name, observed_date,
+        etat_id AS to_etat_id,
+        LAG(etat_id) OVER observations AS from_etat_id,
+        row_number() OVER observations AS observation
+    FROM (
+        SELECT
+            id, reference, file_name, etat_id,
+            COALESCE(mise_a_jour_date, creation_date, CAST(import_date AS DATE)) AS observed_date
+        FROM file_data
+        WHERE reference IS NOT NULL
+    ) observed
+    WINDOW observations AS (PARTITION BY reference ORDER BY observed_date, id)
+) ordered
+WHERE observation = 1 OR from_etat_id IS DISTINCT FROM to_etat_id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "reference_transitions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("reference", sa.String(), nullable=False),
+        sa.Column("sequence", sa.Integer(), nullable=False),
+        sa.Column("file_data_id", sa.Integer(), nullable=False),
+        sa.Column("file_name", sa.String(), nullable=True),
+        sa.Column("from_etat_id", sa.Integer(), nullable=True),
+        sa.Column("to_etat_id", sa.Integer(), nullable=True),
+        sa.Column("transition_date", sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Historique des données déjà importées, index créés ensuite (chargement plus rapide)
+    op.execute(BACKFILL_SQL)
+    op.create_index(
+        "ix_reference_transitions_reference_date", "reference_transitions", ["reference", "transition_date"]
+    )
+    op.create_index("ix_reference_transitions_date", "reference_transitions", ["transition_date"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_reference_transitions_date", table_name="reference_transitions")
+    op.drop_index("ix_reference_transitions_reference_date", table_name="reference_transitions")
+    op.drop_table("reference_transitions")
@@ -0,0 +1,49 @@
+"""exact dictionary values (non-unique lower(value) index)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-20 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Figé ici pour que la migration ne dépende pas du code de l'application
+DICTIONARY_COLUMNS = [
+    "etat",
+    "source",
+    "solution_scan",
+    "regate",
+    "rg",
+    "ruo",
+    "nom_bureau_poste",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Les codes correspondent exactement aux valeurs (contrainte unique sur
+    # value): l'index sur lower(value) ne sert plus qu'à la recherche des
+    # variantes de casse lors de la normalisation des imports
+    for column in DICTIONARY_COLUMNS:
+        op.drop_index(f"ix_dict_{column}_lower_value", table_name=f"dict_{column}")
+        op.create_index(f"ix_dict_{column}_lower_value", f"dict_{column}", [sa.text("lower(value)")])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Échoue si deux variantes de casse d'une même valeur ont été enregistrées depuis
+    for column in DICTIONARY_COLUMNS:
+        op.drop_index(f"ix_dict_{column}_lower_value", table_name=f"dict_{column}")
+        op.create_index(
+            f"ix_dict_{column}_lower_value", f"dict_{column}", [sa.text("lower(value)")], unique=True
+        )
@@ -2,43 +2,62 @@
 This module contains the FastAPI application and its configuration.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import inspect
-from src.utils.database import engine
-import src.utils.models as models
-from src.app.routes import file_data
-from src.utils.settings import ORIGINS
+from src.utils.database import get_engine, dispose_engine, wait_for_database, check_database_connection, get_database_url
+from src.app.routes import file_data, admin, events, references
+from src.utils.analytics import analytics_snapshot
+from src.utils.events import event_broker
+from src.utils.settings import ADMIN_TOKEN, ORIGINS
 
 
 file_data_router = file_data.router
+admin_router = admin.router
+events_router = events.router
+references_router = references.router
 
-def create_tables_if_not_exist():
-    """
-    Create database tables only if they do not already exist.
-    
-    This method checks each table in the models before creating it,
-    preventing errors from attempting to recreate existing tables.
+
+async def prepare_worker() -> None:
+    """Wait for the database, then refresh the analytics snapshot if enabled."""
+    if not await asyncio.to_thread(wait_for_database):
+        return
+    if analytics_snapshot.enabled:
+        await asyncio.to_thread(analytics_snapshot.rebuild)
+    elif analytics_snapshot.backend == "duckdb":
+        print("ANALYTICS_BACKEND=duckdb ignoré: installez les extras \"analytics\" (duckdb, pyarrow)")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    inspector = inspect(engine)
+    Create the database engine when the worker starts and dispose it on shutdown.
 
-    # List of all model classes
-    model_classes = [
-        models.FileData,
-    ]
-    for model_class in model_classes:
-        # Check if table already exists
-        if not inspector.has_table(model_class.__tablename__):
-            # Create only if table doesn't exist
-            model_class.__table__.create(engine)
+    The schema is managed by Alembic migrations (`poetry run migrate`), so no
+    query runs at import time. The database availability is checked in the
+    background with retry/backoff, which lets the worker boot even when the
+    database is not ready yet. Once it is reachable, the analytics snapshot
+    (ANALYTICS_BACKEND=duckdb) is brought in line with the database.
+
+    Each worker also listens to the change events of the database (its own
+    connection, reconnected with backoff) to push them to its WebSocket clients.
+    """
+    get_engine()
+    event_broker.start(get_database_url())
+    readiness_check = asyncio.create_task(prepare_worker())
+    yield
+    if not readiness_check.done():
+        readiness_check.cancel()
+    await asyncio.to_thread(event_broker.stop)
+    dispose_engine()
 
-# Create tables only if they don't exist
-create_tables_if_not_exist()
 
 app = FastAPI(
     title = "API jointure Excel et CSV",
     description = "API pour accéder et enregistrer des données de la jointure entre les fichiers et Excel et csv",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -52,9 +71,22 @@ app.add_middleware(
 
 # Include all routes
 app.include_router(file_data_router)
+# Les routes d'administration exposent les paramètres des requêtes (données
+# importées, recherches): elles ne sont montées que si ADMIN_TOKEN est défini
+if ADMIN_TOKEN:
+    app.include_router(admin_router)
+app.include_router(events_router)
+app.include_router(references_router)
 
 
 # Root endpoint to verify API connection
 @app.get("/")
 async def root() -> dict:
-    return {"message": "Bienvenu sur l'API jointure Excel csv"}
\ No newline at end of file
+    return {"message": "Bienvenu sur l'API jointure Excel csv"}
+
+
+# Health endpoint to verify the database connection
+@app.get("/health")
+def health() -> dict:
+    database_ok = check_database_connection()
+    return {"status": "ok" if database_ok else "degraded", "database": database_ok}
\ No newline at end of file
@@ -0,0 +1,76 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from src.utils.analytics import analytics_snapshot
+from src.utils.profiling import slow_query_recorder
+from src.utils.schema import SlowQueryReport
+from src.utils.settings import (
+    ADMIN_TOKEN,
+    SLOW_QUERY_PROFILING,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_BUFFER_SIZE,
+)
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Vérifier le jeton d'administration
+    Sans ADMIN_TOKEN le routeur n'est pas monté, et toute requête est refusée par sécurité
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Administration"],
+    dependencies=[Depends(verify_admin_token)]
+)
+
+
+@router.get("/slow-queries", response_model=SlowQueryReport)
+def get_slow_queries(limit: Optional[int] = None):
+    """
+    Récupérer les requêtes lentes enregistrées par ce processus
+    Les plans EXPLAIN (ANALYZE, BUFFERS) sont présents pour la fraction échantillonnée
+    """
+    entries = slow_query_recorder.entries()
+    if limit is not None:
+        entries = entries[:limit]
+
+    return {
+        "enabled": SLOW_QUERY_PROFILING,
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "explain_sample_rate": SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        "buffer_size": SLOW_QUERY_BUFFER_SIZE,
+        "entries": entries
+    }
+
+
+@router.delete("/slow-queries", response_model=dict)
+def clear_slow_queries():
+    """Vider le tampon des requêtes lentes"""
+    slow_query_recorder.clear()
+    return {"message": "Tampon des requêtes lentes vidé avec succès"}
+
+
+@router.get("/analytics", response_model=dict)
+def get_analytics_status():
+    """Consulter l'état de l'instantané analytique (DuckDB)"""
+    return analytics_snapshot.status()
+
+
+@router.post("/analytics/rebuild", response_model=dict)
+def rebuild_analytics(full: bool = False):
+    """
+    Resynchroniser l'instantané analytique avec PostgreSQL
+    Seuls les fichiers modifiés sont réexportés, sauf avec full=true
+    """
+    if not analytics_snapshot.enabled:
+        raise HTTPException(status_code=409, detail="L'instantané analytique n'est pas activé (ANALYTICS_BACKEND=duckdb)")
+    summary = analytics_snapshot.rebuild(full=full)
+    if summary is None:
+        raise HTTPException(status_code=500, detail="Échec de la reconstruction de l'instantané analytique")
+    return summary
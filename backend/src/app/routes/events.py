@@ -0,0 +1,42 @@
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from src.utils.events import event_broker
+
+router = APIRouter(
+    prefix="/api/events",
+    tags=["Événements"]
+)
+
+
+@router.websocket("/ws")
+async def stream_events(websocket: WebSocket):
+    """
+    Diffuser les changements de données (fichier ajouté ou supprimé, nombre de lignes, périodes touchées)
+    Le client ne rafraîchit que les vues concernées au lieu d'interroger l'API à intervalle régulier
+    Un événement "resync" demande de tout recharger (événements perdus)
+    """
+    await websocket.accept()
+    queue = event_broker.subscribe()
+    # Les messages du client (texte ou binaire) sont ignorés, la lecture sert à détecter la déconnexion
+    receiver = asyncio.create_task(websocket.receive())
+    sender = asyncio.create_task(queue.get())
+    try:
+        await websocket.send_json({"type": "connected"})
+        while True:
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.create_task(websocket.receive())
+            # Un événement déjà retiré de la file est toujours envoyé, même si
+            # un message du client est arrivé en même temps
+            if sender in done:
+                await websocket.send_json(sender.result())
+                sender = asyncio.create_task(queue.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        sender.cancel()
+        event_broker.unsubscribe(queue)
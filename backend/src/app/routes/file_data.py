@@ -1,19 +1,53 @@
+import json
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, cast, Date, text
+from sqlalchemy import func, extract, cast, Date, text, insert
 from datetime import datetime, timedelta
-import re
 
-from src.utils.database import get_db
-from src.utils.models import FileData
+from src.utils.admission import (
+    AdmissionTicket,
+    AdmittedStreamingResponse,
+    admission,
+    apply_statement_timeout,
+    exceeds_cost_limit,
+    is_query_canceled,
+    query_timeout_error,
+    reject_costly_query,
+)
+from src.utils.analytics import analytics_snapshot
+from src.utils.database import SessionLocal, get_db, get_read_db
+from src.utils.dictionary import DICTIONARY_COLUMNS, encode_rows
+from src.utils.events import periods_of_dates, periods_of_file, publish_event
+from src.utils.filters import build_filters, build_filter_sql
+from src.utils.history import refresh_reference_history, references_of_file
+from src.utils.normalization import fold_dictionary_spellings, normalize_records
+from src.utils.queries import (
+    DISTRIBUTION_FIELDS,
+    PERIOD_GROUPS,
+    PIVOT_DIMENSIONS,
+    STATS_COLUMNS,
+    aggregate_ctes,
+    dashboard_query,
+    pivot_query,
+    stats_select,
+    with_ctes,
+)
+from src.utils.replication import record_write
+from src.utils.sampling import SAMPLING_METHODS, sample_ids
+from src.utils.settings import DASHBOARD_MAX_WIDGETS, PIVOT_MAX_CELLS, SAMPLE_MAX_SIZE
+from src.utils.models import FileData, ImportReport, DICTIONARY_MODELS
 from src.utils.schema import (
     FileDataCreate, 
     FileDataResponse, 
     FileDataBulkCreate,
     AggregatedDataPoint,
     DistributionDataPoint,
-    PaginatedResponse
+    PaginatedResponse,
+    ImportQualityReport,
+    SampleResponse,
+    DashboardResponse,
+    PivotResponse
 )
 
 router = APIRouter(
@@ -21,24 +55,69 @@ router = APIRouter(
     tags=["Données de fichier"]
 )
 
+# Lignes lues par lot lors d'un export en flux
+EXPORT_STREAM_BATCH_SIZE = 5000
+
 
 @router.post("/", response_model=List[FileDataResponse])
 def create_file_data(
     file_data: FileDataBulkCreate,
+    admitted: AdmissionTicket = Depends(admission("import", get_db)),
     db: Session = Depends(get_db)
 ):
     """Créer plusieurs entrées de données de fichier"""
-    db_items = []
-    for item in file_data.data:
-        db_item = FileData(**item.dict())
-        db.add(db_item)
-        db_items.append(db_item)
+    # Nettoyer et valider le lot en une passe (espaces, casse, dates analysées)
+    frame, report = normalize_records([item.dict() for item in file_data.data])
+    # Variantes de casse des valeurs déjà présentes dans les dictionnaires -> orthographe enregistrée
+    fold_dictionary_spellings(db.get_bind(), frame)
+    
+    # Remplacer les colonnes à faible cardinalité par leurs codes de dictionnaire
+    rows = encode_rows(db.get_bind(), frame.to_dict("records"))
+    
+    # Insertion groupée, les lignes créées sont renvoyées par la même requête
+    # (render_nulls: les lignes avec des valeurs NULL restent dans le même lot)
+    statement = (
+        insert(FileData)
+        .returning(FileData, sort_by_parameter_order=True)
+        .execution_options(render_nulls=True)
+    )
+    db_items = db.scalars(statement, rows).all() if rows else []
+    response = [FileDataResponse.model_validate(item, from_attributes=True) for item in db_items]
+    
+    # Mettre à jour l'historique des références importées (même transaction)
+    refresh_reference_history(db, (item.reference for item in db_items))
+    snapshot_rows = analytics_snapshot.capture(db_items)
+    
+    # Conserver le rapport de qualité de chaque fichier, calculé sur ses seules lignes
+    for imported_file_name, file_report in report["files"].items():
+        db.add(ImportReport(
+            file_name=imported_file_name,
+            total_rows=file_report["total_rows"],
+            invalid_rows=file_report["invalid_rows"],
+            report=file_report
+        ))
+    
+    # Notifier les clients WebSocket (envoyé par PostgreSQL au commit)
+    for imported_file_name in report["file_names"]:
+        file_items = [item for item in db_items if item.file_name == imported_file_name]
+        publish_event(db, {
+            "type": "file_added",
+            "file_name": imported_file_name,
+            "rows": len(file_items),
+            "file_rows": db.query(func.count(FileData.id)).filter(FileData.file_name == imported_file_name).scalar(),
+            "periods": periods_of_dates(item.creation_date for item in file_items)
+        })
     
     db.commit()
-    for item in db_items:
-        db.refresh(item)
     
-    return db_items
+    # Les lectures de ces fichiers restent sur le primaire tant que le réplica n'a pas rejoué l'import
+    for imported_file_name in report["file_names"]:
+        record_write(db, imported_file_name)
+    
+    # Ajouter les lignes importées à l'instantané analytique (si activé)
+    analytics_snapshot.append(snapshot_rows)
+    
+    return response
 
 
 @router.get("/", response_model=PaginatedResponse)
@@ -49,6 +128,7 @@ def read_file_data(
     file_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    admitted: AdmissionTicket = Depends(admission("list", get_db)),
     db: Session = Depends(get_db)
 ):
     """Récupérer les données de fichier avec filtrage optionnel et pagination"""
@@ -56,31 +136,13 @@ def read_file_data(
     query = db.query(FileData)
     
     # Appliquer les filtres
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (FileData.reference.ilike(search_term)) |
-            (FileData.id_lin.ilike(search_term)) |
-            (FileData.id_ccu.ilike(search_term)) |
-            (FileData.etat.ilike(search_term)) |
-            (FileData.source.ilike(search_term))
-        )
-    
-    if file_name and file_name != "all":
-        query = query.filter(FileData.file_name == file_name)
-    
-    # Appliquer les filtres de date
-    if date_from:
-        query = query.filter(apply_date_filter(FileData.creation, ">=", date_from))
-    
-    if date_to:
-        query = query.filter(apply_date_filter(FileData.creation, "<=", date_to))
+    query = query.filter(*build_filters(search, file_name, date_from, date_to))
     
     # Compter le nombre total d'enregistrements (pour la pagination)
     total = query.count()
     
-    # Appliquer la pagination
-    items = query.offset(skip).limit(limit).all()
+    # Appliquer la pagination (ordre d'insertion, indépendant de l'ordre physique des lignes)
+    items = query.order_by(FileData.id).offset(skip).limit(limit).all()
     
     # Retourner les résultats paginés
     return {
@@ -91,6 +153,44 @@ def read_file_data(
     }
 
 
+@router.get("/sample", response_model=SampleResponse)
+def sample_file_data(
+    size: int = Query(100, ge=1, description="Nombre de lignes de l'échantillon"),
+    method: str = Query("auto", description="Options: auto, system, bernoulli, reservoir"),
+    seed: Optional[int] = Query(None, description="Graine pour reproduire un échantillon"),
+    search: Optional[str] = None,
+    file_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    admitted: AdmissionTicket = Depends(admission("sample", get_read_db)),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Récupérer un échantillon représentatif des données filtrées
+    Échantillonnage exact (réservoir) sur les petits ensembles, TABLESAMPLE sur les grands pour une latence stable
+    """
+    if method not in SAMPLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"Méthode d'échantillonnage inconnue: {method}")
+    if size > SAMPLE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"La taille de l'échantillon est limitée à {SAMPLE_MAX_SIZE} lignes")
+    
+    where_sql, params = build_filter_sql(search, file_name, date_from, date_to)
+    sample = sample_ids(db, where_sql, params, size, method, seed)
+    
+    # Charger les lignes retenues, dans l'ordre d'insertion
+    items = db.query(FileData).filter(FileData.id.in_(sample["ids"])).order_by(FileData.id).all() if sample["ids"] else []
+    
+    return {
+        "items": items,
+        "size": len(items),
+        "method": sample["method"],
+        "seed": sample["seed"],
+        "sampling_percent": sample["percent"],
+        "population": sample["population"],
+        "population_exact": sample["population_exact"]
+    }
+
+
 @router.get("/files", response_model=List[str])
 def get_unique_files(db: Session = Depends(get_db)):
     """Récupérer la liste des noms de fichiers uniques"""
@@ -98,14 +198,46 @@ def get_unique_files(db: Session = Depends(get_db)):
     return [file[0] for file in files]
 
 
+@router.get("/imports/{file_name}/quality", response_model=List[ImportQualityReport])
+def get_import_quality(
+    file_name: str,
+    db: Session = Depends(get_db)
+):
+    """Récupérer les rapports de qualité des imports d'un fichier, du plus récent au plus ancien"""
+    reports = (
+        db.query(ImportReport)
+        .filter(ImportReport.file_name == file_name)
+        .order_by(ImportReport.created_at.desc(), ImportReport.id.desc())
+        .all()
+    )
+    if not reports:
+        raise HTTPException(status_code=404, detail=f"Aucun rapport d'import trouvé pour le fichier {file_name}")
+    return reports
+
+
 @router.delete("/{file_name}", response_model=dict)
 def delete_file_data(
     file_name: str,
     db: Session = Depends(get_db)
 ):
     """Supprimer toutes les données d'un fichier spécifique"""
+    periods = periods_of_file(db, file_name)
+    references = references_of_file(db, file_name)
     deleted = db.query(FileData).filter(FileData.file_name == file_name).delete()
+    
+    # Recalculer l'historique des références du fichier sans ses lignes
+    refresh_reference_history(db, references)
+    if deleted:
+        publish_event(db, {
+            "type": "file_removed",
+            "file_name": file_name,
+            "rows": deleted,
+            "file_rows": 0,
+            "periods": periods
+        })
     db.commit()
+    record_write(db, file_name)
+    analytics_snapshot.remove_file(file_name)
     
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"Aucune donnée trouvée pour le fichier {file_name}")
@@ -113,31 +245,6 @@ def delete_file_data(
     return {"message": f"Données du fichier {file_name} supprimées avec succès"}
 
 
-# Fonction utilitaire pour appliquer les filtres de date
-def apply_date_filter(column, operator, date_value):
-    """
-    Applique un filtre de date sur une colonne en tenant compte des différents formats de date
-    """
-    if not date_value:
-        return True  # Ne pas filtrer si aucune date n'est fournie
-    
-    # Vérifier si la date est au format ISO (YYYY-MM-DD...)
-    iso_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}')
-    if iso_pattern.match(date_value):
-        # Pour les dates ISO, on peut les comparer directement
-        if operator == ">=":
-            return text(f"CASE WHEN creation LIKE '%/%/%' THEN "
-                       f"to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD') >= to_date('{date_value}', 'YYYY-MM-DD') "
-                       f"ELSE to_date(substring(creation, 1, 10), 'YYYY-MM-DD') >= to_date('{date_value}', 'YYYY-MM-DD') END")
-        else:  # operator == "<="
-            return text(f"CASE WHEN creation LIKE '%/%/%' THEN "
-                       f"to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD') <= to_date('{date_value}', 'YYYY-MM-DD') "
-                       f"ELSE to_date(substring(creation, 1, 10), 'YYYY-MM-DD') <= to_date('{date_value}', 'YYYY-MM-DD') END")
-    
-    # Si ce n'est pas une date ISO, on suppose que c'est déjà au format DD/MM/YYYY
-    return column.op(operator)(date_value)
-
-
 # Endpoints optimisés pour l'analyse
 
 @router.get("/aggregate", response_model=List[AggregatedDataPoint])
@@ -147,190 +254,30 @@ def get_aggregated_data(
     file_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db)
+    admitted: AdmissionTicket = Depends(admission("aggregate", get_read_db)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Récupérer les données agrégées par période (jour, semaine, mois, année)
     Utilise des requêtes SQL optimisées pour éviter de charger toutes les données
     """
-    # Déterminer le format de date en fonction du groupe
-    date_format = ""
-    if group_by == "jour":
-        date_format = "%Y-%m-%d"
-    elif group_by == "semaine":
-        # Pour la semaine, nous utiliserons une approche différente
-        date_format = "%Y-%m-%d"
-    elif group_by == "mois":
-        date_format = "%Y-%m"
-    elif group_by == "annee":
-        date_format = "%Y"
-    else:
-        date_format = "%Y-%m-%d"
+    # Instantané analytique (DuckDB) s'il est activé et à jour
+    snapshot_result = analytics_snapshot.aggregate(group_by, search, file_name, date_from, date_to)
+    if snapshot_result is not None:
+        return [
+            AggregatedDataPoint(period=period, count=count, data=data)
+            for period, count, data in snapshot_result
+        ]
     
     # Construire la requête SQL pour l'agrégation
     # Cette approche utilise des sous-requêtes pour éviter l'utilisation de FILTER avec window functions
-    sql_query = """
-    WITH filtered_data AS (
-        SELECT 
-            id, reference, etat, creation, file_name
-        FROM 
-            file_data
-        WHERE 
-            1=1
-    """
+    where_sql, params = build_filter_sql(search, file_name, date_from, date_to)
     
-    # Paramètres pour la requête
-    params = {}
-    
-    # Ajouter les conditions de filtrage
-    if search:
-        sql_query += """
-            AND (
-                reference ILIKE :search OR
-                id_lin ILIKE :search OR
-                id_ccu ILIKE :search OR
-                etat ILIKE :search OR
-                source ILIKE :search
-            )
-        """
-        params["search"] = f"%{search}%"
-    
-    if file_name and file_name != "all":
-        sql_query += " AND file_name = :file_name"
-        params["file_name"] = file_name
-    
-    # Ajouter les filtres de date
-    if date_from:
-        sql_query += """
-            AND (
-                CASE WHEN creation LIKE '%/%/%' THEN 
-                    to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD')
-                ELSE 
-                    to_date(substring(creation, 1, 10), 'YYYY-MM-DD')
-                END
-            ) >= to_date(:date_from, 'YYYY-MM-DD')
-        """
-        params["date_from"] = date_from[:10]  # Prendre seulement la partie date (YYYY-MM-DD)
-    
-    if date_to:
-        sql_query += """
-            AND (
-                CASE WHEN creation LIKE '%/%/%' THEN 
-                    to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD')
-                ELSE 
-                    to_date(substring(creation, 1, 10), 'YYYY-MM-DD')
-                END
-            ) <= to_date(:date_to, 'YYYY-MM-DD')
-        """
-        params["date_to"] = date_to[:10]  # Prendre seulement la partie date (YYYY-MM-DD)
-    
-    sql_query += """
-    ),
-    """
+    # Comptes et lignes d'exemple par période (SQL partagé avec /dashboard)
+    sql_query = with_ctes(*aggregate_ctes(group_by, "file_data", where_sql))
     
-    # Ajouter la partie pour extraire la période en fonction du format de date
-    if group_by == "semaine":
-        sql_query += """
-        period_data AS (
-            SELECT 
-                id, reference, etat, creation, file_name,
-                CASE 
-                    WHEN creation LIKE '%/%/%' THEN 
-                        -- Format DD/MM/YYYY
-                        CAST(
-                            date_trunc('week', 
-                                to_date(
-                                    substring(creation, 7, 4) || '-' || 
-                                    substring(creation, 4, 2) || '-' || 
-                                    substring(creation, 1, 2), 
-                                    'YYYY-MM-DD'
-                                )
-                            ) AS TEXT
-                        )
-                    ELSE 
-                        -- Format ISO
-                        CAST(date_trunc('week', to_date(substring(creation, 1, 10), 'YYYY-MM-DD')) AS TEXT)
-                END AS period
-            FROM 
-                filtered_data
-        ),
-        """
-    else:
-        sql_query += """
-        period_data AS (
-            SELECT 
-                id, reference, etat, creation, file_name,
-                CASE 
-                    WHEN creation LIKE '%/%/%' THEN 
-                        -- Format DD/MM/YYYY
-                        to_char(
-                            to_date(
-                                substring(creation, 7, 4) || '-' || 
-                                substring(creation, 4, 2) || '-' || 
-                                substring(creation, 1, 2), 
-                                'YYYY-MM-DD'
-                            ),
-                            :date_format
-                        )
-                    ELSE 
-                        -- Format ISO
-                        to_char(to_date(substring(creation, 1, 10), 'YYYY-MM-DD'), :date_format)
-                END AS period
-            FROM 
-                filtered_data
-        ),
-        """
-        params["date_format"] = date_format
-    
-    # Ajouter la partie pour limiter à 5 éléments par période
-    sql_query += """
-    ranked_data AS (
-        SELECT 
-            id, reference, etat, creation, file_name, period,
-            row_number() OVER (PARTITION BY period ORDER BY id) AS rn
-        FROM 
-            period_data
-    ),
-    limited_data AS (
-        SELECT 
-            id, reference, etat, creation, file_name, period
-        FROM 
-            ranked_data
-        WHERE 
-            rn <= 5
-    ),
-    counts AS (
-        SELECT 
-            period, COUNT(*) AS count
-        FROM 
-            period_data
-        GROUP BY 
-            period
-    )
-    SELECT 
-        c.period,
-        c.count,
-        COALESCE(
-            (
-                SELECT json_agg(
-                    json_build_object(
-                        'id', ld.id,
-                        'reference', ld.reference,
-                        'etat', ld.etat,
-                        'creation', ld.creation,
-                        'file_name', ld.file_name
-                    )
-                )
-                FROM limited_data ld
-                WHERE ld.period = c.period
-            ),
-            '[]'::json
-        ) AS data
-    FROM 
-        counts c
-    ORDER BY 
-        c.period
-    """
+    # Refuser la requête si son coût estimé dépasse la limite (QUERY_COST_LIMIT)
+    reject_costly_query(db, text(sql_query), params)
     
     # Exécuter la requête SQL
     result = db.execute(text(sql_query), params).fetchall()
@@ -352,6 +299,28 @@ def get_aggregated_data(
     return aggregated_data
 
 
+def build_distribution(result) -> List[DistributionDataPoint]:
+    """
+    Convertir les lignes (label, count) en points de distribution
+    Les égalités sont départagées par libellé pour un ordre identique quel que soit le moteur
+    """
+    # Calculer le total pour les pourcentages
+    total = sum(item[1] for item in result)
+    
+    # Convertir les résultats en objets DistributionDataPoint
+    distribution_data = []
+    for label, count in result:
+        percentage = (count / total * 100) if total > 0 else 0
+        distribution_data.append(DistributionDataPoint(
+            label=str(label) if label is not None else "Non défini",
+            count=count,
+            percentage=percentage
+        ))
+    
+    distribution_data.sort(key=lambda point: (-point.count, point.label))
+    return distribution_data
+
+
 @router.get("/distribution", response_model=List[DistributionDataPoint])
 def get_distribution_data(
     field: str = Query(..., description="Champ pour la distribution: etat, source, file_name, etc."),
@@ -359,7 +328,8 @@ def get_distribution_data(
     file_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db)
+    admitted: AdmissionTicket = Depends(admission("distribution", get_read_db)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Récupérer la distribution des données par champ spécifié
@@ -370,55 +340,50 @@ def get_distribution_data(
         raise HTTPException(status_code=400, detail=f"Le champ {field} n'existe pas dans le modèle")
     
     try:
+        # Instantané analytique (DuckDB) s'il est activé et à jour
+        snapshot_result = analytics_snapshot.distribution(field, search, file_name, date_from, date_to)
+        if snapshot_result is not None:
+            return build_distribution(snapshot_result)
+        
+        # Les colonnes encodées sont groupées sur leur code entier, puis décodées
+        encoded = field in DICTIONARY_COLUMNS
+        group_column = getattr(FileData, f"{field}_id") if encoded else getattr(FileData, field)
+        
         # Construire la requête de base
         query = db.query(
-            getattr(FileData, field).label("label"),
+            group_column.label("label"),
             func.count().label("count")
         )
         
         # Appliquer les filtres
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (FileData.reference.ilike(search_term)) |
-                (FileData.id_lin.ilike(search_term)) |
-                (FileData.id_ccu.ilike(search_term)) |
-                (FileData.etat.ilike(search_term)) |
-                (FileData.source.ilike(search_term))
-            )
-        
-        if file_name and file_name != "all":
-            query = query.filter(FileData.file_name == file_name)
-        
-        # Appliquer les filtres de date
-        if date_from:
-            query = query.filter(apply_date_filter(FileData.creation, ">=", date_from))
-        
-        if date_to:
-            query = query.filter(apply_date_filter(FileData.creation, "<=", date_to))
+        query = query.filter(*build_filters(search, file_name, date_from, date_to))
         
         # Grouper et ordonner
-        query = query.group_by(getattr(FileData, field)).order_by(func.count().desc())
-        
-        # Exécuter la requête
-        result = query.all()
-        
-        # Calculer le total pour les pourcentages
-        total = sum(item[1] for item in result)
+        query = query.group_by(group_column)
+        if encoded:
+            # Décoder les quelques groupes obtenus via le dictionnaire
+            counts = query.subquery()
+            dictionary = DICTIONARY_MODELS[field]
+            query = (
+                db.query(dictionary.value.label("label"), counts.c.count)
+                .select_from(counts)
+                .outerjoin(dictionary, dictionary.id == counts.c.label)
+                .order_by(counts.c.count.desc())
+            )
+        else:
+            query = query.order_by(func.count().desc())
         
-        # Convertir les résultats en objets DistributionDataPoint
-        distribution_data = []
-        for label, count in result:
-            percentage = (count / total * 100) if total > 0 else 0
-            distribution_data.append(DistributionDataPoint(
-                label=str(label) if label is not None else "Non défini",
-                count=count,
-                percentage=percentage
-            ))
+        # Refuser la requête si son coût estimé dépasse la limite (QUERY_COST_LIMIT)
+        reject_costly_query(db, query.statement)
         
-        return distribution_data
+        # Exécuter la requête
+        return build_distribution(query.all())
     
+    except HTTPException:
+        raise
     except Exception as e:
+        if is_query_canceled(e):
+            raise query_timeout_error() from e
         # Capturer et logger l'erreur pour le débogage
         print(f"Erreur dans get_distribution_data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des données de distribution: {str(e)}")
@@ -430,92 +395,25 @@ def get_stats(
     file_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db)
+    admitted: AdmissionTicket = Depends(admission("stats", get_read_db)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Récupérer des statistiques générales sur les données
     Utilise des requêtes SQL optimisées pour éviter de charger toutes les données
     """
-    # Construire la requête SQL directe pour les statistiques
-    sql_query = """
-    WITH filtered_data AS (
-        SELECT 
-            id, file_name, source, creation, import_date
-        FROM 
-            file_data
-        WHERE 
-            1=1
-    """
+    # Instantané analytique (DuckDB) s'il est activé et à jour, sinon PostgreSQL
+    result = analytics_snapshot.stats(search, file_name, date_from, date_to)
+    if result is None:
+        result = query_stats(db, search, file_name, date_from, date_to)
     
-    # Paramètres pour la requête
-    params = {}
-    
-    # Ajouter les conditions de filtrage
-    if search:
-        sql_query += """
-            AND (
-                reference ILIKE :search OR
-                id_lin ILIKE :search OR
-                id_ccu ILIKE :search OR
-                etat ILIKE :search OR
-                source ILIKE :search
-            )
-        """
-        params["search"] = f"%{search}%"
-    
-    if file_name and file_name != "all":
-        sql_query += " AND file_name = :file_name"
-        params["file_name"] = file_name
-    
-    # Ajouter les filtres de date
-    if date_from:
-        sql_query += """
-            AND (
-                CASE WHEN creation LIKE '%/%/%' THEN 
-                    to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD')
-                ELSE 
-                    to_date(substring(creation, 1, 10), 'YYYY-MM-DD')
-                END
-            ) >= to_date(:date_from, 'YYYY-MM-DD')
-        """
-        params["date_from"] = date_from[:10]  # Prendre seulement la partie date (YYYY-MM-DD)
-    
-    if date_to:
-        sql_query += """
-            AND (
-                CASE WHEN creation LIKE '%/%/%' THEN 
-                    to_date(substring(creation, 7, 4) || '-' || substring(creation, 4, 2) || '-' || substring(creation, 1, 2), 'YYYY-MM-DD')
-                ELSE 
-                    to_date(substring(creation, 1, 10), 'YYYY-MM-DD')
-                END
-            ) <= to_date(:date_to, 'YYYY-MM-DD')
-        """
-        params["date_to"] = date_to[:10]  # Prendre seulement la partie date (YYYY-MM-DD)
-    
-    sql_query += """
-    )
-    SELECT 
-        (SELECT COUNT(*) FROM filtered_data) AS total_entries,
-        (SELECT COUNT(DISTINCT file_name) FROM filtered_data) AS unique_files,
-        (SELECT creation FROM filtered_data ORDER BY 
-            CASE 
-                WHEN creation LIKE '%/%/%' THEN 
-                    to_date(
-                        substring(creation, 7, 4) || '-' || 
-                        substring(creation, 4, 2) || '-' || 
-                        substring(creation, 1, 2), 
-                        'YYYY-MM-DD'
-                    )
-                ELSE 
-                    to_date(substring(creation, 1, 10), 'YYYY-MM-DD')
-            END DESC LIMIT 1) AS latest_entry,
-        (SELECT COUNT(DISTINCT source) FROM filtered_data WHERE source IS NOT NULL) AS unique_sources
+    return format_stats(result)
+
+
+def format_stats(result) -> Dict[str, Any]:
+    """
+    Convertir la ligne (total_entries, unique_files, latest_entry, unique_sources) en dictionnaire
     """
-    
-    # Exécuter la requête SQL
-    result = db.execute(text(sql_query), params).fetchone()
-    
-    # Convertir les résultats en dictionnaire
     if result is None or result[0] == 0:
         return {
             "total_entries": 0,
@@ -532,13 +430,242 @@ def get_stats(
         }
 
 
+def query_stats(db: Session, search, file_name, date_from, date_to):
+    """
+    Calculer les statistiques générales avec PostgreSQL
+    """
+    # Construire la requête SQL directe pour les statistiques
+    where_sql, params = build_filter_sql(search, file_name, date_from, date_to)
+    
+    sql_query = f"""
+    WITH filtered_data AS (
+        SELECT 
+            {", ".join(STATS_COLUMNS)}
+        FROM 
+            file_data
+        WHERE 
+            {where_sql}
+    )
+    {stats_select("filtered_data")}
+    """
+    
+    # Refuser la requête si son coût estimé dépasse la limite (QUERY_COST_LIMIT)
+    reject_costly_query(db, text(sql_query), params)
+    
+    # Exécuter la requête SQL
+    return db.execute(text(sql_query), params).fetchone()
+
+
+def parse_widgets(widgets: List[str]) -> List[tuple]:
+    """
+    Valider les widgets demandés (stats, aggregate:<regroupement>, distribution:<champ>), sans doublon
+    """
+    parsed = []
+    for widget in widgets:
+        kind, _, argument = widget.partition(":")
+        if kind == "stats" and not argument:
+            item = ("stats", "")
+        elif kind == "aggregate" and argument in PERIOD_GROUPS:
+            item = ("aggregate", argument)
+        elif kind == "distribution" and argument in DISTRIBUTION_FIELDS:
+            item = ("distribution", argument)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Widget invalide: {widget}. Formats acceptés: stats, "
+                       f"aggregate:<{'|'.join(PERIOD_GROUPS)}>, distribution:<{'|'.join(DISTRIBUTION_FIELDS)}>"
+            )
+        if item not in parsed:
+            parsed.append(item)
+    if len(parsed) > DASHBOARD_MAX_WIDGETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trop de widgets demandés ({len(parsed)} > {DASHBOARD_MAX_WIDGETS})"
+        )
+    return parsed
+
+
+@router.get("/dashboard", response_model=DashboardResponse)
+def get_dashboard(
+    widgets: List[str] = Query(
+        ["stats", "aggregate:mois", "distribution:etat"],
+        description="Widgets à calculer: stats, aggregate:<jour|semaine|mois|annee>, distribution:<champ> (paramètre répétable)"
+    ),
+    search: Optional[str] = None,
+    file_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    admitted: AdmissionTicket = Depends(admission("dashboard", get_read_db)),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Récupérer plusieurs widgets du tableau de bord en une seule requête
+    Les filtres sont évalués une seule fois et les lignes filtrées sont partagées par tous les widgets,
+    avec des résultats identiques à ceux de /stats, /aggregate et /distribution
+    """
+    parsed = parse_widgets(widgets)
+    
+    # Instantané analytique (DuckDB) s'il est activé et à jour pour tous les widgets
+    results = dashboard_from_snapshot(parsed, search, file_name, date_from, date_to)
+    
+    if results is None:
+        # Une seule instruction SQL: parcours filtré commun puis un sous-résultat JSON par widget
+        where_sql, params = build_filter_sql(search, file_name, date_from, date_to)
+        sql_query = dashboard_query(parsed, where_sql)
+        
+        # Refuser la requête si son coût estimé dépasse la limite (QUERY_COST_LIMIT)
+        reject_costly_query(db, text(sql_query), params)
+        
+        values = db.execute(text(sql_query), params).scalar()
+        results = []
+        for index, (kind, _) in enumerate(parsed):
+            value = values[str(index)]
+            if kind == "stats":
+                value = (value["total_entries"], value["unique_files"], value["latest_entry"], value["unique_sources"])
+            results.append(value)
+    
+    # Même mise en forme que les routes individuelles
+    response = DashboardResponse()
+    for (kind, argument), value in zip(parsed, results):
+        if kind == "stats":
+            response.stats = format_stats(value)
+        elif kind == "aggregate":
+            response.aggregate[argument] = [
+                AggregatedDataPoint(period=period, count=count, data=data or [])
+                for period, count, data in value
+            ]
+        else:
+            response.distribution[argument] = build_distribution(value)
+    return response
+
+
+def dashboard_from_snapshot(parsed: List[tuple], search, file_name, date_from, date_to) -> Optional[list]:
+    """
+    Calculer les widgets avec l'instantané analytique
+    Retourne None (repli sur PostgreSQL) si l'instantané est désactivé ou ne sait pas calculer l'un des widgets
+    """
+    if not analytics_snapshot.is_ready():
+        return None
+    results = []
+    for kind, argument in parsed:
+        if kind == "stats":
+            value = analytics_snapshot.stats(search, file_name, date_from, date_to)
+        elif kind == "aggregate":
+            value = analytics_snapshot.aggregate(argument, search, file_name, date_from, date_to)
+        else:
+            value = analytics_snapshot.distribution(argument, search, file_name, date_from, date_to)
+        if value is None:
+            return None
+        results.append(value)
+    return results
+
+
+# Libellé de la case regroupant les valeurs au-delà de la limite d'un axe
+PIVOT_OTHER_LABEL = "Autres"
+
+
+@router.get("/pivot", response_model=PivotResponse)
+def get_pivot(
+    rows: str = Query(..., description="Dimension des lignes: champ (etat, source, file_name, etc.) ou période (jour, semaine, mois, annee)"),
+    columns: str = Query(..., description="Dimension des colonnes: champ ou période"),
+    rows_limit: int = Query(0, ge=0, description="Nombre maximal de lignes, les autres sont regroupées dans « Autres » (0 = toutes)"),
+    columns_limit: int = Query(0, ge=0, description="Nombre maximal de colonnes, les autres sont regroupées dans « Autres » (0 = toutes)"),
+    search: Optional[str] = None,
+    file_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    admitted: AdmissionTicket = Depends(admission("pivot", get_read_db)),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Récupérer le tableau croisé de deux dimensions (ex: etat x mois, source x file_name)
+    La matrice complète est calculée par une seule requête groupée et renvoyée sous forme dense
+    """
+    for dimension in (rows, columns):
+        if dimension not in PIVOT_DIMENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dimension invalide: {dimension}. Options: {', '.join(PIVOT_DIMENSIONS)}"
+            )
+    if rows == columns:
+        raise HTTPException(status_code=400, detail="Les lignes et les colonnes doivent utiliser des dimensions différentes")
+    
+    # Une seule requête: comptes par couple de valeurs, rangs par axe et regroupement au-delà des limites
+    where_sql, params = build_filter_sql(search, file_name, date_from, date_to)
+    params = {**params, "rows_limit": rows_limit, "columns_limit": columns_limit, "max_cells": PIVOT_MAX_CELLS}
+    sql_query = pivot_query(rows, columns, where_sql)
+    
+    # Refuser la requête si son coût estimé dépasse la limite (QUERY_COST_LIMIT)
+    reject_costly_query(db, text(sql_query), params)
+    
+    # La taille de la matrice est vérifiée par la requête: les cases ne sont transférées que si elle est acceptable
+    result = db.execute(text(sql_query), params).fetchall()
+    row_count, column_count = result[0][0] or 0, result[0][1] or 0
+    if row_count * column_count > PIVOT_MAX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tableau croisé trop grand ({row_count} x {column_count} cases > {PIVOT_MAX_CELLS}), "
+                   f"utilisez rows_limit / columns_limit ou restreignez les filtres"
+        )
+    cells = [row[2:] for row in result if row[-1] is not None]
+    
+    # Ordre des axes: périodes dans l'ordre chronologique, autres champs par effectif décroissant
+    row_keys = pivot_axis([(cell[0], cell[1], cell[2]) for cell in cells], rows in PERIOD_GROUPS)
+    column_keys = pivot_axis([(cell[3], cell[4], cell[5]) for cell in cells], columns in PERIOD_GROUPS)
+    
+    # Matrice dense
+    row_index = {key: index for index, key in enumerate(row_keys)}
+    column_index = {key: index for index, key in enumerate(column_keys)}
+    values = [[0] * len(column_keys) for _ in row_keys]
+    for row_label, row_other, _, column_label, column_other, _, count in cells:
+        values[row_index[(row_label, row_other)]][column_index[(column_label, column_other)]] = count
+    
+    return PivotResponse(
+        row_dimension=rows,
+        column_dimension=columns,
+        rows=[pivot_label(key) for key in row_keys],
+        columns=[pivot_label(key) for key in column_keys],
+        values=values,
+        row_totals=[sum(row) for row in values],
+        column_totals=[sum(column) for column in zip(*values)] if values else [],
+        total=sum(sum(row) for row in values),
+        rows_other=any(other for _, other in row_keys),
+        columns_other=any(other for _, other in column_keys)
+    )
+
+
+def pivot_axis(entries: List[tuple], chronological: bool) -> List[tuple]:
+    """
+    Ordonner les valeurs (libellé, regroupée) d'un axe à partir des (libellé, regroupée, rang) des cases
+    La case « Autres » est toujours la dernière
+    """
+    ranks = {}
+    for label, other, rank in entries:
+        key = (label, other)
+        ranks[key] = min(rank, ranks.get(key, rank))
+    keys = [key for key in ranks if not key[1]]
+    if chronological:
+        keys.sort(key=lambda key: key[0])
+    else:
+        keys.sort(key=lambda key: ranks[key])
+    return keys + [key for key in ranks if key[1]]
+
+
+def pivot_label(key: tuple) -> str:
+    label, other = key
+    if other:
+        return PIVOT_OTHER_LABEL
+    return str(label) if label is not None else "Non défini"
+
+
 @router.get("/export", response_model=List[Dict[str, Any]])
 def export_data(
     search: Optional[str] = None,
     file_name: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    db: Session = Depends(get_db)
+    admitted: AdmissionTicket = Depends(admission("export", get_read_db)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Exporter toutes les données avec filtrage optionnel
@@ -548,52 +675,69 @@ def export_data(
     query = db.query(FileData)
     
     # Appliquer les filtres
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (FileData.reference.ilike(search_term)) |
-            (FileData.id_lin.ilike(search_term)) |
-            (FileData.id_ccu.ilike(search_term)) |
-            (FileData.etat.ilike(search_term)) |
-            (FileData.source.ilike(search_term))
+    query = query.filter(*build_filters(search, file_name, date_from, date_to))
+    
+    # Récupérer toutes les données (sans pagination), dans l'ordre d'insertion
+    query = query.order_by(FileData.id)
+    
+    # Export trop coûteux pour être construit en mémoire: réponse en flux
+    if exceeds_cost_limit(db, query.statement) is not None:
+        admitted.detach()
+        return AdmittedStreamingResponse(
+            stream_export(query.statement, db.get_bind(), admitted.statement_timeout_ms),
+            admitted,
+            media_type="application/json"
         )
     
-    if file_name and file_name != "all":
-        query = query.filter(FileData.file_name == file_name)
-    
-    # Appliquer les filtres de date
-    if date_from:
-        query = query.filter(apply_date_filter(FileData.creation, ">=", date_from))
-    
-    if date_to:
-        query = query.filter(apply_date_filter(FileData.creation, "<=", date_to))
-    
-    # Récupérer toutes les données (sans pagination)
-    items = query.all()
-    
-    # Convertir les objets ORM en dictionnaires
-    result = []
-    for item in items:
-        item_dict = {
-            "reference": item.reference,
-            "id_lin": item.id_lin,
-            "id_ccu": item.id_ccu,
-            "etat": item.etat,
-            "creation": item.creation,
-            "mise_a_jour": item.mise_a_jour,
-            "idrh": item.idrh,
-            "device_id": item.device_id,
-            "retour_metier": item.retour_metier,
-            "commentaires_cloture": item.commentaires_cloture,
-            "nom_bureau_poste": item.nom_bureau_poste,
-            "regate": item.regate,
-            "source": item.source,
-            "solution_scan": item.solution_scan,
-            "rg": item.rg,
-            "ruo": item.ruo,
-            "file_name": item.file_name,
-            "import_date": item.import_date.isoformat() if item.import_date else None
-        }
-        result.append(item_dict)
-    
-    return result
\ No newline at end of file
+    return [export_row(item) for item in query.all()]
+
+
+def export_row(item: FileData) -> Dict[str, Any]:
+    """Convertir un objet ORM en dictionnaire pour l'export"""
+    return {
+        "reference": item.reference,
+        "id_lin": item.id_lin,
+        "id_ccu": item.id_ccu,
+        "etat": item.etat,
+        "creation": item.creation,
+        "mise_a_jour": item.mise_a_jour,
+        "idrh": item.idrh,
+        "device_id": item.device_id,
+        "retour_metier": item.retour_metier,
+        "commentaires_cloture": item.commentaires_cloture,
+        "nom_bureau_poste": item.nom_bureau_poste,
+        "regate": item.regate,
+        "source": item.source,
+        "solution_scan": item.solution_scan,
+        "rg": item.rg,
+        "ruo": item.ruo,
+        "file_name": item.file_name,
+        "import_date": item.import_date.isoformat() if item.import_date else None
+    }
+
+
+def stream_export(statement, bind, statement_timeout_ms: int):
+    """
+    Produire l'export en flux (tableau JSON) par lots lus avec un curseur serveur
+    La session de la requête étant fermée, le flux utilise sa propre session (la place d'admission est libérée par la réponse)
+    Les en-têtes (statut 200) étant déjà envoyés, une erreur en cours de flux termine le tableau par un objet {"error": ...}
+    """
+    db = SessionLocal(bind=bind)
+    try:
+        apply_statement_timeout(db, statement_timeout_ms)
+        yield "["
+        index = 0
+        try:
+            items = db.scalars(statement.execution_options(yield_per=EXPORT_STREAM_BATCH_SIZE))
+            for index, item in enumerate(items, start=1):
+                yield ("," if index > 1 else "") + json.dumps(export_row(item), ensure_ascii=False, separators=(",", ":"))
+        except Exception as e:
+            if is_query_canceled(e):
+                message = "Export interrompu: délai maximal d'exécution dépassé, le résultat est incomplet"
+            else:
+                print(f"Erreur pendant l'export en flux: {str(e)}")
+                message = "Export interrompu par une erreur, le résultat est incomplet"
+            yield ("," if index else "") + json.dumps({"error": message}, ensure_ascii=False)
+        yield "]"
+    finally:
+        db.close()
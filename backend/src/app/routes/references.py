@@ -0,0 +1,129 @@
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.utils.admission import AdmissionTicket, admission
+from src.utils.database import get_read_db, get_read_db_all_files
+from src.utils.filters import parse_filter_date
+from src.utils.schema import ReferenceTimeline, TransitionMatrix
+
+router = APIRouter(
+    prefix="/api/references",
+    tags=["Historique des références"]
+)
+
+UNDEFINED_LABEL = "Non défini"
+
+
+@router.get("/transitions", response_model=TransitionMatrix)
+def get_transition_matrix(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    file_name: Optional[str] = None,
+    admitted: AdmissionTicket = Depends(admission("history", get_read_db)),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Récupérer la matrice des changements d'état sur une période (date du changement)
+    Calculée sur l'historique des références, sans parcourir file_data
+    """
+    conditions = ["TRUE"]
+    params: Dict[str, Any] = {}
+    if date_from:
+        conditions.append("transition_date >= :date_from")
+        params["date_from"] = parse_filter_date(date_from)
+    if date_to:
+        conditions.append("transition_date <= :date_to")
+        params["date_to"] = parse_filter_date(date_to)
+    if file_name and file_name != "all":
+        conditions.append("file_name = :file_name")
+        params["file_name"] = file_name
+
+    # Regrouper sur les codes d'état, puis décoder les quelques groupes obtenus
+    rows = db.execute(text(f"""
+    WITH counts AS (
+        SELECT 
+            sequence = 1 AS initial, from_etat_id, to_etat_id, COUNT(*) AS count
+        FROM 
+            reference_transitions
+        WHERE 
+            {" AND ".join(conditions)}
+        GROUP BY 
+            1, 2, 3
+    )
+    SELECT 
+        c.initial, df.value, dt.value, c.count
+    FROM 
+        counts c
+        LEFT JOIN dict_etat df ON df.id = c.from_etat_id
+        LEFT JOIN dict_etat dt ON dt.id = c.to_etat_id
+    """), params).fetchall()
+
+    # Matrice dense sur les états rencontrés, triés par libellé
+    rows = [
+        (initial, etat_from or UNDEFINED_LABEL, etat_to or UNDEFINED_LABEL, count)
+        for initial, etat_from, etat_to, count in rows
+    ]
+    states = sorted({etat_to for _, _, etat_to, _ in rows} | {etat_from for initial, etat_from, _, _ in rows if not initial})
+    index = {state: position for position, state in enumerate(states)}
+    matrix = [[0] * len(states) for _ in states]
+    initial_counts = [0] * len(states)
+    for initial, etat_from, etat_to, count in rows:
+        if initial:
+            initial_counts[index[etat_to]] += count
+        else:
+            matrix[index[etat_from]][index[etat_to]] += count
+
+    return {
+        "states": states,
+        "matrix": matrix,
+        "initial": initial_counts,
+        "total_transitions": sum(sum(line) for line in matrix)
+    }
+
+
+@router.get("/{reference}/timeline", response_model=ReferenceTimeline)
+def get_reference_timeline(
+    reference: str,
+    admitted: AdmissionTicket = Depends(admission("history", get_read_db_all_files)),
+    db: Session = Depends(get_read_db_all_files)
+):
+    """
+    Récupérer l'évolution d'une référence: première observation puis chaque changement d'état
+    """
+    rows = db.execute(text("""
+    SELECT 
+        rt.sequence, rt.transition_date, df.value AS etat_from, dt.value AS etat_to,
+        rt.file_name, rt.file_data_id, fd.creation, fd.mise_a_jour
+    FROM 
+        reference_transitions rt
+        LEFT JOIN dict_etat df ON df.id = rt.from_etat_id
+        LEFT JOIN dict_etat dt ON dt.id = rt.to_etat_id
+        LEFT JOIN file_data fd ON fd.id = rt.file_data_id
+    WHERE 
+        rt.reference = :reference
+    ORDER BY 
+        rt.sequence
+    """), {"reference": reference}).fetchall()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Aucun historique trouvé pour la référence {reference}")
+
+    return {
+        "reference": reference,
+        "transitions": [
+            {
+                "sequence": sequence,
+                "date": transition_date,
+                "initial": sequence == 1,
+                "etat_from": etat_from,
+                "etat_to": etat_to,
+                "file_name": file_name,
+                "file_data_id": file_data_id,
+                "creation": creation,
+                "mise_a_jour": mise_a_jour
+            }
+            for sequence, transition_date, etat_from, etat_to, file_name, file_data_id, creation, mise_a_jour in rows
+        ]
+    }
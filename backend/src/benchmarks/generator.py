@@ -0,0 +1,226 @@
+"""
+Synthetic FileData dataset generator.
+
+Datasets are generated chunk by chunk with numpy/pandas so that even the
+10M rows preset can be produced and loaded with bounded memory. The data
+mimics real imports: mixed DD/MM/YYYY and ISO `creation` strings, skewed
+`etat`/`source` distributions, references reappearing across files and a
+small amount of whitespace/casing noise.
+"""
+
+import io
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils.dictionary import DICTIONARY_COLUMNS
+from src.utils.normalization import DATE_COLUMNS, normalize_frame
+
+# Named dataset sizes
+PRESETS = {
+    "small": 10_000,
+    "medium": 1_000_000,
+    "large": 10_000_000,
+}
+
+CHUNK_SIZE = 100_000
+
+# Columns written by the generator (every FileData column except id/import_date)
+COLUMNS = [
+    "reference", "id_lin", "id_ccu", "etat", "creation", "mise_a_jour", "idrh",
+    "device_id", "retour_metier", "commentaires_cloture", "nom_bureau_poste",
+    "regate", "source", "solution_scan", "rg", "ruo", "file_name",
+]
+
+# Skewed categorical distributions (value, weight)
+ETATS = [
+    ("Clôturé", 45), ("En cours", 20), ("Ouvert", 12), ("En attente", 8),
+    ("Résolu", 6), ("Annulé", 4), ("Rejeté", 3), ("Escaladé", 2),
+]
+SOURCES = [
+    ("Scan", 50), ("Portail", 25), ("Mail", 12), ("Téléphone", 8),
+    ("Agence", 4), ("API", 1),
+]
+SOLUTIONS_SCAN = [("Mobile", 60), ("Fixe", 30), ("Tablette", 9), ("Aucune", 1)]
+RETOURS_METIER = [
+    "Colis remis", "Adresse incomplète", "Destinataire absent", "Refusé",
+]
+COMMENTAIRES = ["RAS", "Traité en agence", "Relance client", "Doublon"]
+
+DATE_START = np.datetime64("2022-01-01")
+DATE_DAYS = 4 * 365
+ISO_FORMAT_RATIO = 0.4
+NOISE_RATIO = 0.02
+EMPTY_RATIO = 0.03
+
+
+def resolve_size(size: str) -> int:
+    """
+    Convert a preset name ("small", "medium", "large") or an integer string
+    to a number of rows.
+    """
+    if size in PRESETS:
+        return PRESETS[size]
+    try:
+        rows = int(size.replace("_", ""))
+    except ValueError:
+        raise ValueError(f"Taille de jeu de données inconnue: {size}")
+    if rows <= 0:
+        raise ValueError("Le nombre de lignes doit être positif")
+    return rows
+
+
+def file_count(rows: int) -> int:
+    """Number of distinct imported files for a dataset size."""
+    return max(5, rows // 20_000)
+
+
+def _weighted_choice(rng: np.random.Generator, choices, size: int) -> np.ndarray:
+    values = np.array([value for value, _ in choices], dtype=object)
+    weights = np.array([weight for _, weight in choices], dtype=float)
+    return rng.choice(values, size=size, p=weights / weights.sum())
+
+
+def _add_noise(rng: np.random.Generator, values: np.ndarray) -> np.ndarray:
+    """Introduce casing/whitespace variants and empty strings, as seen in real exports."""
+    values = values.copy()
+    size = len(values)
+    noisy = rng.random(size) < NOISE_RATIO
+    values[noisy] = [
+        f" {value.lower()} " if i % 2 else value.upper()
+        for i, value in enumerate(values[noisy])
+    ]
+    empty = rng.random(size) < EMPTY_RATIO
+    values[empty] = ""
+    return values
+
+
+def _format_dates(rng: np.random.Generator, dates: pd.Series) -> np.ndarray:
+    """Format dates as a mix of DD/MM/YYYY and ISO strings."""
+    french = dates.dt.strftime("%d/%m/%Y").to_numpy(dtype=object)
+    iso = dates.dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy(dtype=object)
+    return np.where(rng.random(len(dates)) < ISO_FORMAT_RATIO, iso, french)
+
+
+def generate_chunk(rng: np.random.Generator, start: int, size: int, total_rows: int) -> pd.DataFrame:
+    """
+    Generate rows [start, start + size) of a dataset of total_rows rows.
+    """
+    files = file_count(total_rows)
+    positions = np.arange(start, start + size)
+
+    # Files hold contiguous blocks of rows, like successive imports
+    file_index = positions * files // total_rows
+    file_names = np.char.add("export_", np.char.zfill(file_index.astype(str), 5))
+    file_names = np.char.add(file_names, ".csv")
+
+    # References are shared between files so that tickets reappear across imports
+    reference_pool = max(1, total_rows // 3)
+    references = rng.integers(0, reference_pool, size)
+
+    creation = pd.Series(
+        DATE_START
+        + rng.integers(0, DATE_DAYS, size).astype("timedelta64[D]")
+        + rng.integers(0, 86_400, size).astype("timedelta64[s]")
+    )
+    mise_a_jour = creation + pd.to_timedelta(rng.integers(0, 30, size), unit="D")
+
+    bureaux = rng.zipf(1.3, size) % 300
+
+    data = {
+        "reference": np.char.add("REF", np.char.zfill(references.astype(str), 9)),
+        "id_lin": np.char.add("LIN", rng.integers(0, 10**8, size).astype(str)),
+        "id_ccu": np.char.add("CCU", rng.integers(0, 10**8, size).astype(str)),
+        "etat": _add_noise(rng, _weighted_choice(rng, ETATS, size)),
+        "creation": _format_dates(rng, creation),
+        "mise_a_jour": _format_dates(rng, mise_a_jour),
+        "idrh": np.char.add("RH", np.char.zfill(rng.integers(0, 500, size).astype(str), 5)),
+        "device_id": np.char.add("DEV-", rng.integers(0, 5_000, size).astype(str)),
+        "retour_metier": np.where(
+            rng.random(size) < 0.3, rng.choice(RETOURS_METIER, size), None
+        ),
+        "commentaires_cloture": np.where(
+            rng.random(size) < 0.2, rng.choice(COMMENTAIRES, size), None
+        ),
+        "nom_bureau_poste": np.char.add("BUREAU ", bureaux.astype(str)),
+        "regate": np.char.zfill((100_000 + bureaux).astype(str), 6),
+        "source": _add_noise(rng, _weighted_choice(rng, SOURCES, size)),
+        "solution_scan": _weighted_choice(rng, SOLUTIONS_SCAN, size),
+        "rg": np.char.add("RG", (bureaux % 12).astype(str)),
+        "ruo": np.char.add("RUO", (bureaux % 40).astype(str)),
+        "file_name": file_names,
+    }
+    return pd.DataFrame({column: pd.Series(data[column], dtype=object) for column in COLUMNS})
+
+
+def generate_dataset(rows: int, seed: int = 42, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yield a reproducible dataset of `rows` rows as DataFrame chunks.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_size):
+        yield generate_chunk(rng, start, min(chunk_size, rows - start), rows)
+
+
+def generate_records(rows: int, seed: int = 42, file_name: Optional[str] = None) -> List[Dict]:
+    """
+    Generate rows as API payload records (dicts with None for missing values).
+    """
+    frame = pd.concat(list(generate_dataset(rows, seed)), ignore_index=True)
+    if file_name is not None:
+        frame["file_name"] = file_name
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict(orient="records")
+
+
+def copy_dataframe(cursor, frame: pd.DataFrame, table: str = "file_data") -> None:
+    """
+    Bulk load a DataFrame with COPY ... FROM STDIN using a psycopg2 cursor.
+    """
+    buffer = io.StringIO()
+    # \N marks NULLs so that empty strings are preserved as such
+    frame.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+
+
+def load_dataframe(cursor, frame: pd.DataFrame) -> None:
+    """
+    Load generated rows into file_data, encoding the dictionary columns in SQL.
+
+    Rows go through the same normalization stage as the API imports, are
+    copied into a temporary staging table holding the API column names, new
+    dictionary values are added, then the rows are inserted with their codes.
+    """
+    frame, _ = normalize_frame(frame)
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS file_data_staging ("
+        + ", ".join(f"{column} text" for column in COLUMNS)
+        + ", " + ", ".join(f"{column} date" for column in DATE_COLUMNS.values())
+        + ")"
+    )
+    cursor.execute("TRUNCATE file_data_staging")
+    copy_dataframe(cursor, frame, "file_data_staging")
+
+    for column in DICTIONARY_COLUMNS:
+        cursor.execute(
+            f"INSERT INTO dict_{column} (value) "
+            f"SELECT DISTINCT {column} FROM file_data_staging WHERE {column} IS NOT NULL "
+            f"ON CONFLICT DO NOTHING"
+        )
+
+    plain_columns = [column for column in frame.columns if column not in DICTIONARY_COLUMNS]
+    target = plain_columns + [f"{column}_id" for column in DICTIONARY_COLUMNS]
+    selected = [f"s.{column}" for column in plain_columns] + [f"d_{column}.id" for column in DICTIONARY_COLUMNS]
+    joins = " ".join(
+        f"LEFT JOIN dict_{column} d_{column} ON lower(d_{column}.value) = lower(s.{column})"
+        for column in DICTIONARY_COLUMNS
+    )
+    cursor.execute(
+        f"INSERT INTO file_data ({', '.join(target)}) "
+        f"SELECT {', '.join(selected)} FROM file_data_staging s {joins}"
+    )
@@ -0,0 +1,519 @@
+"""
+Benchmark harness for the file_data API.
+
+Loads a synthetic dataset into a dedicated PostgreSQL database (never the
+application database) and times every route of src/app/routes/file_data.py,
+reporting p50/p95 latencies and the memory used by each scenario. Results are stored as JSON so
+that a later run can be compared against them with --compare.
+
+With --backends, the analytics routes (/aggregate, /distribution, /stats)
+are also timed on each analytics backend (PostgreSQL and the DuckDB
+snapshot), checking that every backend returns the same responses.
+
+Usage:
+    poetry run benchmark --size small
+    poetry run benchmark --size medium --repeat 20 --compare benchmark_results/<run>.json
+    poetry run benchmark --skip-load --backends postgres duckdb
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+BENCHMARK_FILE_NAME = "benchmark_ingest.csv"
+INGEST_BATCH_SIZE = 1_000
+DEFAULT_RESULTS_DIR = Path(__file__).resolve().parents[2] / "benchmark_results"
+ANALYTICS_SCENARIO_PREFIXES = ("aggregate", "distribution", "stats", "dashboard")
+
+
+def prepare_database(database_name: str) -> None:
+    """
+    Point the application at the benchmark database, creating it if needed.
+
+    Must be called before the engine is created, since it reads DB_NAME.
+    """
+    load_dotenv()
+    os.environ["DB_NAME"] = database_name
+
+    maintenance_url = (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
+        f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/postgres"
+    )
+    engine = create_engine(maintenance_url, isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"),
+            {"name": database_name}
+        ).scalar()
+        if not exists:
+            connection.execute(text(
+                f'CREATE DATABASE "{database_name}" ENCODING \'UTF8\' TEMPLATE template0'
+            ))
+    engine.dispose()
+
+
+def load_dataset(engine, rows: int, seed: int) -> float:
+    """
+    Replace the content of file_data (and its dictionaries) with a generated
+    dataset using COPY, then rebuild the reference history in one pass.
+
+    Returns the load duration in seconds.
+    """
+    from src.benchmarks.generator import generate_dataset, load_dataframe
+    from src.utils.dictionary import DICTIONARY_COLUMNS, dictionary_cache
+    from src.utils.history import REBUILD_HISTORY_SQL
+
+    start = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        tables = ["file_data", "import_reports", "reference_transitions"] + [
+            f"dict_{column}" for column in DICTIONARY_COLUMNS
+        ]
+        cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+        dictionary_cache.clear()
+        loaded = 0
+        for chunk in generate_dataset(rows, seed):
+            load_dataframe(cursor, chunk)
+            loaded += len(chunk)
+            print(f"  {loaded:>12,} / {rows:,} lignes chargées", end="\r")
+        cursor.execute(REBUILD_HISTORY_SQL)
+        connection.commit()
+        print()
+        for table in tables:
+            cursor.execute(f"ANALYZE {table}")
+        connection.commit()
+    finally:
+        connection.close()
+    return time.perf_counter() - start
+
+
+def build_scenarios(rows: int, file_names: List[str], include_full_export: bool) -> List[Dict[str, Any]]:
+    """
+    Describe the requests to time, covering every route of file_data.py.
+    """
+    from src.benchmarks.generator import generate_records
+
+    base = "/api/file-data"
+    sample_file = file_names[len(file_names) // 2] if file_names else "all"
+    period = {"date_from": "2023-01-01", "date_to": "2023-06-30"}
+    ingest_payload = {"data": generate_records(INGEST_BATCH_SIZE, seed=7, file_name=BENCHMARK_FILE_NAME)}
+
+    scenarios = [
+        {"name": "ingest", "method": "POST", "path": f"{base}/", "json": ingest_payload,
+         "teardown": ("DELETE", f"{base}/{BENCHMARK_FILE_NAME}")},
+        {"name": "list_first_page", "method": "GET", "path": f"{base}/", "params": {"skip": 0, "limit": 100}},
+        {"name": "list_middle_page", "method": "GET", "path": f"{base}/",
+         "params": {"skip": rows // 2, "limit": 100}},
+        {"name": "list_last_page", "method": "GET", "path": f"{base}/",
+         "params": {"skip": max(0, rows - 100), "limit": 100}},
+        {"name": "list_filtered", "method": "GET", "path": f"{base}/",
+         "params": {"file_name": sample_file, **period}},
+        {"name": "search", "method": "GET", "path": f"{base}/", "params": {"search": "REF0000012"}},
+        {"name": "files", "method": "GET", "path": f"{base}/files"},
+        {"name": "stats", "method": "GET", "path": f"{base}/stats"},
+        {"name": "stats_filtered", "method": "GET", "path": f"{base}/stats",
+         "params": {"search": "cours", **period}},
+        {"name": "export_file", "method": "GET", "path": f"{base}/export",
+         "params": {"file_name": sample_file}},
+        {"name": "delete", "method": "DELETE", "path": f"{base}/{BENCHMARK_FILE_NAME}",
+         "setup": ("POST", f"{base}/", ingest_payload)},
+    ]
+    for group_by in ("jour", "semaine", "mois", "annee"):
+        scenarios.append({"name": f"aggregate_{group_by}", "method": "GET", "path": f"{base}/aggregate",
+                          "params": {"group_by": group_by}})
+    scenarios.append({"name": "aggregate_mois_search", "method": "GET", "path": f"{base}/aggregate",
+                      "params": {"group_by": "mois", "search": "cours", **period}})
+    for field in ("etat", "source", "file_name", "nom_bureau_poste"):
+        scenarios.append({"name": f"distribution_{field}", "method": "GET", "path": f"{base}/distribution",
+                          "params": {"field": field}})
+    # Tableau de bord en un seul appel, à comparer aux scénarios stats, aggregate_mois et distribution_*
+    dashboard_widgets = ["stats", "aggregate:mois", "distribution:etat", "distribution:source",
+                         "distribution:file_name", "distribution:nom_bureau_poste"]
+    scenarios.append({"name": "dashboard", "method": "GET", "path": f"{base}/dashboard",
+                      "params": {"widgets": dashboard_widgets}})
+    scenarios.append({"name": "dashboard_filtered", "method": "GET", "path": f"{base}/dashboard",
+                      "params": {"widgets": dashboard_widgets, "search": "cours", **period}})
+    scenarios.append({"name": "pivot_etat_mois", "method": "GET", "path": f"{base}/pivot",
+                      "params": {"rows": "etat", "columns": "mois"}})
+    scenarios.append({"name": "pivot_bureau_source_top", "method": "GET", "path": f"{base}/pivot",
+                      "params": {"rows": "nom_bureau_poste", "columns": "source", "rows_limit": 20, **period}})
+    scenarios.append({"name": "sample", "method": "GET", "path": f"{base}/sample",
+                      "params": {"size": 100, "seed": 1}})
+    scenarios.append({"name": "sample_filtered", "method": "GET", "path": f"{base}/sample",
+                      "params": {"size": 100, "seed": 1, "file_name": sample_file}})
+    scenarios.append({"name": "reference_timeline", "method": "GET",
+                      "path": "/api/references/REF000000002/timeline"})
+    scenarios.append({"name": "transition_matrix", "method": "GET", "path": "/api/references/transitions",
+                      "params": period})
+    if include_full_export:
+        scenarios.append({"name": "export_all", "method": "GET", "path": f"{base}/export"})
+    return scenarios
+
+
+def _send(client, method: str, path: str, params=None, json_body=None):
+    response = client.request(method, path, params=params, json=json_body)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {path} a échoué ({response.status_code}): {response.text[:200]}")
+    return response
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in [0, 100])."""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    """Read a memory field (VmRSS, VmHWM) of /proc/self/status, in kB."""
+    try:
+        with open("/proc/self/status") as status:
+            match = re.search(rf"^{field}:\s+(\d+) kB", status.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Reset the resident set high-water mark (VmHWM) of this process, so that
+    it only covers what runs next. Linux only; returns False elsewhere.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def run_scenario(client, scenario: Dict[str, Any], repeat: int, warmup: int, in_process: bool) -> Dict[str, Any]:
+    """
+    Time a scenario `repeat` times after `warmup` untimed runs, then measure
+    its memory usage in one extra traced run: peak Python allocations and
+    peak resident memory above the resident memory before the run (the
+    high-water mark is reset first, so earlier scenarios do not count).
+    """
+    def execute():
+        if "setup" in scenario:
+            method, path, body = scenario["setup"]
+            _send(client, method, path, json_body=body)
+        start = time.perf_counter()
+        response = _send(client, scenario["method"], scenario["path"],
+                         scenario.get("params"), scenario.get("json"))
+        elapsed = time.perf_counter() - start
+        if "teardown" in scenario:
+            method, path = scenario["teardown"]
+            _send(client, method, path)
+        return elapsed, len(response.content)
+
+    for _ in range(warmup):
+        execute()
+
+    latencies = []
+    response_bytes = 0
+    for _ in range(repeat):
+        elapsed, response_bytes = execute()
+        latencies.append(elapsed * 1000)
+
+    # Python allocations are only visible when the app runs in this process
+    peak_memory_kb = None
+    peak_rss_delta_kb = None
+    if in_process:
+        rss_before_kb = _read_status_kb("VmRSS") if _reset_peak_rss() else None
+        tracemalloc.start()
+        execute()
+        peak_memory_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        peak_rss_kb = _read_status_kb("VmHWM")
+        if rss_before_kb is not None and peak_rss_kb is not None:
+            peak_rss_delta_kb = max(0, peak_rss_kb - rss_before_kb)
+
+    return {
+        "runs": repeat,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "min_ms": round(min(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "peak_python_memory_kb": round(peak_memory_kb, 1) if peak_memory_kb is not None else None,
+        "peak_rss_delta_kb": peak_rss_delta_kb,
+        "response_bytes": response_bytes,
+    }
+
+
+@contextlib.contextmanager
+def isolated_analytics_snapshot():
+    """
+    Swap the analytics snapshot of the app for one in a temporary directory
+    (removed afterwards), so that the benchmark data never reaches the
+    snapshot of the application (ANALYTICS_SNAPSHOT_DIR): ingest and delete
+    scenarios update the snapshot, and --backends rebuilds it.
+    """
+    import src.app.api
+    import src.app.routes.admin
+    import src.app.routes.file_data
+    import src.utils.analytics
+    from src.utils.analytics import AnalyticsSnapshot
+    from src.utils.settings import ANALYTICS_SNAPSHOT_BATCH_SIZE
+
+    modules = [src.utils.analytics, src.app.api, src.app.routes.admin, src.app.routes.file_data]
+    previous = [module.analytics_snapshot for module in modules]
+    with tempfile.TemporaryDirectory(prefix="benchmark_snapshot_") as directory:
+        snapshot = AnalyticsSnapshot(directory, "postgres", ANALYTICS_SNAPSHOT_BATCH_SIZE)
+        for module in modules:
+            module.analytics_snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            for module, original in zip(modules, previous):
+                module.analytics_snapshot = original
+
+
+def compare_backends(client, analytics_snapshot, scenarios: List[Dict[str, Any]], backends: List[str],
+                     repeat: int, warmup: int) -> Dict[str, Any]:
+    """
+    Time the analytics scenarios on each analytics backend and check that
+    they all return the same responses. The snapshot is the isolated one of
+    isolated_analytics_snapshot().
+
+    Returns the results per backend, the snapshot rebuild duration and the
+    scenarios whose responses differ.
+    """
+    if not analytics_snapshot.available:
+        raise RuntimeError("--backends nécessite les extras \"analytics\" (duckdb, pyarrow)")
+
+    configured_backend = analytics_snapshot.backend
+    analytics_scenarios = [
+        scenario for scenario in scenarios if scenario["name"].startswith(ANALYTICS_SCENARIO_PREFIXES)
+    ]
+    comparison = {"snapshot_seconds": None, "results": {}, "mismatches": []}
+    responses: Dict[str, Dict[str, Any]] = {}
+    try:
+        analytics_snapshot.backend = "duckdb"
+        start = time.perf_counter()
+        if analytics_snapshot.rebuild(full=True) is None:
+            raise RuntimeError("La construction de l'instantané analytique a échoué")
+        comparison["snapshot_seconds"] = round(time.perf_counter() - start, 3)
+
+        for backend in backends:
+            analytics_snapshot.backend = backend
+            comparison["results"][backend] = {}
+            for scenario in analytics_scenarios:
+                response = _send(client, scenario["method"], scenario["path"], scenario.get("params"))
+                responses.setdefault(scenario["name"], {})[backend] = response.json()
+                comparison["results"][backend][scenario["name"]] = run_scenario(
+                    client, scenario, repeat, warmup, in_process=True
+                )
+    finally:
+        analytics_snapshot.backend = configured_backend
+
+    print(f"\nInstantané analytique construit en {comparison['snapshot_seconds']:.2f} s")
+    print(f"{'scénario (p50 ms)':<28}" + "".join(f"{backend:>12}" for backend in backends) + f"{'identique':>12}")
+    for scenario in analytics_scenarios:
+        name = scenario["name"]
+        answers = list(responses[name].values())
+        identical = all(answer == answers[0] for answer in answers)
+        if not identical:
+            comparison["mismatches"].append(name)
+        print(f"{name:<28}"
+              + "".join(f"{comparison['results'][backend][name]['p50_ms']:>12.1f}" for backend in backends)
+              + f"{'oui' if identical else 'NON':>12}")
+    return comparison
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Print p50/p95 deltas against a baseline and return the regressed scenarios.
+    """
+    regressions = []
+    print(f"\nComparaison avec {baseline['run_id']} (tolérance {tolerance:.0%})")
+    print(f"{'scénario':<28}{'p50 avant':>12}{'p50 après':>12}{'Δ p50':>9}{'p95 avant':>12}{'p95 après':>12}{'Δ p95':>9}")
+    for name, result in current["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None:
+            print(f"{name:<28}{'(nouveau)':>12}")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms"):
+            deltas.append((result[key] - previous[key]) / previous[key] if previous[key] else 0.0)
+        flag = ""
+        if any(delta > tolerance for delta in deltas):
+            regressions.append(name)
+            flag = "  ⚠️ régression"
+        print(f"{name:<28}{previous['p50_ms']:>12.1f}{result['p50_ms']:>12.1f}{deltas[0]:>+9.0%}"
+              f"{previous['p95_ms']:>12.1f}{result['p95_ms']:>12.1f}{deltas[1]:>+9.0%}{flag}")
+    return regressions
+
+
+def check_target(client, engine) -> None:
+    """
+    Check that the server measured with --base-url serves the benchmark
+    database: same files and same number of rows. Otherwise the scenarios
+    (built from the benchmark database) would time another dataset.
+    """
+    with engine.connect() as connection:
+        total, file_names = connection.execute(
+            text("SELECT count(*), array_agg(DISTINCT file_name) FROM file_data")
+        ).one()
+    served_files = _send(client, "GET", "/api/file-data/files").json()
+    served_total = _send(client, "GET", "/api/file-data/stats").json()["total_entries"]
+    if served_total != total or sorted(served_files) != sorted(file_names or []):
+        raise RuntimeError(
+            f"Le serveur {client.base_url} ne sert pas la base de benchmark "
+            f"({served_total:,} lignes, {len(served_files)} fichiers au lieu de {total:,} lignes, "
+            f"{len(file_names or [])} fichiers)"
+        )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark des routes file_data")
+    parser.add_argument("--size", default="small",
+                        help="small (10k), medium (1M), large (10M) ou un nombre de lignes")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur de données")
+    parser.add_argument("--repeat", type=int, default=10, help="Nombre de mesures par scénario")
+    parser.add_argument("--warmup", type=int, default=1, help="Exécutions non mesurées par scénario")
+    parser.add_argument("--database", default=None,
+                        help="Base de benchmark (défaut: <DB_NAME>_benchmark)")
+    parser.add_argument("--base-url", default=None,
+                        help="Mesurer un serveur déjà lancé, connecté à la base de benchmark "
+                             "(avec --skip-load), au lieu de l'application en mémoire")
+    parser.add_argument("--skip-load", action="store_true", help="Réutiliser les données déjà chargées")
+    parser.add_argument("--only", nargs="*", default=None, help="Ne lancer que ces scénarios")
+    parser.add_argument("--full-export", action="store_true", help="Inclure l'export non filtré")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", type=Path, default=None, help="Résultats de référence (JSON)")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Hausse relative de p50/p95 considérée comme une régression")
+    parser.add_argument("--backends", nargs="*", default=None, choices=["postgres", "duckdb"],
+                        help="Comparer les routes d'analyse sur ces moteurs (application en mémoire uniquement)")
+    args = parser.parse_args(argv)
+    # Le jeu de données est chargé dans la base locale, que le serveur distant n'utilise pas forcément
+    if args.base_url and not args.skip_load:
+        parser.error("--base-url nécessite --skip-load : chargez d'abord les données sans --base-url, "
+                     "puis lancez le serveur sur la base de benchmark")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from src.benchmarks.generator import resolve_size
+    rows = resolve_size(args.size)
+
+    load_dotenv()
+    database_name = args.database or f"{os.getenv('DB_NAME', 'data')}_benchmark"
+    prepare_database(database_name)
+
+    # Imported only now so that the app binds to the benchmark database
+    from src.app.api import app
+    from src.utils.database import get_engine
+    from src.utils.migrations import upgrade_database
+
+    upgrade_database()
+    engine = get_engine()
+
+    metadata = {
+        "run_id": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + f"-{rows}",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "rows": rows,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "database": database_name,
+        "target": args.base_url or "in-process",
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+    if not args.skip_load:
+        print(f"Chargement de {rows:,} lignes dans {database_name}...")
+        metadata["load_seconds"] = round(load_dataset(engine, rows, args.seed), 3)
+
+    with engine.connect() as connection:
+        metadata["postgres"] = connection.execute(text("SHOW server_version")).scalar()
+        file_names = [
+            row[0] for row in connection.execute(
+                text("SELECT DISTINCT file_name FROM file_data ORDER BY file_name")
+            )
+        ]
+
+    if args.base_url:
+        import httpx
+        client = httpx.Client(base_url=args.base_url, timeout=None)
+        check_target(client, engine)
+        snapshot_context = contextlib.nullcontext(None)
+    else:
+        from fastapi.testclient import TestClient
+        client = TestClient(app)
+        snapshot_context = isolated_analytics_snapshot()
+
+    scenarios = build_scenarios(rows, file_names, args.full_export)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario["name"] in args.only]
+
+    results = {**metadata, "scenarios": {}}
+    with snapshot_context as analytics_snapshot:
+        print(f"\n{'scénario':<28}{'p50 (ms)':>12}{'p95 (ms)':>12}{'mémoire (Ko)':>15}{'RSS (Ko)':>12}{'octets':>12}")
+        for scenario in scenarios:
+            result = run_scenario(client, scenario, args.repeat, args.warmup, args.base_url is None)
+            results["scenarios"][scenario["name"]] = result
+            memory, rss = result["peak_python_memory_kb"], result["peak_rss_delta_kb"]
+            print(f"{scenario['name']:<28}{result['p50_ms']:>12.1f}{result['p95_ms']:>12.1f}"
+                  f"{(memory if memory is not None else float('nan')):>15.0f}"
+                  f"{(rss if rss is not None else float('nan')):>12.0f}{result['response_bytes']:>12,}")
+
+        if args.backends:
+            if args.base_url:
+                print("⚠️  --backends est ignoré avec --base-url")
+            else:
+                results["backends"] = compare_backends(
+                    client, analytics_snapshot, scenarios, args.backends, args.repeat, args.warmup
+                )
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = args.output_dir / f"{results['run_id']}.json"
+    output_path.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"\n✅ Résultats enregistrés dans {output_path}")
+
+    if results.get("backends", {}).get("mismatches"):
+        print(f"❌ Réponses différentes selon le moteur: {', '.join(results['backends']['mismatches'])}")
+        sys.exit(1)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("rows") != rows:
+            print(f"⚠️  La référence a été mesurée sur {baseline.get('rows'):,} lignes")
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Régressions détectées: {', '.join(regressions)}")
+            sys.exit(1)
@@ -1,4 +1,75 @@
+import importlib.util
+import os
 import uvicorn
+from src.utils.settings import (
+    SERVER_MODE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_BACKLOG,
+    SERVER_KEEPALIVE,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_LIMIT_CONCURRENCY,
+    SERVER_LIMIT_MAX_REQUESTS,
+    SERVER_ACCESS_LOG,
+    WEB_CONCURRENCY,
+)
+
+
+def get_worker_count() -> int:
+    """
+    Number of worker processes: WEB_CONCURRENCY, or one per available CPU.
+    """
+    if WEB_CONCURRENCY > 0:
+        return WEB_CONCURRENCY
+    try:
+        # Respects the CPU set allocated to the container
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def _implementation(module: str, name: str) -> str:
+    """Use the fast implementation when installed, uvicorn's default otherwise."""
+    if importlib.util.find_spec(module) is None:
+        print(f"⚠️  {module} n'est pas installé, utilisation de l'implémentation par défaut")
+        return "auto"
+    return name
+
+
+def run_development():
+    """Single process with auto-reload, for local development."""
+    uvicorn.run("src.app.api:app", host=SERVER_HOST, port=SERVER_PORT, reload=True)
+
+
+def run_production():
+    """
+    Multi-process server using every core, with uvloop/httptools, tuned
+    keep-alive/backlog and graceful shutdown.
+    """
+    workers = get_worker_count()
+    # Workers inherit the environment: each one sizes its DB pool from this value
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    print(f"🚀 Démarrage en mode production avec {workers} workers")
+
+    uvicorn.run(
+        "src.app.api:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=workers,
+        loop=_implementation("uvloop", "uvloop"),
+        http=_implementation("httptools", "httptools"),
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEPALIVE,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        limit_concurrency=SERVER_LIMIT_CONCURRENCY,
+        limit_max_requests=SERVER_LIMIT_MAX_REQUESTS,
+        access_log=SERVER_ACCESS_LOG,
+        proxy_headers=True,
+    )
+
 
 def main():
-    uvicorn.run("src.app.api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if SERVER_MODE == "production":
+        run_production()
+    else:
+        run_development()
@@ -0,0 +1,306 @@
+"""
+Admission control of the heavy routes.
+
+- Each route has a concurrency limit (a semaphore per worker), and all the
+  admitted routes of a worker share a total limit derived from the size of
+  its connection pool, so that admitted requests never wait for a pooled
+  connection. A request waits at most ADMISSION_QUEUE_TIMEOUT seconds for
+  a slot, then gets a 503 with a Retry-After header instead of piling up
+  on the database. The wait happens on the event loop (asyncio
+  semaphores) before the session is opened: queued requests hold neither
+  a threadpool thread nor a connection.
+- Every admitted request runs with a statement_timeout (SET LOCAL in each
+  transaction, so the pooled connection is left untouched). A cancelled
+  query is answered with a 503 as well.
+- Optionally (QUERY_COST_LIMIT), the planner cost of a query is checked with
+  EXPLAIN before running it, so that the routes can reject (429) or
+  downgrade the queries that would pin a connection for a long time.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from psycopg2 import errors as pg_errors
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from src.utils.settings import (
+    ADMISSION_LIMITS,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_RESERVED_CONNECTIONS,
+    ADMISSION_TOTAL_LIMIT,
+    STATEMENT_TIMEOUT_MS,
+    STATEMENT_TIMEOUTS,
+    QUERY_COST_LIMIT,
+)
+
+
+def retry_headers() -> Dict[str, str]:
+    return {"Retry-After": str(ADMISSION_RETRY_AFTER)}
+
+
+def overloaded_error(route: str) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"Service surchargé ({route}), veuillez réessayer dans quelques secondes",
+        headers=retry_headers()
+    )
+
+
+class AdmissionTicket:
+    """
+    Slots held by an admitted request. The route may keep them after
+    returning (streamed responses) with detach() and release them itself.
+
+    The semaphores belong to the event loop of the worker: a release from
+    another thread (the threadpool of the sync routes) is handed over to it.
+    """
+
+    def __init__(self, semaphores: List[asyncio.Semaphore], statement_timeout_ms: int,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._semaphores = semaphores
+        self._loop = loop
+        self.statement_timeout_ms = statement_timeout_ms
+        self.detached = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    def detach(self) -> "AdmissionTicket":
+        self.detached = True
+        return self
+
+    def _release_semaphores(self) -> None:
+        for semaphore in reversed(self._semaphores):
+            semaphore.release()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if not self._semaphores:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None or running is self._loop:
+            self._release_semaphores()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._release_semaphores)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streamed response holding a detached admission slot until it is done.
+
+    The slot is released when the response ends, however it ends: body
+    fully sent, client gone while streaming, or client gone before the
+    first chunk (the generator then never runs, so its own cleanup cannot
+    be relied upon).
+    """
+
+    def __init__(self, content, ticket: AdmissionTicket, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
+
+
+async def _acquire(semaphore: asyncio.Semaphore, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+class RouteLimiter:
+    """
+    Concurrency limit of one route, shared by the requests of this worker,
+    optionally within a limit shared by every admitted route.
+    """
+
+    def __init__(self, route: str, limit: int, queue_timeout: float,
+                 total: Optional[asyncio.Semaphore] = None):
+        self.route = route
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        self._total = total
+
+    async def acquire(self) -> AdmissionTicket:
+        """
+        Wait for a slot of the route, then for a slot of the worker, within
+        the same queue timeout.
+
+        Raises:
+            HTTPException: 503 if no slot was freed within the queue timeout
+        """
+        timeout_ms = STATEMENT_TIMEOUTS.get(self.route, STATEMENT_TIMEOUT_MS)
+        deadline = time.monotonic() + self.queue_timeout
+        acquired: List[asyncio.Semaphore] = []
+        for semaphore in (self._semaphore, self._total):
+            if semaphore is None:
+                continue
+            if not await _acquire(semaphore, max(0.0, deadline - time.monotonic())):
+                for held in reversed(acquired):
+                    held.release()
+                raise overloaded_error(self.route)
+            acquired.append(semaphore)
+        return AdmissionTicket(acquired, timeout_ms, asyncio.get_running_loop())
+
+
+def total_admission_limit() -> int:
+    """
+    Admitted requests allowed at once in this worker (0 = no limit):
+    ADMISSION_TOTAL_LIMIT, or the connections of the pool (pool size plus
+    overflow) minus ADMISSION_RESERVED_CONNECTIONS left to the other
+    routes. Without a pool (development) there is no total limit.
+    """
+    if ADMISSION_TOTAL_LIMIT is not None:
+        return ADMISSION_TOTAL_LIMIT
+    from src.utils.database import get_pool_options
+    options = get_pool_options()
+    if "pool_size" not in options:
+        return 0
+    connections = options["pool_size"] + max(0, options["max_overflow"])
+    return max(1, connections - ADMISSION_RESERVED_CONNECTIONS)
+
+
+_limiters: Dict[str, RouteLimiter] = {}
+_total_semaphore: Optional[asyncio.Semaphore] = None
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(route: str) -> RouteLimiter:
+    global _total_semaphore
+    with _limiters_lock:
+        if route not in _limiters:
+            total = total_admission_limit()
+            if total > 0 and _total_semaphore is None:
+                _total_semaphore = asyncio.Semaphore(total)
+            # Une route ne peut pas dépasser la limite totale du worker
+            limit = ADMISSION_LIMITS.get(route, 0)
+            if total > 0:
+                limit = min(limit, total) if limit > 0 else total
+            _limiters[route] = RouteLimiter(
+                route, limit, ADMISSION_QUEUE_TIMEOUT, _total_semaphore if total > 0 else None
+            )
+        return _limiters[route]
+
+
+def apply_statement_timeout(db: Session, timeout_ms: int) -> None:
+    """
+    Limit the duration of each statement of the session. The timeout is set
+    (SET LOCAL) when a transaction begins, so no connection is opened for
+    requests that never reach the database.
+    """
+    if timeout_ms <= 0:
+        return
+
+    @event.listens_for(db, "after_begin")
+    def set_timeout(session, transaction, connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def is_query_canceled(error: BaseException) -> bool:
+    """Check whether a database error is a statement_timeout (or a cancellation)."""
+    return isinstance(error, DBAPIError) and isinstance(error.orig, pg_errors.QueryCanceled)
+
+
+def query_timeout_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="La requête a dépassé le délai maximal d'exécution, affinez les filtres ou réessayez plus tard",
+        headers=retry_headers()
+    )
+
+
+def admission(route: str, session_dependency):
+    """
+    Dependency admitting a request on a route: waits for a slot, sets the
+    statement_timeout of the request session and converts a cancelled
+    query into a 503.
+
+    The slot is awaited on the event loop before the session dependency
+    runs (declare the returned dependency before the session in the route
+    signature, FastAPI resolves them in order).
+
+    Args:
+        route: Name of the route in ADMISSION_LIMITS / STATEMENT_TIMEOUTS
+        session_dependency: Session dependency of the route (get_db or
+            get_read_db), so that the timeout applies to the same session
+
+    Yields:
+        AdmissionTicket: The slot of the request
+    """
+    limiter = get_limiter(route)
+
+    async def slot():
+        ticket = await limiter.acquire()
+        try:
+            yield ticket
+        finally:
+            if not ticket.detached:
+                ticket.release()
+
+    def dependency(ticket: AdmissionTicket = Depends(slot), db: Session = Depends(session_dependency)):
+        apply_statement_timeout(db, ticket.statement_timeout_ms)
+        try:
+            yield ticket
+        except DBAPIError as e:
+            if is_query_canceled(e):
+                raise query_timeout_error() from e
+            raise
+
+    return dependency
+
+
+def explain_cost(db: Session, statement, params: Optional[Dict[str, Any]] = None) -> float:
+    """
+    Planner total cost of a query (text or ORM statement), without running it.
+    """
+    compiled = statement.compile(dialect=db.get_bind().dialect)
+    parameters = {**compiled.params, **(params or {})}
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", parameters).scalar()
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def exceeds_cost_limit(db: Session, statement, params: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """
+    Check a query against QUERY_COST_LIMIT.
+
+    Returns:
+        Optional[float]: The estimated cost when it exceeds the limit, None
+        otherwise (or when the check is disabled)
+    """
+    if QUERY_COST_LIMIT <= 0:
+        return None
+    cost = explain_cost(db, statement, params)
+    return cost if cost > QUERY_COST_LIMIT else None
+
+
+def reject_costly_query(db: Session, statement, params: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Raises:
+        HTTPException: 429 if the estimated cost of the query exceeds QUERY_COST_LIMIT
+    """
+    cost = exceeds_cost_limit(db, statement, params)
+    if cost is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Requête trop coûteuse (coût estimé {cost:.0f} > {QUERY_COST_LIMIT:.0f}), "
+                   f"restreignez la période ou la recherche",
+            headers=retry_headers()
+        )
@@ -0,0 +1,568 @@
+"""
+Optional columnar snapshot for the analytics routes.
+
+With ANALYTICS_BACKEND=duckdb, /aggregate, /distribution and /stats are
+answered from a Parquet copy of file_data (decoded values, one directory per
+imported file) scanned with DuckDB instead of the PostgreSQL row store.
+
+The snapshot is kept in sync incrementally:
+
+- an import appends one Parquet part holding the inserted rows;
+- a deletion removes the directory of the file;
+- at startup (or via POST /api/admin/analytics/rebuild), only the files
+  whose row count or last id differs from PostgreSQL are exported again.
+
+Every refresh checks the file against PostgreSQL (count and max id) and
+re-exports it on any mismatch, so concurrent imports from other workers
+cannot leave duplicates or holes. The signatures of every file are also
+compared with PostgreSQL every ANALYTICS_VERIFY_INTERVAL seconds: a file
+that differs (a worker crashed between its commit and its append, for
+instance) is answered from PostgreSQL and exported again in the
+background. A READY marker in the directory is
+removed while a rebuild runs or after a failed refresh: as long as it is
+missing, every worker answers from PostgreSQL.
+
+Requires the "analytics" extras (duckdb, pyarrow).
+"""
+
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+from sqlalchemy import text
+
+from src.utils.dictionary import DICTIONARY_COLUMNS
+from src.utils.filters import parse_filter_date
+from src.utils.settings import (
+    ANALYTICS_BACKEND,
+    ANALYTICS_SNAPSHOT_DIR,
+    ANALYTICS_SNAPSHOT_BATCH_SIZE,
+    ANALYTICS_THREADS,
+    ANALYTICS_VERIFY_INTERVAL,
+)
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Extras "analytics" non installés
+    duckdb = pa = pc = pq = None
+
+try:
+    import fcntl
+except ImportError:  # Pas de verrou inter-processus hors POSIX
+    fcntl = None
+
+# Colonnes de l'instantané (valeurs décodées) et leur type Arrow
+SNAPSHOT_COLUMNS = [
+    ("id", "int64"),
+    ("reference", "string"),
+    ("id_lin", "string"),
+    ("id_ccu", "string"),
+    ("etat", "string"),
+    ("creation", "string"),
+    ("mise_a_jour", "string"),
+    ("creation_date", "date32"),
+    ("mise_a_jour_date", "date32"),
+    ("idrh", "string"),
+    ("device_id", "string"),
+    ("retour_metier", "string"),
+    ("commentaires_cloture", "string"),
+    ("nom_bureau_poste", "string"),
+    ("regate", "string"),
+    ("source", "string"),
+    ("solution_scan", "string"),
+    ("rg", "string"),
+    ("ruo", "string"),
+    ("file_name", "string"),
+    ("import_date", "timestamp"),
+]
+SNAPSHOT_COLUMN_NAMES = [name for name, _ in SNAPSHOT_COLUMNS]
+
+# Lignes décodées d'un fichier, dans l'ordre d'insertion
+EXPORT_QUERY = text(
+    "SELECT "
+    + ", ".join(
+        f"d_{name}.value AS {name}" if name in DICTIONARY_COLUMNS else f"fd.{name}"
+        for name in SNAPSHOT_COLUMN_NAMES
+    )
+    + " FROM file_data fd "
+    + " ".join(f"LEFT JOIN dict_{column} d_{column} ON d_{column}.id = fd.{column}_id" for column in DICTIONARY_COLUMNS)
+    + " WHERE fd.file_name = :file_name ORDER BY fd.id"
+)
+
+READY_MARKER = "READY"
+LOCK_FILE = ".lock"
+FILE_PREFIX = "file_"
+
+# Mêmes périodes que src.utils.filters.period_sql
+PERIOD_FORMATS = {
+    "jour": "%Y-%m-%d",
+    "mois": "%Y-%m",
+    "annee": "%Y",
+}
+
+SEARCH_SQL = """(
+    reference ILIKE $search ESCAPE '\\' OR
+    id_lin ILIKE $search ESCAPE '\\' OR
+    id_ccu ILIKE $search ESCAPE '\\' OR
+    etat ILIKE $search ESCAPE '\\' OR
+    source ILIKE $search ESCAPE '\\'
+)"""
+
+Signature = Tuple[int, int]
+
+
+def period_sql(group_by: str, column: str = "creation_date") -> str:
+    """
+    DuckDB expression of the aggregation period, rendered exactly like
+    PostgreSQL (weeks are cast to TIMESTAMPTZ in the PostgreSQL time zone).
+    """
+    if group_by == "semaine":
+        return f"CAST(CAST(date_trunc('week', {column}) AS TIMESTAMPTZ) AS VARCHAR)"
+    return f"strftime({column}, '{PERIOD_FORMATS.get(group_by, PERIOD_FORMATS['jour'])}')"
+
+
+class AnalyticsSnapshot:
+    """
+    Parquet snapshot of file_data and the DuckDB queries of the analytics routes.
+    """
+
+    def __init__(self, directory: str, backend: str, batch_size: int,
+                 verify_interval: float = ANALYTICS_VERIFY_INTERVAL):
+        self.directory = Path(directory)
+        self.backend = backend
+        self.batch_size = batch_size
+        self.verify_interval = verify_interval
+        self._timezone: Optional[str] = None
+        self._connection = None
+        self._lock = threading.RLock()
+        # Fichiers dont l'instantané diffère de PostgreSQL lors de la dernière vérification
+        self._stale: Set[str] = set()
+        self._verified_at: Optional[float] = None
+        self._verifying = False
+        self._state_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return duckdb is not None
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend == "duckdb" and self.available
+
+    def is_ready(self) -> bool:
+        """Check whether the analytics routes may be answered from the snapshot."""
+        return self.enabled and (self.directory / READY_MARKER).exists()
+
+    # Écriture
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Serialize the snapshot writes of every thread and every worker."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.directory / LOCK_FILE, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _file_dir(self, file_name: str) -> Path:
+        return self.directory / (FILE_PREFIX + quote(file_name, safe=""))
+
+    def _table(self, columns: Dict[str, list]):
+        types = {
+            "int64": pa.int64(),
+            "string": pa.string(),
+            "date32": pa.date32(),
+            "timestamp": pa.timestamp("us"),
+        }
+        return pa.table(
+            {name: pa.array(columns[name], types[kind]) for name, kind in SNAPSHOT_COLUMNS}
+        )
+
+    def _write_part(self, directory: Path, table) -> None:
+        """Write a Parquet part atomically, with its row count and last id in the metadata."""
+        directory.mkdir(parents=True, exist_ok=True)
+        max_id = max(table.column("id").to_pylist())
+        table = table.replace_schema_metadata({"max_id": str(max_id)})
+        path = directory / f"part-{max_id:012d}.parquet"
+        temporary = path.with_suffix(".tmp")
+        pq.write_table(table, temporary)
+        temporary.replace(path)
+
+    def _signature(self, directory: Path) -> Signature:
+        """Row count and last id stored in the snapshot of one file."""
+        rows, max_id = 0, 0
+        for part in directory.glob("*.parquet"):
+            metadata = pq.read_metadata(part)
+            rows += metadata.num_rows
+            max_id = max(max_id, int(metadata.metadata[b"max_id"]))
+        return rows, max_id
+
+    def _database_signatures(self, connection, file_name: Optional[str] = None) -> Dict[str, Signature]:
+        query = "SELECT file_name, COUNT(*), MAX(id) FROM file_data"
+        params = {}
+        if file_name is not None:
+            query += " WHERE file_name = :file_name"
+            params["file_name"] = file_name
+        rows = connection.execute(text(query + " GROUP BY file_name"), params).fetchall()
+        return {name: (count, max_id) for name, count, max_id in rows if name is not None}
+
+    def _export_file(self, connection, file_name: str) -> None:
+        """Replace the snapshot of one file by its current rows in PostgreSQL."""
+        staging = self.directory / f".staging-{uuid.uuid4().hex}"
+        result = connection.execution_options(stream_results=True).execute(
+            EXPORT_QUERY, {"file_name": file_name}
+        )
+        for rows in result.partitions(self.batch_size):
+            self._write_part(staging, self._table(dict(zip(SNAPSHOT_COLUMN_NAMES, zip(*rows)))))
+        self._replace_dir(self._file_dir(file_name), staging if staging.exists() else None)
+
+    def _replace_dir(self, directory: Path, replacement: Optional[Path]) -> None:
+        if directory.exists():
+            trash = self.directory / f".trash-{uuid.uuid4().hex}"
+            directory.rename(trash)
+            shutil.rmtree(trash, ignore_errors=True)
+        if replacement is not None:
+            replacement.rename(directory)
+
+    def _invalidate(self, error: Exception) -> None:
+        """Stop using the snapshot after a failed refresh and rebuild it in the background."""
+        print(f"Instantané analytique invalidé, lecture sur PostgreSQL: {error}")
+        (self.directory / READY_MARKER).unlink(missing_ok=True)
+        threading.Thread(target=self.rebuild, daemon=True).start()
+
+    def _snapshot_signatures(self) -> Dict[str, Signature]:
+        return {
+            unquote(directory.name[len(FILE_PREFIX):]): self._signature(directory)
+            for directory in self.directory.glob(f"{FILE_PREFIX}*")
+        }
+
+    def _mark_verified(self, stale: Set[str]) -> None:
+        with self._state_lock:
+            self._stale = set(stale)
+            self._verified_at = time.monotonic()
+            self._verifying = False
+
+    def verify(self) -> Set[str]:
+        """
+        Compare the signature of every file with PostgreSQL and repair the
+        files that differ in the background.
+
+        Returns:
+            Set[str]: The files that differ (answered from PostgreSQL until repaired)
+        """
+        from src.utils.database import get_engine
+
+        try:
+            with get_engine().connect() as connection:
+                expected = self._database_signatures(connection)
+            current = self._snapshot_signatures()
+            stale = {
+                file_name for file_name in expected.keys() | current.keys()
+                if expected.get(file_name) != current.get(file_name)
+            }
+        except Exception as e:
+            # Vérification impossible: ne pas servir l'instantané sur un état inconnu
+            print(f"Vérification de l'instantané analytique impossible, lecture sur PostgreSQL: {e}")
+            with self._state_lock:
+                self._verifying = False
+            return set()
+        self._mark_verified(stale)
+        if stale:
+            print(f"Instantané analytique désynchronisé pour {len(stale)} fichier(s), réexport en arrière-plan")
+            threading.Thread(target=self.repair, args=(stale,), daemon=True).start()
+        return stale
+
+    def repair(self, file_names: Set[str]) -> None:
+        """Export again the given files if they still differ from PostgreSQL."""
+        from src.utils.database import get_engine
+
+        try:
+            with self._exclusive(), get_engine().connect() as connection:
+                for file_name in file_names:
+                    expected = self._database_signatures(connection, file_name).get(file_name)
+                    directory = self._file_dir(file_name)
+                    if expected is None:
+                        self._replace_dir(directory, None)
+                    elif self._signature(directory) != expected:
+                        self._export_file(connection, file_name)
+                connection.rollback()
+        except Exception as e:
+            print(f"Échec du réexport de l'instantané analytique: {e}")
+            return
+        with self._state_lock:
+            self._stale -= set(file_names)
+
+    def is_consistent(self, file_name: Optional[str]) -> bool:
+        """
+        Check that the files read by a query matched PostgreSQL at the last
+        verification, starting a new one when it is older than
+        verify_interval. A single thread verifies at a time, the other
+        requests keep using the previous result.
+        """
+        with self._state_lock:
+            expired = self._verified_at is None or time.monotonic() - self._verified_at >= self.verify_interval
+            verify = expired and not self._verifying
+            if verify:
+                self._verifying = True
+            never_verified = self._verified_at is None
+        if verify:
+            if never_verified:
+                self.verify()
+            else:
+                threading.Thread(target=self.verify, daemon=True).start()
+        with self._state_lock:
+            if self._verified_at is None:
+                return False
+            if file_name and file_name != "all":
+                return file_name not in self._stale
+            return not self._stale
+
+    def capture(self, items: list) -> Optional[Dict[str, list]]:
+        """
+        Copy the values of freshly inserted FileData objects (before the
+        commit expires them) for a later append().
+        """
+        if not self.enabled or not items:
+            return None
+        return {name: [getattr(item, name) for item in items] for name in SNAPSHOT_COLUMN_NAMES}
+
+    def append(self, columns: Optional[Dict[str, list]]) -> None:
+        """Add the rows of a committed import to the snapshot."""
+        if columns is None:
+            return
+        from src.utils.database import get_engine
+
+        try:
+            table = self._table(columns)
+            with self._exclusive(), get_engine().connect() as connection:
+                for file_name in set(columns["file_name"]):
+                    part = table.filter(pc.equal(table.column("file_name"), file_name))
+                    directory = self._file_dir(file_name)
+                    rows, max_id = self._signature(directory)
+                    expected = self._database_signatures(connection, file_name).get(file_name)
+                    part_ids = part.column("id").to_pylist()
+                    if expected == (rows + len(part_ids), max(max_id, *part_ids)):
+                        self._write_part(directory, part)
+                    elif expected != (rows, max_id):
+                        # Écritures concurrentes d'un autre worker: réexporter le fichier
+                        self._export_file(connection, file_name)
+        except Exception as e:
+            self._invalidate(e)
+
+    def remove_file(self, file_name: str) -> None:
+        """Drop a deleted file from the snapshot."""
+        if not self.enabled:
+            return
+        try:
+            with self._exclusive():
+                self._replace_dir(self._file_dir(file_name), None)
+        except Exception as e:
+            self._invalidate(e)
+
+    def rebuild(self, full: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Bring the snapshot in line with PostgreSQL, exporting only the stale
+        files (every file with full=True).
+
+        Returns:
+            Optional[Dict[str, Any]]: Summary of the rebuild, None when the
+            snapshot is disabled or the rebuild failed
+        """
+        if not self.enabled:
+            return None
+        from src.utils.database import get_engine
+
+        try:
+            with self._exclusive(), get_engine().connect() as connection:
+                (self.directory / READY_MARKER).unlink(missing_ok=True)
+                self._timezone = connection.execute(text("SHOW TimeZone")).scalar()
+                expected = self._database_signatures(connection)
+                current = {
+                    unquote(directory.name[len(FILE_PREFIX):]): directory
+                    for directory in self.directory.glob(f"{FILE_PREFIX}*")
+                }
+                for file_name in current.keys() - expected.keys():
+                    self._replace_dir(current[file_name], None)
+                exported = [
+                    file_name for file_name, signature in expected.items()
+                    if full or file_name not in current or self._signature(current[file_name]) != signature
+                ]
+                for file_name in exported:
+                    self._export_file(connection, file_name)
+                connection.rollback()
+                (self.directory / READY_MARKER).touch()
+            self._mark_verified(set())
+        except Exception as e:
+            print(f"Échec de la reconstruction de l'instantané analytique: {e}")
+            return None
+        return {
+            "files": len(expected),
+            "rows": sum(count for count, _ in expected.values()),
+            "exported_files": sorted(exported),
+            "removed_files": sorted(current.keys() - expected.keys()),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "available": self.available,
+            "enabled": self.enabled,
+            "ready": self.is_ready(),
+            "directory": str(self.directory.resolve()),
+            "files": len(list(self.directory.glob(f"{FILE_PREFIX}*"))) if self.directory.exists() else 0,
+        }
+
+    # Lecture
+
+    def _cursor(self):
+        with self._lock:
+            if self._connection is None:
+                self._connection = duckdb.connect()
+            cursor = self._connection.cursor()
+        if self._timezone is None:
+            from src.utils.database import get_engine
+            with get_engine().connect() as connection:
+                self._timezone = connection.execute(text("SHOW TimeZone")).scalar()
+        cursor.execute(f"SET TimeZone = '{self._timezone}'")
+        if ANALYTICS_THREADS:
+            cursor.execute(f"SET threads = {int(ANALYTICS_THREADS)}")
+        return cursor
+
+    def _parts(self, file_name: Optional[str]) -> List[str]:
+        if file_name and file_name != "all":
+            return sorted(str(part) for part in self._file_dir(file_name).glob("*.parquet"))
+        return sorted(str(part) for part in self.directory.glob(f"{FILE_PREFIX}*/*.parquet"))
+
+    def _where(self, search, file_name, date_from, date_to) -> Tuple[str, Dict[str, Any]]:
+        """Same filters as src.utils.filters.build_filter_sql, on the decoded columns."""
+        conditions = ["TRUE"]
+        params: Dict[str, Any] = {}
+        if search:
+            conditions.append(SEARCH_SQL)
+            params["search"] = f"%{search}%"
+        if file_name and file_name != "all":
+            conditions.append("file_name = $file_name")
+            params["file_name"] = file_name
+        if date_from:
+            conditions.append("creation_date >= $date_from")
+            params["date_from"] = parse_filter_date(date_from)
+        if date_to:
+            conditions.append("creation_date <= $date_to")
+            params["date_to"] = parse_filter_date(date_to)
+        return " AND ".join(conditions), params
+
+    def _query(self, sql: str, params: Dict[str, Any], file_name: Optional[str]):
+        """
+        Run a query on the Parquet parts (exposed as the `snapshot` relation).
+
+        Returns:
+            The fetched rows, [] when there is no part to read, or None when
+            the snapshot cannot be used (the caller falls back to PostgreSQL)
+        """
+        if not self.is_ready() or not self.is_consistent(file_name):
+            return None
+        parts = self._parts(file_name)
+        if not parts:
+            return []
+        try:
+            cursor = self._cursor()
+            try:
+                return cursor.execute(
+                    f"WITH snapshot AS (SELECT * FROM read_parquet($parts)) {sql}",
+                    {**params, "parts": parts}
+                ).fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            # Fichier supprimé pendant la lecture, instantané incomplet...
+            print(f"Lecture de l'instantané analytique impossible, lecture sur PostgreSQL: {e}")
+            return None
+
+    def aggregate(self, group_by, search=None, file_name=None, date_from=None, date_to=None) -> Optional[list]:
+        """
+        Rows (period, count, data) of the /aggregate route, see get_aggregated_data().
+        """
+        if not self.is_ready():
+            return None
+        where_sql, params = self._where(search, file_name, date_from, date_to)
+        rows = self._query(f"""
+            , period_data AS (
+                SELECT id, reference, etat, creation, file_name, {period_sql(group_by)} AS period
+                FROM snapshot
+                WHERE {where_sql} AND creation_date IS NOT NULL
+            ),
+            ranked_data AS (
+                SELECT *,
+                    row_number() OVER (PARTITION BY period ORDER BY id) AS rn,
+                    COUNT(*) OVER (PARTITION BY period) AS count
+                FROM period_data
+            )
+            SELECT period, count, id, reference, etat, creation, file_name
+            FROM ranked_data
+            WHERE rn <= 5
+            ORDER BY period, id
+        """, params, file_name)
+        if rows is None:
+            return None
+
+        result = []
+        for period, count, row_id, reference, etat, creation, row_file_name in rows:
+            if not result or result[-1][0] != period:
+                result.append((period, count, []))
+            result[-1][2].append({
+                "id": row_id,
+                "reference": reference,
+                "etat": etat,
+                "creation": creation,
+                "file_name": row_file_name,
+            })
+        return result
+
+    def distribution(self, field, search=None, file_name=None, date_from=None, date_to=None) -> Optional[list]:
+        """
+        Rows (label, count) of the /distribution route, None for the fields
+        that are not in the snapshot.
+        """
+        if not self.is_ready() or field not in SNAPSHOT_COLUMN_NAMES:
+            return None
+        where_sql, params = self._where(search, file_name, date_from, date_to)
+        return self._query(
+            f'SELECT "{field}" AS label, COUNT(*) AS count FROM snapshot WHERE {where_sql} GROUP BY 1',
+            params, file_name
+        )
+
+    def stats(self, search=None, file_name=None, date_from=None, date_to=None) -> Optional[tuple]:
+        """
+        Row (total_entries, unique_files, latest_entry, unique_sources) of the /stats route.
+        """
+        if not self.is_ready():
+            return None
+        where_sql, params = self._where(search, file_name, date_from, date_to)
+        rows = self._query(f"""
+            , filtered_data AS (
+                SELECT id, file_name, source, creation, creation_date FROM snapshot WHERE {where_sql}
+            )
+            SELECT
+                (SELECT COUNT(*) FROM filtered_data),
+                (SELECT COUNT(DISTINCT file_name) FROM filtered_data),
+                (SELECT creation FROM filtered_data ORDER BY creation_date DESC NULLS LAST, id DESC LIMIT 1),
+                (SELECT COUNT(DISTINCT source) FROM filtered_data WHERE source IS NOT NULL)
+        """, params, file_name)
+        if rows is None:
+            return None
+        return rows[0] if rows else (0, 0, None, 0)
+
+
+analytics_snapshot = AnalyticsSnapshot(ANALYTICS_SNAPSHOT_DIR, ANALYTICS_BACKEND, ANALYTICS_SNAPSHOT_BATCH_SIZE)
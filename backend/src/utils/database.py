@@ -1,17 +1,41 @@
 import os
-from typing import Generator
+import threading
+import time
+from typing import Generator, Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from sqlalchemy.pool import NullPool
+from src.utils.profiling import install_query_profiler
+from src.utils.settings import (
+    DB_CONNECT_RETRIES,
+    DB_CONNECT_BACKOFF,
+    DB_CONNECT_BACKOFF_MAX,
+    SERVER_MODE,
+    WEB_CONCURRENCY,
+    DB_MAX_CONNECTIONS,
+    DB_POOL_SIZE,
+    DB_POOL_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_REPLICA_HOST,
+    DB_REPLICA_PORT,
+    REPLICA_CONNECT_TIMEOUT,
+)
+from src.utils.replication import should_read_from_replica
 
 # Load environment variables
 load_dotenv()
 
 # Database configuration with fallback and validation
-def get_database_url() -> str:
+def get_database_url(host: Optional[str] = None, port: Optional[str] = None) -> str:
     """
     Construct database URL with comprehensive error checking.
+
+    Args:
+        host: Override DB_HOST (used for the read replica)
+        port: Override DB_PORT (used for the read replica)
     
     Raises:
         ValueError: If critical database configuration is missing
@@ -36,32 +60,143 @@ def get_database_url() -> str:
         f"postgresql://"
         f"{os.getenv('DB_USER')}:"
         f"{os.getenv('DB_PASSWORD')}@"
-        f"{os.getenv('DB_HOST', 'localhost')}:"
-        f"{os.getenv('DB_PORT', '5432')}/"
+        f"{host or os.getenv('DB_HOST', 'localhost')}:"
+        f"{port or os.getenv('DB_PORT', '5432')}/"
         f"{os.getenv('DB_NAME')}"
     )
 
-# Create SQLAlchemy engine with connection pooling and error handling
-DATABASE_URL = get_database_url()
-print(DATABASE_URL)
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=NullPool,  # Disable connection pooling for better connection management
-    pool_pre_ping=True,  # Test connections before using them
-    echo=False  # Set to True for SQL query logging during development
-)
-
-# Create session factory
+# Create session factory (bound to the engine once it is created)
 SessionLocal = sessionmaker(
     autocommit=False, 
     autoflush=False, 
-    bind=engine,
     expire_on_commit=False  # Keep objects usable after session closes
 )
 
 # Declarative base for ORM models
 Base = declarative_base()
 
+# The engines are created lazily so that importing the app never touches the database
+_engine: Optional[Engine] = None
+_replica_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_pool_options() -> dict:
+    """
+    Connection pool settings for the current server mode.
+
+    In production each worker keeps a pool sized so that all workers together
+    stay below DB_MAX_CONNECTIONS. Development keeps the previous behaviour
+    (no pooling).
+    """
+    if SERVER_MODE != "production":
+        return {"poolclass": NullPool}  # Disable connection pooling for better connection management
+
+    workers = max(1, WEB_CONCURRENCY)
+    pool_size = DB_POOL_SIZE or max(1, DB_MAX_CONNECTIONS // workers - DB_POOL_MAX_OVERFLOW)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": DB_POOL_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _create_engine(url: str, **options) -> Engine:
+    engine = create_engine(
+        url,
+        **get_pool_options(),
+        **options,
+        pool_pre_ping=True,  # Test connections before using them
+        echo=False  # Set to True for SQL query logging during development
+    )
+    install_query_profiler(engine)
+    return engine
+
+
+def get_engine() -> Engine:
+    """
+    Return the SQLAlchemy engine of the primary, creating it on first use.
+
+    Creating the engine does not open any connection: the environment is
+    validated and the first connection is only made when a query runs.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_engine(get_database_url())
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def get_replica_engine() -> Optional[Engine]:
+    """
+    Return the read-only replica engine, or None when no replica is configured.
+    """
+    global _replica_engine
+    if not DB_REPLICA_HOST:
+        return None
+    if _replica_engine is None:
+        with _engine_lock:
+            if _replica_engine is None:
+                # Délai de connexion borné: un réplica bloqué ne doit pas retenir les lectures
+                _replica_engine = _create_engine(
+                    get_database_url(DB_REPLICA_HOST, DB_REPLICA_PORT),
+                    connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT}
+                )
+    return _replica_engine
+
+
+def dispose_engine() -> None:
+    """
+    Close the engines connections (called on application shutdown).
+    """
+    global _engine, _replica_engine
+    with _engine_lock:
+        for engine in (_engine, _replica_engine):
+            if engine is not None:
+                engine.dispose()
+        _engine = None
+        _replica_engine = None
+
+
+def check_database_connection() -> bool:
+    """
+    Check that the database answers a trivial query.
+    """
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        print(f"Database connection check failed: {e}")
+        return False
+
+
+def wait_for_database(
+    retries: int = DB_CONNECT_RETRIES,
+    backoff: float = DB_CONNECT_BACKOFF,
+    max_backoff: float = DB_CONNECT_BACKOFF_MAX
+) -> bool:
+    """
+    Wait until the database is reachable, retrying with exponential backoff.
+
+    Returns:
+        bool: True if the database answered, False once all retries failed
+    """
+    delay = backoff
+    for attempt in range(1, retries + 1):
+        if check_database_connection():
+            return True
+        if attempt < retries:
+            print(f"Database not ready (attempt {attempt}/{retries}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_backoff)
+    return False
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency that creates a new database session for each request
@@ -70,6 +205,7 @@ def get_db() -> Generator[Session, None, None]:
     Yields:
         Session: A database session
     """
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -79,4 +215,46 @@ def get_db() -> Generator[Session, None, None]:
         db.rollback()
         raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _read_session(file_name: Optional[str]) -> Generator[Session, None, None]:
+    primary = get_engine()
+    replica = get_replica_engine()
+    bind = replica if should_read_from_replica(primary, replica, file_name) else primary
+    db = SessionLocal(bind=bind)
+    try:
+        yield db
+    except Exception as e:
+        # Log any database-related exceptions
+        print(f"Database session error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_read_db(file_name: Optional[str] = None) -> Generator[Session, None, None]:
+    """
+    Dependency for read-only routes filtered by file: the session is bound to
+    the read replica when one is configured, up to date and has replayed
+    the last write of the requested file, and to the primary otherwise.
+
+    Args:
+        file_name: The file filter of the route (query parameter)
+
+    Yields:
+        Session: A database session
+    """
+    yield from _read_session(file_name)
+
+
+def get_read_db_all_files() -> Generator[Session, None, None]:
+    """
+    Same as get_read_db() for read-only routes without a file filter (no
+    file_name query parameter): the replica must have replayed every write.
+
+    Yields:
+        Session: A database session
+    """
+    yield from _read_session(None)
@@ -0,0 +1,148 @@
+"""
+Dictionary encoding of the low-cardinality FileData columns.
+
+Values are mapped to integer codes stored in small dict_<column> tables. Both
+directions of the mapping are cached in-process (a code never changes its
+value): an import only touches the database for the values it has never
+seen, and decoding rows for an API response costs no query at all once the
+cache is warm.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Colonnes à faible cardinalité stockées sous forme de codes entiers:
+# la valeur texte est dans une petite table dict_<colonne>
+DICTIONARY_COLUMNS = [
+    "etat",
+    "source",
+    "solution_scan",
+    "regate",
+    "rg",
+    "ruo",
+    "nom_bureau_poste",
+]
+
+
+class DictionaryCache:
+    """
+    Thread-safe cache of the value <-> code mappings of every encoded column.
+    """
+
+    def __init__(self, columns: Iterable[str]):
+        self._codes: Dict[str, Dict[str, int]] = {column: {} for column in columns}
+        self._values: Dict[str, Dict[int, str]] = {column: {} for column in columns}
+        self._lock = threading.Lock()
+
+    def _remember(self, column: str, rows) -> None:
+        with self._lock:
+            for value, code in rows:
+                self._codes[column][value] = code
+                self._values[column][code] = value
+
+    def encode(self, engine: Engine, column: str, values: Iterable[Optional[str]]) -> Dict[str, int]:
+        """
+        Return the codes of the given values, creating the missing ones.
+
+        Values are matched exactly: a value is decoded with the spelling it
+        was sent with (casing variants are folded beforehand by the import
+        normalization, see src.utils.normalization).
+
+        New values are inserted in their own short transaction, so that a
+        failed import never leaves codes in the cache that do not exist.
+
+        Args:
+            engine: Engine of the primary database
+            column: Encoded FileData column (e.g. "etat")
+            values: Values to encode (None values are ignored)
+
+        Returns:
+            Dict[str, int]: Mapping of each non-null value to its code
+        """
+        table = f"dict_{column}"
+        wanted = {value for value in values if value is not None}
+
+        with self._lock:
+            missing = [value for value in wanted if value not in self._codes[column]]
+
+        if missing:
+            with engine.begin() as connection:
+                connection.execute(
+                    text(f"INSERT INTO {table} (value) SELECT unnest(:values) ON CONFLICT (value) DO NOTHING"),
+                    {"values": missing}
+                )
+                rows = connection.execute(
+                    text(f"SELECT value, id FROM {table} WHERE value = ANY(:values)"),
+                    {"values": missing}
+                ).fetchall()
+            self._remember(column, rows)
+
+        with self._lock:
+            return {value: self._codes[column][value] for value in wanted}
+
+    def decode(self, column: str, code: Optional[int], bind=None) -> Optional[str]:
+        """
+        Return the value of a code, reloading the dictionary on a cache miss.
+
+        Args:
+            column: Encoded FileData column (e.g. "etat")
+            code: Code stored in file_data.<column>_id
+            bind: Session or connection used to reload the dictionary
+                  (defaults to the primary engine)
+        """
+        if code is None:
+            return None
+        with self._lock:
+            value = self._values[column].get(code)
+        if value is not None:
+            return value
+
+        # Code created by another worker: reload the (small) dictionary table
+        query = text(f"SELECT value, id FROM dict_{column}")
+        if bind is None:
+            from src.utils.database import get_engine
+            with get_engine().connect() as connection:
+                rows = connection.execute(query).fetchall()
+        else:
+            rows = bind.execute(query).fetchall()
+        self._remember(column, rows)
+
+        with self._lock:
+            return self._values[column].get(code)
+
+    def clear(self) -> None:
+        with self._lock:
+            for column in self._codes:
+                self._codes[column].clear()
+                self._values[column].clear()
+
+
+dictionary_cache = DictionaryCache(DICTIONARY_COLUMNS)
+
+
+def encode_rows(engine: Engine, rows: list) -> list:
+    """
+    Replace the encoded columns of each row dict by their <column>_id codes.
+
+    Args:
+        engine: Engine of the primary database
+        rows: Row dicts using the API column names
+
+    Returns:
+        list: New row dicts ready to build FileData objects
+    """
+    codes = {
+        column: dictionary_cache.encode(engine, column, (row.get(column) for row in rows))
+        for column in DICTIONARY_COLUMNS
+    }
+    encoded_rows = []
+    for row in rows:
+        encoded = dict(row)
+        for column in DICTIONARY_COLUMNS:
+            value = encoded.pop(column, None)
+            encoded[f"{column}_id"] = codes[column].get(value) if value is not None else None
+        encoded_rows.append(encoded)
+    return encoded_rows
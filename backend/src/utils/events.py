@@ -0,0 +1,193 @@
+"""
+Change events pushed to the dashboard over WebSocket.
+
+Imports and deletions publish an event (file added/removed, row counts,
+affected periods) with PostgreSQL NOTIFY inside their own transaction, so it
+is only delivered once the data is committed. Every worker runs a listener
+thread (LISTEN on EVENTS_CHANNEL) that forwards the events to its WebSocket
+clients, whichever worker handled the write.
+"""
+
+import asyncio
+import json
+import select
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.utils.settings import (
+    DB_CONNECT_BACKOFF,
+    DB_CONNECT_BACKOFF_MAX,
+    EVENTS_CHANNEL,
+    EVENTS_QUEUE_SIZE,
+    EVENTS_MAX_PERIODS,
+)
+
+# Taille maximale d'un message NOTIFY (8000 octets côté PostgreSQL)
+MAX_PAYLOAD_BYTES = 7900
+
+# Périodes touchées par les lignes d'un fichier, avant sa suppression
+FILE_PERIODS_QUERY = text("""
+    SELECT
+        MIN(creation_date),
+        MAX(creation_date),
+        array_agg(DISTINCT to_char(creation_date, 'YYYY-MM'))
+    FROM file_data
+    WHERE file_name = :file_name AND creation_date IS NOT NULL
+""")
+
+
+def summarize_periods(date_from: Optional[date], date_to: Optional[date], months: Iterable[str]) -> Dict[str, Any]:
+    """
+    Describe the periods touched by a change: the date bounds and the
+    affected months and years (at most EVENTS_MAX_PERIODS months).
+    """
+    months = sorted(set(months))
+    return {
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "mois": months[:EVENTS_MAX_PERIODS],
+        "annee": sorted({month[:4] for month in months}),
+        "truncated": len(months) > EVENTS_MAX_PERIODS,
+    }
+
+
+def periods_of_dates(dates: Iterable[Optional[date]]) -> Dict[str, Any]:
+    """Periods touched by freshly imported rows (their creation dates)."""
+    dates = [value for value in dates if value is not None]
+    return summarize_periods(
+        min(dates, default=None),
+        max(dates, default=None),
+        (value.strftime("%Y-%m") for value in dates),
+    )
+
+
+def periods_of_file(db: Session, file_name: str) -> Dict[str, Any]:
+    """Periods touched by the rows of a file still present in the database."""
+    date_from, date_to, months = db.execute(FILE_PERIODS_QUERY, {"file_name": file_name}).one()
+    return summarize_periods(date_from, date_to, months or [])
+
+
+def publish_event(db: Session, event: Dict[str, Any]) -> None:
+    """
+    Queue a change event in the current transaction (NOTIFY is only sent
+    when the transaction commits, and dropped on rollback).
+    """
+    event = {**event, "at": datetime.utcnow().isoformat()}
+    payload = json.dumps(event, default=str)
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        # Trop de mois touchés: seules les bornes de dates sont envoyées
+        event["periods"] = {**event["periods"], "mois": [], "truncated": True}
+        payload = json.dumps(event, default=str)
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": EVENTS_CHANNEL, "payload": payload})
+
+
+class ChangeEventBroker:
+    """
+    Forward the NOTIFY events of the database to the WebSocket clients of this worker.
+    """
+
+    def __init__(self, channel: str, queue_size: int):
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers: Set[Tuple[asyncio.Queue, asyncio.AbstractEventLoop]] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Abonnements (boucle asyncio)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add((queue, asyncio.get_running_loop()))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = {item for item in self._subscribers if item[0] is not queue}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        if queue.full():
+            # Client trop lent: remplacer les événements en attente par une resynchronisation
+            while not queue.empty():
+                queue.get_nowait()
+            event = {"type": "resync", "reason": "queue_full"}
+        queue.put_nowait(event)
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        """Deliver an event to every client of this worker (from any thread)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Boucle fermée: le client est parti
+                self.unsubscribe(queue)
+
+    # Écoute des notifications (thread dédié)
+
+    def start(self, database_url: str) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(database_url,), name="change-events", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _listen(self, database_url: str) -> None:
+        """
+        LISTEN on the events channel, reconnecting with backoff. Events may
+        be lost while disconnected, so clients are asked to resync after a
+        reconnection.
+        """
+        delay = DB_CONNECT_BACKOFF
+        connected_before = False
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(database_url)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                if connected_before:
+                    self.dispatch({"type": "resync", "reason": "reconnected"})
+                connected_before = True
+                delay = DB_CONNECT_BACKOFF
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(notification.payload))
+                        except ValueError:
+                            print(f"Événement ignoré (JSON invalide): {notification.payload[:200]}")
+            except (psycopg2.Error, OSError) as e:
+                print(f"Écoute des événements interrompue, nouvelle tentative dans {delay:.1f}s: {e}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, DB_CONNECT_BACKOFF_MAX)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+event_broker = ChangeEventBroker(EVENTS_CHANNEL, EVENTS_QUEUE_SIZE)
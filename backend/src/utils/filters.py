@@ -0,0 +1,131 @@
+"""
+Filters shared by the file_data routes.
+
+Every route accepts the same filters (search, file_name, date_from, date_to).
+They are built here once, as ORM criteria or as a raw SQL fragment, on the
+typed `creation_date` column filled at import.
+"""
+
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from src.utils.models import FileData, DICTIONARY_MODELS
+
+# Recherche textuelle: les colonnes encodées sont filtrées via leur dictionnaire
+SEARCH_SQL = """(
+    reference ILIKE :search OR
+    id_lin ILIKE :search OR
+    id_ccu ILIKE :search OR
+    etat_id IN (SELECT id FROM dict_etat WHERE value ILIKE :search) OR
+    source_id IN (SELECT id FROM dict_source WHERE value ILIKE :search)
+)"""
+
+# Format de la période pour chaque regroupement (to_char PostgreSQL)
+PERIOD_FORMATS = {
+    "jour": "YYYY-MM-DD",
+    "mois": "YYYY-MM",
+    "annee": "YYYY",
+}
+
+
+def parse_filter_date(value: str) -> date:
+    """
+    Parse a date filter given as YYYY-MM-DD (ISO) or DD/MM/YYYY.
+
+    Raises:
+        HTTPException: If the date is not valid
+    """
+    value = value.strip()
+    for pattern, date_format in ((r"^\d{4}-\d{2}-\d{2}", "%Y-%m-%d"), (r"^\d{2}/\d{2}/\d{4}", "%d/%m/%Y")):
+        if re.match(pattern, value):
+            try:
+                return datetime.strptime(value[:10], date_format).date()
+            except ValueError:
+                break
+    raise HTTPException(status_code=400, detail=f"Date invalide: {value}")
+
+
+def build_search_filter(search_term):
+    """
+    Construit le filtre de recherche ILIKE sur les colonnes de référence, d'état et de source
+    Les colonnes encodées sont filtrées via leur dictionnaire (quelques lignes) plutôt que ligne par ligne
+    """
+    etat_model = DICTIONARY_MODELS["etat"]
+    source_model = DICTIONARY_MODELS["source"]
+    return (
+        (FileData.reference.ilike(search_term)) |
+        (FileData.id_lin.ilike(search_term)) |
+        (FileData.id_ccu.ilike(search_term)) |
+        (FileData.etat_id.in_(select(etat_model.id).where(etat_model.value.ilike(search_term)))) |
+        (FileData.source_id.in_(select(source_model.id).where(source_model.value.ilike(search_term))))
+    )
+
+
+def build_filters(
+    search: Optional[str] = None,
+    file_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> List[Any]:
+    """
+    Build the ORM criteria of the standard filters.
+
+    Returns:
+        List[Any]: Criteria to pass to Query.filter()
+    """
+    criteria = []
+    if search:
+        criteria.append(build_search_filter(f"%{search}%"))
+    if file_name and file_name != "all":
+        criteria.append(FileData.file_name == file_name)
+    if date_from:
+        criteria.append(FileData.creation_date >= parse_filter_date(date_from))
+    if date_to:
+        criteria.append(FileData.creation_date <= parse_filter_date(date_to))
+    return criteria
+
+
+def build_filter_sql(
+    search: Optional[str] = None,
+    file_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the WHERE clause of the standard filters for raw SQL queries on file_data.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The condition (always valid, "TRUE" without
+        filters) and its bound parameters
+    """
+    conditions = ["TRUE"]
+    params: Dict[str, Any] = {}
+    if search:
+        conditions.append(SEARCH_SQL)
+        params["search"] = f"%{search}%"
+    if file_name and file_name != "all":
+        conditions.append("file_name = :file_name")
+        params["file_name"] = file_name
+    if date_from:
+        conditions.append("creation_date >= :date_from")
+        params["date_from"] = parse_filter_date(date_from)
+    if date_to:
+        conditions.append("creation_date <= :date_to")
+        params["date_to"] = parse_filter_date(date_to)
+    return " AND ".join(conditions), params
+
+
+def period_sql(group_by: str, column: str = "creation_date") -> str:
+    """
+    SQL expression of the aggregation period of a date column.
+
+    Weeks keep their historical label (the timestamp of the Monday cast to
+    text), other groupings use YYYY-MM-DD, YYYY-MM or YYYY.
+    """
+    if group_by == "semaine":
+        return f"CAST(date_trunc('week', {column}) AS TEXT)"
+    return f"to_char({column}, '{PERIOD_FORMATS.get(group_by, PERIOD_FORMATS['jour'])}')"
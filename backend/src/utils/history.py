@@ -0,0 +1,93 @@
+"""
+State history of the references.
+
+The same reference appears in many imported files with different `etat`
+values. reference_transitions keeps, for each reference, its first
+observation and every change of state, in observation order: rows are
+sorted on COALESCE(mise_a_jour_date, creation_date, import_date), i.e. the
+update date, falling back to the creation date when it is missing and to
+the import date when both are, with ties broken by id (insertion order).
+
+The history of a reference only depends on its own rows, so imports and
+deletions recompute it for the references they touch, in their transaction,
+with a window function over the indexed `reference` column. Concurrent
+refreshes of the same reference are serialized with transaction-level
+advisory locks, one per bucket of references.
+"""
+
+from typing import Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Première observation et changements d'état de chaque référence ({condition}
+# restreint les lignes de file_data lues)
+TRANSITIONS_SQL = """
+INSERT INTO reference_transitions (
+    reference, sequence, file_data_id, file_name, from_etat_id, to_etat_id, transition_date
+)
+SELECT
+    reference,
+    row_number() OVER (PARTITION BY reference ORDER BY observation),
+    id, file_name, from_etat_id, to_etat_id, observed_date
+FROM (
+    SELECT
+        id, reference, file_name, observed_date,
+        etat_id AS to_etat_id,
+        LAG(etat_id) OVER observations AS from_etat_id,
+        row_number() OVER observations AS observation
+    FROM (
+        SELECT
+            id, reference, file_name, etat_id,
+            COALESCE(mise_a_jour_date, creation_date, CAST(import_date AS DATE)) AS observed_date
+        FROM file_data
+        WHERE reference IS NOT NULL {condition}
+    ) observed
+    WINDOW observations AS (PARTITION BY reference ORDER BY observed_date, id)
+) ordered
+WHERE observation = 1 OR from_etat_id IS DISTINCT FROM to_etat_id
+"""
+
+# Verrous consultatifs par groupe de références (hash de la référence modulo
+# HISTORY_LOCK_BUCKETS, libérés à la fin de la transaction): un import de
+# plusieurs milliers de références prend au plus HISTORY_LOCK_BUCKETS verrous
+# dans la table partagée de PostgreSQL (64 x max_connections entrées). Pris dans
+# l'ordre des groupes pour que deux imports ne puissent pas s'interbloquer
+HISTORY_LOCK_NAMESPACE = 36
+HISTORY_LOCK_BUCKETS = 256
+LOCK_REFERENCES_SQL = f"""
+SELECT pg_advisory_xact_lock(:namespace, bucket)
+FROM (
+    SELECT DISTINCT hashtext(reference) & {HISTORY_LOCK_BUCKETS - 1} AS bucket
+    FROM unnest(CAST(:references AS text[])) AS reference
+) buckets
+ORDER BY bucket
+"""
+
+REBUILD_HISTORY_SQL = "TRUNCATE reference_transitions RESTART IDENTITY;" + TRANSITIONS_SQL.format(condition="")
+
+
+def refresh_reference_history(db: Session, references: Iterable[str]) -> None:
+    """
+    Recompute the history of the given references from their current rows
+    (within the caller's transaction).
+
+    The buckets of the references are locked first: without it, two
+    transactions touching the same reference could both delete its history,
+    then both insert it, leaving duplicate transitions.
+    """
+    references = sorted({reference for reference in references if reference is not None})
+    if not references:
+        return
+    params = {"references": references}
+    db.execute(text(LOCK_REFERENCES_SQL), {**params, "namespace": HISTORY_LOCK_NAMESPACE}).fetchall()
+    db.execute(text("DELETE FROM reference_transitions WHERE reference = ANY(:references)"), params)
+    db.execute(text(TRANSITIONS_SQL.format(condition="AND reference = ANY(:references)")), params)
+
+
+def references_of_file(db: Session, file_name: str) -> List[str]:
+    """References present in a file (to refresh their history once it is deleted)."""
+    return db.execute(
+        text("SELECT DISTINCT reference FROM file_data WHERE file_name = :file_name AND reference IS NOT NULL"),
+        {"file_name": file_name}
+    ).scalars().all()
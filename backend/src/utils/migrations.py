@@ -0,0 +1,38 @@
+"""
+Schema management with Alembic.
+
+Migrations are run once per deployment (`poetry run migrate`), never at
+application import or worker startup.
+"""
+
+import sys
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+from src.utils.database import wait_for_database
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def get_alembic_config() -> Config:
+    """Build the Alembic configuration from backend/alembic.ini."""
+    return Config(str(ALEMBIC_INI))
+
+
+def upgrade_database(revision: str = "head") -> None:
+    """Apply the migrations up to the given revision."""
+    command.upgrade(get_alembic_config(), revision)
+
+
+def main():
+    """
+    Point d'entrée du script `migrate`: attend la base puis applique les migrations.
+    """
+    revision = sys.argv[1] if len(sys.argv) > 1 else "head"
+    if not wait_for_database():
+        print("❌ La base de données est injoignable, migrations annulées.")
+        sys.exit(1)
+    upgrade_database(revision)
+    print(f"✅ Migrations appliquées jusqu'à la révision {revision}.")
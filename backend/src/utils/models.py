@@ -1,10 +1,43 @@
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text, TIMESTAMP, ForeignKey, DateTime
+    Column, Integer, BigInteger, String, Text, TIMESTAMP, ForeignKey, DateTime, Date, Index, JSON
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, object_session
 from sqlalchemy.sql import func
 from .database import Base
+from .dictionary import DICTIONARY_COLUMNS, dictionary_cache
+
+
+def _dictionary_model(column: str):
+    """Créer le modèle de la table de correspondance code -> valeur d'une colonne encodée"""
+    class_name = "Dict" + "".join(part.capitalize() for part in column.split("_"))
+    value = Column(String, nullable=False, unique=True)
+    return type(class_name, (Base,), {
+        "__tablename__": f"dict_{column}",
+        # Recherche des variantes de casse par la normalisation des imports
+        "__table_args__": (Index(f"ix_dict_{column}_lower_value", func.lower(value)),),
+        "id": Column(Integer, primary_key=True),
+        "value": value,
+    })
+
+
+DICTIONARY_MODELS = {column: _dictionary_model(column) for column in DICTIONARY_COLUMNS}
+
+
+class DecodedValue:
+    """
+    Expose la valeur texte d'une colonne encodée (lecture seule), décodée
+    depuis le cache du dictionnaire plutôt que par une jointure SQL
+    """
+
+    def __init__(self, column: str):
+        self.column = column
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        code = getattr(instance, f"{self.column}_id")
+        return dictionary_cache.decode(self.column, code, object_session(instance))
 
 
 class FileData(Base):
@@ -14,18 +47,74 @@ class FileData(Base):
     reference = Column(String, index=True, nullable=True)
     id_lin = Column(String, nullable=True)
     id_ccu = Column(String, nullable=True)
-    etat = Column(String, nullable=True)
+    etat_id = Column(Integer, ForeignKey("dict_etat.id"), nullable=True)
     creation = Column(String, nullable=True)  # Stocké comme string pour préserver le format
     mise_a_jour = Column(String, nullable=True)
+    creation_date = Column(Date, index=True, nullable=True)  # Date de création analysée à l'import
+    mise_a_jour_date = Column(Date, nullable=True)
     idrh = Column(String, nullable=True)
     device_id = Column(String, nullable=True)
     retour_metier = Column(String, nullable=True)
     commentaires_cloture = Column(String, nullable=True)
-    nom_bureau_poste = Column(String, nullable=True)
-    regate = Column(String, nullable=True)
-    source = Column(String, nullable=True)
-    solution_scan = Column(String, nullable=True)
-    rg = Column(String, nullable=True)
-    ruo = Column(String, nullable=True)
+    nom_bureau_poste_id = Column(Integer, ForeignKey("dict_nom_bureau_poste.id"), nullable=True)
+    regate_id = Column(Integer, ForeignKey("dict_regate.id"), nullable=True)
+    source_id = Column(Integer, ForeignKey("dict_source.id"), nullable=True)
+    solution_scan_id = Column(Integer, ForeignKey("dict_solution_scan.id"), nullable=True)
+    rg_id = Column(Integer, ForeignKey("dict_rg.id"), nullable=True)
+    ruo_id = Column(Integer, ForeignKey("dict_ruo.id"), nullable=True)
     file_name = Column(String, index=True)
-    import_date = Column(DateTime, default=datetime.utcnow)  # Ajout d'une valeur par défaut
\ No newline at end of file
+    import_date = Column(DateTime, default=datetime.utcnow)  # Ajout d'une valeur par défaut
+
+    # Valeurs décodées, identiques aux anciennes colonnes texte
+    etat = DecodedValue("etat")
+    nom_bureau_poste = DecodedValue("nom_bureau_poste")
+    regate = DecodedValue("regate")
+    source = DecodedValue("source")
+    solution_scan = DecodedValue("solution_scan")
+    rg = DecodedValue("rg")
+    ruo = DecodedValue("ruo")
+
+
+class ImportReport(Base):
+    """Rapport de qualité produit par la normalisation d'un import"""
+    __tablename__ = "import_reports"
+
+    id = Column(Integer, primary_key=True)
+    file_name = Column(String, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    total_rows = Column(Integer, nullable=False)
+    invalid_rows = Column(Integer, nullable=False)
+    report = Column(JSON, nullable=False)
+
+
+class ReferenceTransition(Base):
+    """
+    Changement d'état d'une référence d'une observation à la suivante (première observation incluse),
+    maintenu à chaque import et suppression pour les références concernées
+    """
+    __tablename__ = "reference_transitions"
+    __table_args__ = (
+        Index("ix_reference_transitions_reference_date", "reference", "transition_date"),
+        Index("ix_reference_transitions_date", "transition_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    reference = Column(String, nullable=False)
+    sequence = Column(Integer, nullable=False)  # Rang du changement dans l'historique de la référence (1 = première observation)
+    file_data_id = Column(Integer, nullable=False)  # Ligne portant le nouvel état
+    file_name = Column(String)
+    from_etat_id = Column(Integer)  # NULL pour la première observation
+    to_etat_id = Column(Integer)
+    transition_date = Column(Date)  # mise_a_jour_date, sinon creation_date, sinon date d'import
+
+
+class ReplicaWriteMark(Base):
+    """
+    Position WAL du primaire après la dernière écriture de chaque fichier ("*": toute écriture),
+    partagée par les workers pour ne lire sur le réplica que les données qu'il a déjà rejouées
+    """
+    __tablename__ = "replica_write_marks"
+
+    file_name = Column(String, primary_key=True)
+    lsn = Column(BigInteger, nullable=False)  # pg_current_wal_lsn() en octets, relevé après le commit
+    written_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,265 @@
+"""
+Batched normalization and validation of imported rows.
+
+Rows are cleaned once, column by column over the whole batch with pandas,
+instead of compensating on every read:
+
+- text values are trimmed and empty strings become NULL;
+- categorical (dictionary-encoded) values have their inner whitespace
+  collapsed and casing variants mapped to the most frequent spelling of the
+  batch, then to the spelling already stored in the dictionary
+  (fold_dictionary_spellings, the only step reading the database);
+- `creation` and `mise_a_jour` (DD/MM/YYYY or ISO strings, kept as sent) are
+  parsed into `creation_date` / `mise_a_jour_date`;
+- invalid rows are flagged, and a quality report is returned for the import
+  and for each imported file.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.utils.dictionary import DICTIONARY_COLUMNS
+
+TEXT_COLUMNS = [
+    "reference", "id_lin", "id_ccu", "etat", "creation", "mise_a_jour", "idrh",
+    "device_id", "retour_metier", "commentaires_cloture", "nom_bureau_poste",
+    "regate", "source", "solution_scan", "rg", "ruo", "file_name",
+]
+
+# Colonnes de dates texte et colonnes de dates typées correspondantes
+DATE_COLUMNS = {
+    "creation": "creation_date",
+    "mise_a_jour": "mise_a_jour_date",
+}
+
+FRENCH_DATE_PATTERN = r"^\d{2}/\d{2}/\d{4}"
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}"
+
+# Nombre maximal d'index de lignes conservés par anomalie dans le rapport
+MAX_REPORTED_ROWS = 50
+
+
+def parse_dates(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Parse DD/MM/YYYY and ISO (YYYY-MM-DD...) strings, only the date part is kept.
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: The parsed dates (NaT when missing or
+        invalid) and the detected format of each value ("dd/mm/yyyy", "iso",
+        "invalide" or None when missing)
+    """
+    french = values.str.match(FRENCH_DATE_PATTERN, na=False)
+    iso = values.str.match(ISO_DATE_PATTERN, na=False)
+
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    parsed[french] = pd.to_datetime(values[french].str.slice(0, 10), format="%d/%m/%Y", errors="coerce")
+    parsed[iso] = pd.to_datetime(values[iso].str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+
+    detected = pd.Series(None, index=values.index, dtype=object)
+    detected[french] = "dd/mm/yyyy"
+    detected[iso] = "iso"
+    detected[values.notna() & parsed.isna()] = "invalide"
+    return parsed, detected
+
+
+def canonicalize(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Collapse inner whitespace and map casing variants of a categorical
+    column to their most frequent spelling.
+
+    The column has few distinct values: the work is done on those (after
+    pd.factorize) and mapped back to the rows in one take.
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: The canonical values and the mask of the
+        rows whose value was changed
+    """
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return values, pd.Series(False, index=values.index)
+
+    uniques = pd.Series(uniques, dtype="string")
+    collapsed = uniques.str.replace(r"\s+", " ", regex=True)
+    counts = pd.Series(codes[codes >= 0]).value_counts().reindex(uniques.index, fill_value=0)
+
+    # Orthographe la plus fréquente pour chaque clé (à égalité, la première rencontrée)
+    spellings = pd.DataFrame({"key": collapsed.str.lower(), "value": collapsed, "count": counts})
+    spellings = spellings.groupby(["key", "value"], sort=False)["count"].sum().reset_index()
+    spellings = spellings.sort_values("count", ascending=False, kind="stable")
+    canonical_by_key = spellings.drop_duplicates("key").set_index("key")["value"]
+    canonical_uniques = collapsed.str.lower().map(canonical_by_key)
+
+    changed_uniques = (canonical_uniques != uniques).to_numpy(dtype=bool)
+    changed = pd.Series(changed_uniques[codes] & (codes >= 0), index=values.index)
+    canonical = pd.Series(canonical_uniques.to_numpy(dtype=object)[codes], index=values.index, dtype=object)
+    canonical[codes < 0] = None
+    return canonical, changed
+
+
+def quality_report(frame: pd.DataFrame, rows: pd.Series, empty_rows: pd.Series,
+                   issues: Dict[str, pd.Series], columns: Dict[str, Dict[str, pd.Series]]) -> Dict[str, Any]:
+    """
+    Quality report of a subset of a normalized batch (the whole batch or one file).
+
+    Args:
+        frame: The normalized batch, empty rows and format columns included
+        rows: Mask of the rows covered by the report
+        empty_rows: Mask of the completely empty rows
+        issues: Mask of the rows having each anomaly
+        columns: Masks of the per-column counters ("nulls", "trimmed", "canonicalized")
+
+    Returns:
+        Dict[str, Any]: The counters of the selected rows; row indexes are
+        positions in the batch
+    """
+    subset = frame.loc[rows]
+    issues = {name: mask & rows for name, mask in issues.items()}
+    invalid = pd.concat(issues.values(), axis=1).any(axis=1)
+
+    columns_report = {}
+    for column, masks in columns.items():
+        columns_report[column] = {name: int((mask & rows).sum()) for name, mask in masks.items()}
+        if column in DICTIONARY_COLUMNS:
+            columns_report[column]["distinct_values"] = int(subset[column].nunique())
+
+    date_formats = {}
+    for column in DATE_COLUMNS:
+        detected = subset[f"_{column}_format"]
+        date_formats[column] = {
+            "dd/mm/yyyy": int((detected == "dd/mm/yyyy").sum()),
+            "iso": int((detected == "iso").sum()),
+            "invalide": int((detected == "invalide").sum()),
+            "absente": int(detected.isna().sum()),
+        }
+
+    return {
+        "file_names": sorted(subset["file_name"].dropna().unique().tolist()),
+        "total_rows": int(rows.sum()),
+        "empty_rows": int((rows & empty_rows).sum()),
+        "invalid_rows": int(invalid.sum()),
+        "issues": {name: int(mask.sum()) for name, mask in issues.items()},
+        "invalid_row_indexes": {
+            name: mask[mask].index[:MAX_REPORTED_ROWS].tolist()
+            for name, mask in issues.items() if mask.any()
+        },
+        "date_formats": date_formats,
+        "columns": columns_report,
+    }
+
+
+def normalize_frame(frame: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Normalize and validate a batch of imported rows.
+
+    Args:
+        frame: Rows using the API column names
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, Any]]: The normalized rows (with the
+        typed date columns added), one per input row and in the same order so
+        that the created rows match the request, and the quality report of
+        the batch, with the report of each imported file under "files"
+    """
+    frame = frame.reindex(columns=TEXT_COLUMNS).astype(object)
+    columns = {}
+
+    # Espaces en début/fin et chaînes vides -> NULL (compteurs gardés ligne à ligne)
+    for column in TEXT_COLUMNS:
+        raw = frame[column]
+        stripped = raw.str.strip()
+        stripped = stripped.where(stripped != "")
+        masks = {
+            "nulls": stripped.isna(),
+            "trimmed": stripped.notna() & (stripped != raw),
+        }
+        if column in DICTIONARY_COLUMNS:
+            stripped, masks["canonicalized"] = canonicalize(stripped)
+        frame[column] = stripped
+        columns[column] = masks
+
+    # Lignes entièrement vides (hors nom de fichier): conservées, mais comptées
+    # à part plutôt que signalées pour chacune de leurs valeurs manquantes
+    data_columns = [column for column in TEXT_COLUMNS if column != "file_name"]
+    empty_rows = frame[data_columns].isna().all(axis=1)
+
+    # Dates
+    for column, date_column in DATE_COLUMNS.items():
+        parsed, detected = parse_dates(frame[column])
+        frame[date_column] = parsed.dt.date.where(parsed.notna(), None)
+        frame[f"_{column}_format"] = detected
+
+    # Anomalies, évaluées colonne par colonne sur tout le lot
+    creation = pd.to_datetime(frame["creation_date"])
+    mise_a_jour = pd.to_datetime(frame["mise_a_jour_date"])
+    issues = {
+        "fichier_manquant": frame["file_name"].isna(),
+        "reference_manquante": frame["reference"].isna(),
+        "creation_manquante": frame["creation"].isna(),
+        "creation_invalide": frame["_creation_format"] == "invalide",
+        "mise_a_jour_invalide": frame["_mise_a_jour_format"] == "invalide",
+        "dates_incoherentes": mise_a_jour < creation,
+        "doublon": frame.duplicated(subset=TEXT_COLUMNS, keep="first"),
+    }
+    issues = {name: mask & ~empty_rows for name, mask in issues.items()}
+
+    # Rapport du lot, puis de chaque fichier sur ses seules lignes
+    all_rows = pd.Series(True, index=frame.index)
+    report = quality_report(frame, all_rows, empty_rows, issues, columns)
+    report["files"] = {
+        file_name: quality_report(frame, frame["file_name"] == file_name, empty_rows, issues, columns)
+        for file_name in report["file_names"]
+    }
+
+    frame = frame.drop(columns=[f"_{column}_format" for column in DATE_COLUMNS])
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame, report
+
+
+def fold_dictionary_spellings(engine: Engine, frame: pd.DataFrame) -> Dict[str, int]:
+    """
+    Replace the casing variants of values already stored in a dictionary by
+    the stored spelling ("EN COURS" becomes "En cours" when the latter
+    exists), so that a variant gets the existing code instead of a new one.
+
+    As a consequence the API returns the stored spelling of such values, not
+    the one that was sent.
+
+    Args:
+        engine: Engine of the primary database
+        frame: Normalized rows, modified in place
+
+    Returns:
+        Dict[str, int]: Number of values replaced in each encoded column
+    """
+    folded = {}
+    with engine.connect() as connection:
+        for column in DICTIONARY_COLUMNS:
+            values = frame[column].dropna().unique().tolist()
+            if not values:
+                folded[column] = 0
+                continue
+            # Comparaison faite par PostgreSQL (lower()), comme l'index des dictionnaires
+            rows = connection.execute(
+                text(
+                    f"SELECT DISTINCT ON (v.value) v.value, d.value FROM unnest(CAST(:values AS text[])) AS v(value) "
+                    f"JOIN dict_{column} d ON lower(d.value) = lower(v.value) "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM dict_{column} e WHERE e.value = v.value) "
+                    f"ORDER BY v.value, d.id"
+                ),
+                {"values": values}
+            ).fetchall()
+            spellings = dict(rows)
+            changed = frame[column].isin(list(spellings))
+            frame.loc[changed, column] = frame.loc[changed, column].map(spellings)
+            folded[column] = int(changed.sum())
+    return folded
+
+
+def normalize_records(records: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Normalize and validate API payload records, see normalize_frame().
+    """
+    return normalize_frame(pd.DataFrame.from_records(records, columns=TEXT_COLUMNS))
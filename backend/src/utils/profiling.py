@@ -0,0 +1,214 @@
+"""
+Opt-in slow query profiling.
+
+When SLOW_QUERY_PROFILING is enabled, every statement executed through the
+engine is timed. Statements slower than SLOW_QUERY_THRESHOLD_MS are recorded
+with their bound parameters (only the size of batched inserts, which hold
+whole imported files) in an in-process ring buffer, and a sampled
+fraction of the read queries is re-run with EXPLAIN (ANALYZE, BUFFERS) so the
+plan that was actually chosen can be inspected from the admin endpoint.
+
+EXPLAIN ANALYZE executes the statement again, synchronously, inside the
+request that ran it: each sampled slow query costs about twice its duration
+(tune SLOW_QUERY_EXPLAIN_SAMPLE_RATE accordingly). Statements with side
+effects are never re-run: writes, locking reads, SELECT INTO, and reads that
+call side-effecting functions (pg_notify, nextval, advisory locks...).
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from src.utils.settings import (
+    SLOW_QUERY_PROFILING,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_BUFFER_SIZE,
+)
+
+# Only statements starting with these keywords are safe to EXPLAIN ANALYZE
+EXPLAINABLE_PREFIXES = ("SELECT", "WITH")
+# Keywords that make a WITH statement a write (data-modifying CTE)
+WRITE_KEYWORDS = ("INSERT", "UPDATE", "DELETE", "MERGE")
+# Reads that must not run twice: functions with side effects (a notification
+# sent from a released savepoint is still delivered at commit, a sequence
+# would advance twice...), row locks and SELECT INTO (creates a table)
+SIDE_EFFECT_PATTERN = re.compile(
+    r"\b(?:pg_notify|nextval|setval|set_config|pg_(?:try_)?advisory_\w*|pg_sleep\w*|txid_current"
+    r"|pg_current_xact_id|lo_\w+|dblink\w*|pg_cancel_backend|pg_terminate_backend)\s*\("
+    r"|\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(?:KEY\s+)?SHARE\b|\bINTO\b",
+    re.IGNORECASE
+)
+
+
+# Batches (executemany, insertmanyvalues) hold whole imported files: only their
+# size and the beginning of their statement are recorded
+MAX_BATCH_STATEMENT_LENGTH = 1000
+
+
+class SlowQueryRecorder:
+    """
+    Thread-safe ring buffer holding the most recent slow queries.
+
+    Each worker process keeps its own buffer.
+    """
+
+    def __init__(self, maxlen: int):
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Return the recorded entries, most recent first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_recorder = SlowQueryRecorder(SLOW_QUERY_BUFFER_SIZE)
+
+
+def _serialize_parameters(parameters: Any) -> Any:
+    """
+    Convert bound parameters to JSON-friendly values.
+    """
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: _serialize_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_serialize_parameters(value) for value in parameters]
+    return _serialize_value(parameters)
+
+
+def _summarize_batch(statement: str, parameters: Any):
+    """
+    Statement and parameters recorded for a batch: the statement truncated,
+    and the number of parameter sets / values instead of the values.
+    """
+    if len(statement) > MAX_BATCH_STATEMENT_LENGTH:
+        statement = statement[:MAX_BATCH_STATEMENT_LENGTH] + " ..."
+    if isinstance(parameters, dict):
+        summary = {"values": len(parameters)}
+    elif isinstance(parameters, (list, tuple)):
+        summary = {"parameter_sets": len(parameters)}
+    else:
+        summary = None
+    return statement, summary
+
+
+def _serialize_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def is_explainable(statement: str) -> bool:
+    """
+    Check that a statement is a pure read that can be re-run with EXPLAIN
+    ANALYZE (which executes it a second time) without side effects.
+    """
+    normalized = statement.lstrip().upper()
+    if not normalized.startswith(EXPLAINABLE_PREFIXES):
+        return False
+    if normalized.startswith("WITH") and any(keyword in normalized for keyword in WRITE_KEYWORDS):
+        return False
+    return SIDE_EFFECT_PATTERN.search(statement) is None
+
+
+def explain_analyze(cursor, statement: str, parameters: Any) -> Optional[Any]:
+    """
+    Re-run a statement with EXPLAIN (ANALYZE, BUFFERS) on the same connection.
+
+    The plan is captured inside a savepoint so that a failure never aborts the
+    caller's transaction. Returns the JSON plan, or None if it could not be
+    captured.
+    """
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement,
+                parameters
+            )
+            plan = explain_cursor.fetchone()[0]
+            explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            print(f"Impossible de capturer le plan EXPLAIN: {e}")
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return None
+    except Exception as e:
+        # SAVEPOINT is unavailable (e.g. autocommit connection)
+        print(f"Impossible de capturer le plan EXPLAIN: {e}")
+        return None
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    # insertmanyvalues: un INSERT de plusieurs lignes exécuté comme une requête simple
+    batch = executemany or (
+        context is not None and getattr(context, "execute_style", None) is ExecuteStyle.INSERTMANYVALUES
+    )
+
+    plan = None
+    if (
+        not batch
+        and is_explainable(statement)
+        and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+    ):
+        plan = explain_analyze(cursor, statement, parameters)
+
+    if batch:
+        statement, recorded_parameters = _summarize_batch(statement, parameters)
+    else:
+        recorded_parameters = _serialize_parameters(parameters)
+
+    slow_query_recorder.record({
+        "recorded_at": datetime.now(timezone.utc),
+        "duration_ms": round(duration_ms, 3),
+        "statement": statement,
+        "parameters": recorded_parameters,
+        "executemany": executemany,
+        "plan": plan,
+    })
+
+
+def install_query_profiler(engine: Engine) -> None:
+    """
+    Attach the slow query listeners to an engine when profiling is enabled.
+    """
+    if not SLOW_QUERY_PROFILING:
+        return
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
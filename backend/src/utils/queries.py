@@ -0,0 +1,337 @@
+"""
+SQL of the analytics widgets, shared by the individual routes and /dashboard.
+
+Each builder reads a `source` relation: file_data (with the WHERE clause of
+the standard filters) for the individual routes, or the already filtered
+CTE of /dashboard, so that the widgets compute exactly the same thing in
+both cases. CTE names can be prefixed to combine several widgets in one
+statement.
+"""
+
+from typing import List, Tuple
+
+from sqlalchemy import String
+
+from src.utils.dictionary import DICTIONARY_COLUMNS
+from src.utils.filters import period_sql
+from src.utils.models import FileData
+
+# Nombre de lignes d'exemple conservées par période
+AGGREGATE_SAMPLE_SIZE = 5
+
+# Colonnes lues par les agrégations et les statistiques
+AGGREGATE_COLUMNS = ["id", "reference", "etat_id", "creation", "creation_date", "file_name"]
+STATS_COLUMNS = ["id", "file_name", "source_id", "creation", "creation_date"]
+
+# Regroupements par période de la date de création
+PERIOD_GROUPS = ["jour", "semaine", "mois", "annee"]
+
+# Champs dont la distribution est calculable en SQL brut: colonnes encodées et colonnes texte
+DISTRIBUTION_FIELDS = DICTIONARY_COLUMNS + [
+    column.name for column in FileData.__table__.columns
+    if isinstance(column.type, String) and column.name not in DICTIONARY_COLUMNS
+]
+
+# Dimensions d'un tableau croisé: un champ catégoriel ou une période
+PIVOT_DIMENSIONS = DISTRIBUTION_FIELDS + PERIOD_GROUPS
+
+
+def aggregate_ctes(group_by: str, source: str = "file_data", where_sql: str = "TRUE",
+                   prefix: str = "") -> Tuple[List[str], str]:
+    """
+    CTEs and final SELECT (period, count, data) of the aggregation by period.
+
+    Returns:
+        Tuple[List[str], str]: The CTE definitions and the SELECT reading them,
+        ordered by period
+    """
+    # La période est calculée sur la date de création analysée à l'import
+    # (les lignes sans date valide n'appartiennent à aucune période)
+    ctes = [
+        f"""{prefix}period_data AS (
+        SELECT
+            id, reference, etat_id, creation, file_name,
+            {period_sql(group_by)} AS period
+        FROM
+            {source}
+        WHERE
+            {where_sql} AND creation_date IS NOT NULL
+    )""",
+        f"""{prefix}ranked_data AS (
+        SELECT
+            id, reference, etat_id, creation, file_name, period,
+            row_number() OVER (PARTITION BY period ORDER BY id) AS rn
+        FROM
+            {prefix}period_data
+    )""",
+        f"""{prefix}limited_data AS (
+        -- Décoder l'état uniquement pour les lignes conservées par période
+        SELECT
+            rd.id, rd.reference, de.value AS etat, rd.creation, rd.file_name, rd.period
+        FROM
+            {prefix}ranked_data rd
+            LEFT JOIN dict_etat de ON de.id = rd.etat_id
+        WHERE
+            rd.rn <= {AGGREGATE_SAMPLE_SIZE}
+    )""",
+        f"""{prefix}counts AS (
+        SELECT
+            period, COUNT(*) AS count
+        FROM
+            {prefix}period_data
+        GROUP BY
+            period
+    )""",
+        f"""{prefix}samples AS (
+        -- Un seul regroupement plutôt qu'une sous-requête par période
+        SELECT
+            ld.period,
+            json_agg(
+                json_build_object(
+                    'id', ld.id,
+                    'reference', ld.reference,
+                    'etat', ld.etat,
+                    'creation', ld.creation,
+                    'file_name', ld.file_name
+                )
+                ORDER BY ld.id
+            ) AS data
+        FROM
+            {prefix}limited_data ld
+        GROUP BY
+            ld.period
+    )""",
+    ]
+    select = f"""
+    SELECT
+        c.period,
+        c.count,
+        COALESCE(s.data, '[]'::json) AS data
+    FROM
+        {prefix}counts c
+        LEFT JOIN {prefix}samples s ON s.period = c.period
+    ORDER BY
+        c.period
+    """
+    return ctes, select
+
+
+def with_ctes(ctes: List[str], select: str) -> str:
+    """Assemble CTE definitions and the SELECT reading them into one statement."""
+    return "WITH " + ",\n    ".join(ctes) + select
+
+
+def stats_select(source: str) -> str:
+    """
+    SELECT of the general statistics (total_entries, unique_files,
+    latest_entry, unique_sources) of an already filtered relation.
+    """
+    return f"""
+    SELECT
+        (SELECT COUNT(*) FROM {source}) AS total_entries,
+        (SELECT COUNT(DISTINCT file_name) FROM {source}) AS unique_files,
+        (SELECT creation FROM {source} ORDER BY creation_date DESC NULLS LAST, id DESC LIMIT 1) AS latest_entry,
+        (SELECT COUNT(DISTINCT source_id) FROM {source} WHERE source_id IS NOT NULL) AS unique_sources
+    """
+
+
+def distribution_column(field: str) -> str:
+    """Column of file_data grouped for a field (the code of an encoded column)."""
+    return f"{field}_id" if field in DICTIONARY_COLUMNS else field
+
+
+def distribution_select(field: str, source: str = "file_data", where_sql: str = "TRUE") -> str:
+    """
+    SELECT (label, count) of the distribution of a field. Encoded columns are
+    grouped on their code, then only the groups are decoded.
+    """
+    column = distribution_column(field)
+    counts = f"SELECT {column} AS code, COUNT(*) AS count FROM {source} WHERE {where_sql} GROUP BY {column}"
+    if field in DICTIONARY_COLUMNS:
+        return f"""
+    SELECT
+        d.value AS label, c.count
+    FROM
+        ({counts}) c
+        LEFT JOIN dict_{field} d ON d.id = c.code
+    """
+    return f"SELECT code AS label, count FROM ({counts}) c"
+
+
+def dashboard_query(widgets: List[Tuple[str, str]], where_sql: str) -> str:
+    """
+    One statement computing several widgets from a single filtered scan.
+
+    The filtered rows are materialized once (only the columns the widgets
+    read), then every widget reads that CTE. No temporary table is used, so
+    the statement also runs on a read replica.
+
+    Args:
+        widgets: (kind, argument) pairs: ("stats", ""), ("aggregate", group_by)
+            or ("distribution", field), already validated
+        where_sql: Condition built by build_filter_sql()
+
+    Returns:
+        str: A statement returning one JSON object, keyed by the position of
+        each widget: the stats row, [period, count, data] triples or
+        [label, count] pairs
+    """
+    columns = set()
+    ctes: List[str] = []
+    values: List[str] = []
+    for index, (kind, argument) in enumerate(widgets):
+        if kind == "stats":
+            columns.update(STATS_COLUMNS)
+            value = f"(SELECT row_to_json(s) FROM ({stats_select('filtered')}) s)"
+        elif kind == "aggregate":
+            columns.update(AGGREGATE_COLUMNS)
+            widget_ctes, select = aggregate_ctes(argument, "filtered", prefix=f"w{index}_")
+            ctes.extend(widget_ctes)
+            value = (
+                "(SELECT COALESCE(json_agg(json_build_array(a.period, a.count, a.data) ORDER BY a.period), '[]'::json) "
+                f"FROM ({select}) a)"
+            )
+        else:
+            columns.add(distribution_column(argument))
+            value = (
+                "(SELECT COALESCE(json_agg(json_build_array(d.label, d.count)), '[]'::json) "
+                f"FROM ({distribution_select(argument, 'filtered')}) d)"
+            )
+        values.append(f"'{index}', {value}")
+
+    # Parcours unique de file_data, partagé par tous les widgets
+    filtered = f"""filtered AS MATERIALIZED (
+        SELECT
+            {", ".join(sorted(columns))}
+        FROM
+            file_data
+        WHERE
+            {where_sql}
+    )"""
+    select = f"""
+    SELECT json_build_object(
+        {", ".join(values)}
+    )
+    """
+    return with_ctes([filtered] + ctes, select)
+
+
+def _pivot_dimension(dimension: str, side: str) -> Tuple[str, str, str]:
+    """Grouped expression, decoded label and dictionary join of a pivot axis."""
+    if dimension in PERIOD_GROUPS:
+        return period_sql(dimension), f"codes.{side}", ""
+    if dimension in DICTIONARY_COLUMNS:
+        return (
+            f"{dimension}_id",
+            f"d{side}.value",
+            f"LEFT JOIN dict_{dimension} d{side} ON d{side}.id = codes.{side}",
+        )
+    return dimension, f"codes.{side}", ""
+
+
+def pivot_query(row_dimension: str, column_dimension: str, where_sql: str) -> str:
+    """
+    Crosstab of two dimensions in one grouped scan of file_data.
+
+    Encoded columns are grouped on their code and only the groups are
+    decoded. Each label gets the rank of its total on its axis (ties broken
+    by label), and the labels beyond the :rows_limit / :columns_limit
+    parameters (0 = no limit) are merged into an "other" bucket.
+
+    Args:
+        row_dimension: Field or period of the rows (in PIVOT_DIMENSIONS)
+        column_dimension: Field or period of the columns (in PIVOT_DIMENSIONS)
+        where_sql: Condition built by build_filter_sql()
+
+    The size of the dense matrix (labels kept on each axis, "other" bucket
+    included) is computed in the same statement, and the cells are only
+    returned when it does not exceed :max_cells, so an oversized crosstab is
+    rejected without being transferred.
+
+    Returns:
+        str: A statement returning (row_count, column_count, row, row_other,
+        row_rank, column, column_other, column_rank, count): one row per
+        non-empty cell, or a single row with NULL cells when the matrix is
+        empty (NULL sizes) or larger than :max_cells
+    """
+    row_expression, row_label, row_join = _pivot_dimension(row_dimension, "r")
+    column_expression, column_label, column_join = _pivot_dimension(column_dimension, "c")
+    if row_dimension in PERIOD_GROUPS or column_dimension in PERIOD_GROUPS:
+        # Les lignes sans date valide n'appartiennent à aucune période
+        where_sql = f"{where_sql} AND creation_date IS NOT NULL"
+
+    return f"""
+    WITH codes AS (
+        SELECT
+            {row_expression} AS r, {column_expression} AS c, COUNT(*) AS count
+        FROM
+            file_data
+        WHERE
+            {where_sql}
+        GROUP BY
+            1, 2
+    ),
+    cells AS (
+        -- Décoder uniquement les groupes obtenus
+        SELECT
+            {row_label} AS r, {column_label} AS c, codes.count
+        FROM
+            codes
+            {row_join}
+            {column_join}
+    ),
+    totals AS (
+        SELECT
+            r, c, count,
+            SUM(count) OVER (PARTITION BY r) AS row_total,
+            SUM(count) OVER (PARTITION BY c) AS column_total
+        FROM
+            cells
+    ),
+    ranked AS (
+        SELECT
+            r, c, count,
+            dense_rank() OVER (ORDER BY row_total DESC, r COLLATE "C" NULLS LAST) AS row_rank,
+            dense_rank() OVER (ORDER BY column_total DESC, c COLLATE "C" NULLS LAST) AS column_rank
+        FROM
+            totals
+    ),
+    bucketed AS (
+        SELECT
+            r, c, count, row_rank, column_rank,
+            :rows_limit > 0 AND row_rank > :rows_limit AS row_other,
+            :columns_limit > 0 AND column_rank > :columns_limit AS column_other
+        FROM
+            ranked
+    ),
+    grouped AS (
+        SELECT
+            CASE WHEN row_other THEN NULL ELSE r END AS r,
+            row_other,
+            MIN(row_rank) AS row_rank,
+            CASE WHEN column_other THEN NULL ELSE c END AS c,
+            column_other,
+            MIN(column_rank) AS column_rank,
+            SUM(count) AS count
+        FROM
+            bucketed
+        GROUP BY
+            1, 2, 4, 5
+    ),
+    axes AS (
+        -- Taille de la matrice dense: valeurs conservées, plus la case « Autres »
+        SELECT
+            CASE WHEN :rows_limit > 0 AND MAX(row_rank) > :rows_limit THEN :rows_limit + 1 ELSE MAX(row_rank) END AS row_count,
+            CASE WHEN :columns_limit > 0 AND MAX(column_rank) > :columns_limit THEN :columns_limit + 1 ELSE MAX(column_rank) END AS column_count
+        FROM
+            ranked
+    )
+    SELECT
+        axes.row_count, axes.column_count,
+        grouped.r, grouped.row_other, grouped.row_rank,
+        grouped.c, grouped.column_other, grouped.column_rank,
+        grouped.count
+    FROM
+        axes
+        LEFT JOIN grouped ON axes.row_count * axes.column_count <= :max_cells
+    """
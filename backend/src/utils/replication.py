@@ -0,0 +1,176 @@
+"""
+Read-replica routing helpers.
+
+Heavy read-only routes can be served by a streaming replica (DB_REPLICA_HOST)
+while imports keep writing to the primary. Two guards keep the dashboard
+consistent:
+
+- read-your-writes: after each write is committed, the WAL position of the
+  primary is stored in replica_write_marks (on the primary, so every worker
+  sees it). A read goes to the replica only once the replica has replayed
+  past the last write of the requested file (or of any file without a file
+  filter), so a freshly imported file is never missing, whichever worker
+  served the import;
+- the replica replay lag is measured (and cached) and the primary is used
+  whenever it exceeds REPLICA_MAX_LAG_SECONDS, the replica no longer
+  receives WAL or is unreachable.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.utils.settings import (
+    DB_REPLICA_HOST,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_LAG_CHECK_INTERVAL,
+    REPLICA_RECEIVER_TIMEOUT,
+)
+
+# Clé de la position de la dernière écriture, tous fichiers confondus
+ALL_FILES = "*"
+
+# Replay lag in seconds, NULL when the standby no longer receives WAL (no WAL
+# receiver, or no message from the primary for too long). 0 when the server
+# is not a standby or has replayed everything it received while still
+# receiving: an idle primary does not make the replica "late".
+REPLICA_LAG_QUERY = text("""
+    WITH receiver AS (
+        SELECT last_msg_receipt_time FROM pg_stat_wal_receiver
+    )
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM receiver) THEN NULL
+        WHEN (SELECT last_msg_receipt_time FROM receiver) < now() - make_interval(secs => :receiver_timeout) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+# Position du primaire après le commit d'une écriture (en octets depuis 0/0)
+RECORD_WRITE_QUERY = text("""
+    INSERT INTO replica_write_marks (file_name, lsn, written_at)
+    SELECT name, pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0'), now()
+    FROM unnest(CAST(:names AS text[])) AS name
+    ON CONFLICT (file_name) DO UPDATE SET lsn = EXCLUDED.lsn, written_at = EXCLUDED.written_at
+""")
+WRITE_MARK_QUERY = text("SELECT lsn FROM replica_write_marks WHERE file_name = :file_name")
+
+# Position rejouée par le réplica (None si le serveur n'est pas un standby: tout est visible)
+REPLAY_POSITION_QUERY = text("""
+    SELECT CASE WHEN pg_is_in_recovery() THEN pg_wal_lsn_diff(pg_last_wal_replay_lsn(), '0/0') END
+""")
+
+
+class ReplicaLagMonitor:
+    """
+    Measure the replica lag, caching the result for a few seconds.
+
+    A single thread measures at a time, outside the lock: the other requests
+    keep using the previous result instead of waiting for a slow replica.
+    """
+
+    def __init__(self, max_lag_seconds: float, check_interval: float):
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self._healthy = False
+        self._checked_at: Optional[float] = None
+        self._measuring = False
+        self._lock = threading.Lock()
+
+    def measure_lag(self, engine: Engine) -> Optional[float]:
+        """Return the replay lag in seconds, or None if the replica is unreachable or no longer receives WAL."""
+        try:
+            with engine.connect() as connection:
+                lag = connection.execute(REPLICA_LAG_QUERY, {"receiver_timeout": REPLICA_RECEIVER_TIMEOUT}).scalar()
+        except Exception as e:
+            print(f"Réplica injoignable, lecture sur le primaire: {e}")
+            return None
+        if lag is None:
+            print("Le réplica ne reçoit plus de WAL du primaire, lecture sur le primaire")
+            return None
+        return float(lag)
+
+    def is_healthy(self, engine: Engine) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            fresh = self._checked_at is not None and now - self._checked_at < self.check_interval
+            if fresh or self._measuring:
+                return self._healthy
+            self._measuring = True
+        try:
+            lag = self.measure_lag(engine)
+        finally:
+            with self._lock:
+                self._healthy = lag is not None and lag <= self.max_lag_seconds
+                self._checked_at = time.monotonic()
+                self._measuring = False
+        return self._healthy
+
+
+class ReplayPosition:
+    """
+    Highest WAL position the replica is known to have replayed (it only
+    grows), so that most reads do not have to ask the replica again.
+    """
+
+    def __init__(self):
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def has_replayed(self, engine: Engine, lsn: int) -> bool:
+        with self._lock:
+            if self._position >= lsn:
+                return True
+        with engine.connect() as connection:
+            position = connection.execute(REPLAY_POSITION_QUERY).scalar()
+        if position is None:
+            return True
+        with self._lock:
+            self._position = max(self._position, int(position))
+            return self._position >= lsn
+
+
+replica_lag_monitor = ReplicaLagMonitor(REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_INTERVAL)
+replay_position = ReplayPosition()
+
+
+def record_write(db: Session, file_name: str) -> None:
+    """
+    Signal that a file has just been written to the primary. To be called
+    once the write is committed (the stored position must include it);
+    commits the marks.
+    """
+    if not DB_REPLICA_HOST:
+        return
+    try:
+        db.execute(RECORD_WRITE_QUERY, {"names": [file_name, ALL_FILES]})
+        db.commit()
+    except Exception as e:
+        # Sans repère, seule la mesure du retard protège les lectures de ce fichier
+        db.rollback()
+        print(f"Position d'écriture non enregistrée pour {file_name}: {e}")
+
+
+def should_read_from_replica(primary: Engine, replica: Optional[Engine], file_name: Optional[str] = None) -> bool:
+    """
+    Decide whether a read-only query may be routed to the replica: it must
+    be healthy and have replayed the last write of the requested file (of
+    any file without a file filter).
+    """
+    if replica is None:
+        return False
+    if not replica_lag_monitor.is_healthy(replica):
+        return False
+    key = file_name if file_name and file_name != "all" else ALL_FILES
+    try:
+        with primary.connect() as connection:
+            lsn = connection.execute(WRITE_MARK_QUERY, {"file_name": key}).scalar()
+        return lsn is None or replay_position.has_replayed(replica, int(lsn))
+    except Exception as e:
+        print(f"Position de réplication inconnue, lecture sur le primaire: {e}")
+        return False
@@ -0,0 +1,178 @@
+"""
+Representative samples of a filtered subset of file_data.
+
+- Small subsets (planner estimate up to SAMPLE_EXACT_THRESHOLD rows) and
+  selective filters (less than SAMPLE_INDEX_SELECTIVITY of the table) are
+  sampled exactly: the ids of the subset, read through the indexes of the
+  filter when there are some, are streamed in id order through a seeded
+  reservoir (Algorithm R).
+- Large subsets read only a fraction of the rows with TABLESAMPLE BERNOULLI,
+  sized from the estimate with some oversampling, then reduced to the
+  requested size. BERNOULLI draws row by row: the rows of a file are stored
+  in contiguous pages, so SYSTEM (whole pages, on request only) would return
+  clusters of a few files. The seed is passed to REPEATABLE so that a sample
+  can be reproduced as long as the table does not change. When too few rows
+  are obtained the percent is doubled; once it would reach 100% the exact
+  reservoir is used instead, which streams the ids rather than loading
+  them all.
+"""
+
+import json
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.utils.settings import SAMPLE_EXACT_THRESHOLD, SAMPLE_INDEX_SELECTIVITY
+
+SAMPLING_METHODS = ("auto", "system", "bernoulli", "reservoir")
+
+# Part de lignes lues en plus de la taille demandée (le filtre et le
+# hasard des pages réduisent le nombre de lignes obtenues)
+OVERSAMPLING = 3.0
+# Tentatives avec un pourcentage doublé avant de basculer sur un échantillonnage exact
+MAX_SAMPLING_ATTEMPTS = 3
+# Lignes lues par lot lors d'un échantillonnage exact
+RESERVOIR_BATCH_SIZE = 10_000
+
+
+def reservoir_sample(values: Iterable[Any], size: int, rng: random.Random) -> Tuple[List[Any], int]:
+    """
+    Uniform sample of `size` values of a stream read once (Algorithm R).
+
+    Returns:
+        Tuple[List[Any], int]: The sample and the number of values read
+    """
+    reservoir: List[Any] = []
+    count = 0
+    for count, value in enumerate(values, start=1):
+        if count <= size:
+            reservoir.append(value)
+        else:
+            position = rng.randrange(count)
+            if position < size:
+                reservoir[position] = value
+    return reservoir, count
+
+
+def estimate_rows(db: Session, where_sql: str, params: Dict[str, Any]) -> int:
+    """
+    Planner estimate of the number of rows matching the filters (no scan).
+    """
+    plan = db.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT id FROM file_data WHERE {where_sql}"), params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def table_rows(db: Session) -> int:
+    """
+    Planner estimate of the number of rows of file_data (0 when unknown,
+    e.g. before the first ANALYZE).
+    """
+    rows = db.execute(text("SELECT reltuples FROM pg_class WHERE oid = 'file_data'::regclass")).scalar()
+    return max(int(rows or 0), 0)
+
+
+def choose_method(estimate: int, total: int) -> str:
+    """
+    Method used by method=auto for a subset of `estimate` rows out of `total`.
+    """
+    if estimate <= SAMPLE_EXACT_THRESHOLD:
+        return "reservoir"
+    if total > 0 and estimate / total < SAMPLE_INDEX_SELECTIVITY:
+        return "reservoir"
+    return "bernoulli"
+
+
+def _sample_exact(db: Session, where_sql: str, params: Dict[str, Any], size: int, rng: random.Random):
+    ids = db.execute(
+        text(f"SELECT id FROM file_data WHERE {where_sql} ORDER BY id").execution_options(
+            stream_results=True, yield_per=RESERVOIR_BATCH_SIZE
+        ),
+        params
+    ).scalars()
+    return reservoir_sample(ids, size, rng)
+
+
+def _sample_pages(db: Session, where_sql: str, params: Dict[str, Any], method: str,
+                  percent: float, seed: int) -> List[int]:
+    return db.execute(
+        text(
+            f"SELECT id FROM file_data TABLESAMPLE {method.upper()} (:percent) REPEATABLE (:seed) "
+            f"WHERE {where_sql} ORDER BY id"
+        ),
+        {**params, "percent": percent, "seed": seed}
+    ).scalars().all()
+
+
+def sample_ids(
+    db: Session,
+    where_sql: str,
+    params: Dict[str, Any],
+    size: int,
+    method: str = "auto",
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Pick the ids of a sample of the rows matching the filters.
+
+    Args:
+        db: Session to query
+        where_sql: Condition built by build_filter_sql()
+        params: Parameters of the condition
+        size: Number of rows wanted
+        method: auto, system, bernoulli or reservoir
+        seed: Seed of the sample (a random one is drawn when missing)
+
+    Returns:
+        Dict[str, Any]: ids (sorted), method actually used, seed, sampling
+        percent (TABLESAMPLE), population (exact for a reservoir, estimated
+        otherwise) and whether the population is exact
+    """
+    seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 31)
+    rng = random.Random(seed)
+    estimate = estimate_rows(db, where_sql, params)
+
+    if method == "auto":
+        method = choose_method(estimate, table_rows(db))
+
+    if method != "reservoir":
+        # Part de la table à lire pour obtenir environ `size` lignes filtrées
+        percent = 100.0 * OVERSAMPLING * size / max(estimate, 1)
+        if method == "system":
+            # SYSTEM tire des pages entières: lire au moins une page par ligne
+            # demandée pour que l'échantillon ne vienne pas de quelques pages
+            pages = db.execute(text("SELECT relpages FROM pg_class WHERE oid = 'file_data'::regclass")).scalar()
+            percent = max(percent, 100.0 * size / max(pages or 1, 1))
+        for _ in range(MAX_SAMPLING_ATTEMPTS):
+            if percent >= 100.0:
+                # Toute la table serait lue et ses ids chargés en mémoire:
+                # le réservoir la parcourt en flux
+                break
+            ids = _sample_pages(db, where_sql, params, method, percent, seed)
+            if len(ids) >= size:
+                return {
+                    "ids": sorted(rng.sample(ids, size)) if len(ids) > size else ids,
+                    "method": method,
+                    "seed": seed,
+                    "percent": percent,
+                    "population": estimate,
+                    "population_exact": False,
+                }
+            percent *= 2
+        # Estimation trop optimiste (ou table entière à lire): échantillonnage exact
+        method = "reservoir"
+
+    ids, population = _sample_exact(db, where_sql, params, size, rng)
+    return {
+        "ids": sorted(ids),
+        "method": method,
+        "seed": seed,
+        "percent": None,
+        "population": population,
+        "population_exact": True,
+    }
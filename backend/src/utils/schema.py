@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date as date_type, datetime
 from pydantic import BaseModel, Field
 
 
@@ -74,4 +74,92 @@ class PaginatedResponse(BaseModel):
     items: List[FileDataResponse]
     total: int
     page: int
-    pages: int
\ No newline at end of file
+    pages: int
+
+# Schémas pour le profilage des requêtes lentes
+
+class SlowQueryEntry(BaseModel):
+    recorded_at: datetime
+    duration_ms: float
+    statement: str
+    parameters: Optional[Any] = None
+    executemany: bool = False
+    plan: Optional[Any] = None
+
+
+class SlowQueryReport(BaseModel):
+    enabled: bool
+    threshold_ms: float
+    explain_sample_rate: float
+    buffer_size: int
+    entries: List[SlowQueryEntry]
+
+
+# Schéma pour les rapports de qualité des imports
+class ImportQualityReport(BaseModel):
+    id: int
+    file_name: str
+    created_at: Optional[datetime] = None
+    total_rows: int
+    invalid_rows: int
+    report: Dict[str, Any]
+
+    class Config:
+        orm_mode = True
+
+
+# Schémas pour l'historique des références
+class ReferenceTransitionPoint(BaseModel):
+    sequence: int
+    date: Optional[date_type] = None
+    initial: bool
+    etat_from: Optional[str] = None
+    etat_to: Optional[str] = None
+    file_name: Optional[str] = None
+    file_data_id: int
+    creation: Optional[str] = None
+    mise_a_jour: Optional[str] = None
+
+
+class ReferenceTimeline(BaseModel):
+    reference: str
+    transitions: List[ReferenceTransitionPoint]
+
+
+class TransitionMatrix(BaseModel):
+    states: List[str]
+    matrix: List[List[int]]  # matrix[i][j]: passages de states[i] à states[j]
+    initial: List[int]  # Premières observations dans chaque état
+    total_transitions: int
+
+
+# Schéma pour les échantillons de données
+class SampleResponse(BaseModel):
+    items: List[FileDataResponse]
+    size: int
+    method: str  # reservoir, system ou bernoulli
+    seed: int  # À réutiliser pour obtenir le même échantillon
+    sampling_percent: Optional[float] = None  # Part de la table lue (TABLESAMPLE)
+    population: int  # Lignes correspondant aux filtres
+    population_exact: bool  # False: estimation du planificateur
+
+
+# Schéma du tableau de bord (plusieurs widgets calculés sur un seul parcours filtré)
+class DashboardResponse(BaseModel):
+    stats: Optional[Dict[str, Any]] = None  # Présent si le widget "stats" est demandé
+    aggregate: Dict[str, List[AggregatedDataPoint]] = {}  # Par regroupement (jour, semaine, mois, annee)
+    distribution: Dict[str, List[DistributionDataPoint]] = {}  # Par champ
+
+
+# Schéma du tableau croisé (matrice dense)
+class PivotResponse(BaseModel):
+    row_dimension: str
+    column_dimension: str
+    rows: List[str]  # Libellés des lignes ("Autres" en dernier si rows_other)
+    columns: List[str]  # Libellés des colonnes ("Autres" en dernier si columns_other)
+    values: List[List[int]]  # values[i][j]: lignes ayant rows[i] et columns[j]
+    row_totals: List[int]
+    column_totals: List[int]
+    total: int
+    rows_other: bool  # Les lignes au-delà de rows_limit sont regroupées
+    columns_other: bool  # Les colonnes au-delà de columns_limit sont regroupées
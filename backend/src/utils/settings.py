@@ -1,6 +1,154 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean flag from the environment ("1", "true", "yes", "on").
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_optional_int(name: str):
+    """
+    Read an optional integer from the environment (None when unset or empty).
+    """
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def env_int_mapping(name: str, default: str = "") -> dict:
+    """
+    Read "key=value" integer pairs separated by commas (e.g. "export=2,stats=8").
+    """
+    mapping = {}
+    for item in os.getenv(name, default).split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            mapping[key.strip()] = int(value)
+    return mapping
+
+
 # Allow requests from the frontend
 ORIGINS = [
     "http://localhost:3000",
     "http://localhost:3000/api",
     "localhost:3000/api",
-]
\ No newline at end of file
+]
+
+# Token required by the /api/admin endpoints (X-Admin-Token header). They expose
+# the bound parameters of slow queries, so they are only mounted when it is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Slow query profiling (opt-in). A sampled slow query is executed a second
+# time with EXPLAIN ANALYZE, synchronously within its request: it roughly
+# doubles the duration of that request.
+SLOW_QUERY_PROFILING = env_bool("SLOW_QUERY_PROFILING")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+
+# Database connection retries (exponential backoff, in seconds)
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "5"))
+DB_CONNECT_BACKOFF = float(os.getenv("DB_CONNECT_BACKOFF", "0.5"))
+DB_CONNECT_BACKOFF_MAX = float(os.getenv("DB_CONNECT_BACKOFF_MAX", "10"))
+
+# Server mode: "development" (single process with reload) or "production"
+SERVER_MODE = os.getenv("SERVER_MODE", "development").strip().lower()
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Production tuning (number of workers: 0 = one per available CPU)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "75"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_LIMIT_CONCURRENCY = env_optional_int("SERVER_LIMIT_CONCURRENCY")
+SERVER_LIMIT_MAX_REQUESTS = env_optional_int("SERVER_LIMIT_MAX_REQUESTS")
+SERVER_ACCESS_LOG = env_bool("SERVER_ACCESS_LOG", True)
+
+# Database connection pool (production mode only; development uses no pooling).
+# DB_MAX_CONNECTIONS is shared between all workers unless DB_POOL_SIZE is set.
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+DB_POOL_SIZE = env_optional_int("DB_POOL_SIZE")
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "0"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Read replica for the analytics routes (disabled when DB_REPLICA_HOST is empty).
+# The replica uses the same credentials and database name as the primary.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", "")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "5"))
+# The replica counts as stale when its WAL receiver got nothing from the
+# primary for this long (the primary sends keepalives every
+# wal_sender_timeout / 2, 30 s by default)
+REPLICA_RECEIVER_TIMEOUT = float(os.getenv("REPLICA_RECEIVER_TIMEOUT", "90"))
+# Connection timeout to the replica (seconds), so a hung replica cannot block reads
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "3"))
+
+# Analytics backend of /aggregate, /distribution and /stats: "postgres" or
+# "duckdb" (columnar Parquet snapshot queried with DuckDB, requires the
+# "analytics" extras). The snapshot directory is shared by all workers.
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "postgres").strip().lower()
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "analytics_snapshot")
+ANALYTICS_SNAPSHOT_BATCH_SIZE = int(os.getenv("ANALYTICS_SNAPSHOT_BATCH_SIZE", "500000"))
+ANALYTICS_THREADS = env_optional_int("ANALYTICS_THREADS")
+# Interval (seconds) between two checks of the per-file signatures (row count,
+# last id) of the snapshot against PostgreSQL. A file that differs (e.g. a worker
+# crashed between its commit and the snapshot append) is answered from
+# PostgreSQL until it is exported again.
+ANALYTICS_VERIFY_INTERVAL = float(os.getenv("ANALYTICS_VERIFY_INTERVAL", "30"))
+
+# Change events pushed to the WebSocket clients after imports and deletions.
+# Events go through PostgreSQL NOTIFY on this channel so that every worker
+# receives them.
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "file_data_events")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_MAX_PERIODS = int(os.getenv("EVENTS_MAX_PERIODS", "120"))
+
+# Admission control of the heavy routes (per worker). A request waits at most
+# ADMISSION_QUEUE_TIMEOUT seconds for a slot, then gets a 503 with Retry-After.
+# A limit of 0 disables the limit of the route.
+ADMISSION_LIMITS = env_int_mapping(
+    "ADMISSION_LIMITS", "list=16,import=4,aggregate=4,distribution=8,stats=8,export=2,history=8,sample=8,dashboard=4,pivot=4"
+)
+# All the admitted routes of a worker also share a total limit, so that admitted
+# requests never wait for a pooled connection (and fail with a pool timeout):
+# by default the connections of the worker's pool (pool size plus overflow)
+# minus ADMISSION_RESERVED_CONNECTIONS kept for the other routes; no total limit
+# without a pool (development). ADMISSION_TOTAL_LIMIT overrides it (0 = none).
+ADMISSION_TOTAL_LIMIT = env_optional_int("ADMISSION_TOTAL_LIMIT")
+ADMISSION_RESERVED_CONNECTIONS = int(os.getenv("ADMISSION_RESERVED_CONNECTIONS", "2"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+# statement_timeout of the routes (milliseconds, 0 = no timeout), with per-route overrides
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "30000"))
+STATEMENT_TIMEOUTS = env_int_mapping("STATEMENT_TIMEOUTS", "import=120000,export=300000")
+
+# Pre-flight EXPLAIN of the analytics queries (disabled when 0). Above this
+# planner cost, /aggregate, /distribution and /stats answer 429 and /export
+# switches to a streamed response.
+QUERY_COST_LIMIT = float(os.getenv("QUERY_COST_LIMIT", "0"))
+
+# /sample: largest sample returned, and planner estimate of the filtered rows
+# up to which the sample is exact (reservoir over the ids) rather than TABLESAMPLE
+SAMPLE_MAX_SIZE = int(os.getenv("SAMPLE_MAX_SIZE", "1000"))
+SAMPLE_EXACT_THRESHOLD = int(os.getenv("SAMPLE_EXACT_THRESHOLD", "50000"))
+# Filters keeping less than this fraction of the table are sampled exactly too:
+# their ids are read through the indexes of the filter, whereas TABLESAMPLE
+# would read the whole table for few matching rows
+SAMPLE_INDEX_SELECTIVITY = float(os.getenv("SAMPLE_INDEX_SELECTIVITY", "0.1"))
+
+# /dashboard: largest number of widgets computed from one filtered scan
+DASHBOARD_MAX_WIDGETS = int(os.getenv("DASHBOARD_MAX_WIDGETS", "20"))
+
+# /pivot: largest dense matrix returned (rows x columns, "other" buckets included)
+PIVOT_MAX_CELLS = int(os.getenv("PIVOT_MAX_CELLS", "100000"))
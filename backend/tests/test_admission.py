@@ -0,0 +1,136 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from src.utils import admission
+from src.utils.admission import RouteLimiter
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_limiter_times_out_with_503():
+    async def scenario():
+        limiter = RouteLimiter("export", 1, 0.05)
+        ticket = await limiter.acquire()
+        with pytest.raises(HTTPException) as error:
+            await limiter.acquire()
+        ticket.release()
+        return error.value
+
+    error = run(scenario())
+    assert error.status_code == 503
+    assert "export" in error.detail
+    assert error.headers == admission.retry_headers()
+
+
+def test_released_slot_admits_a_waiting_request():
+    async def scenario():
+        limiter = RouteLimiter("list", 1, 1.0)
+        ticket = await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        ticket.release()
+        ticket.release()  # Sans effet: la place n'est rendue qu'une fois
+        second = await waiting
+        second.release()
+        return limiter._semaphore._value
+
+    assert run(scenario()) == 1
+
+
+def test_total_limit_is_shared_between_routes():
+    async def scenario():
+        total = asyncio.Semaphore(1)
+        stats = RouteLimiter("stats", 4, 0.05, total)
+        pivot = RouteLimiter("pivot", 4, 0.05, total)
+        ticket = await stats.acquire()
+        with pytest.raises(HTTPException):
+            await pivot.acquire()
+        # La place de la route obtenue avant l'échec est rendue
+        assert pivot._semaphore._value == 4
+        ticket.release()
+        (await pivot.acquire()).release()
+        return total._value
+
+    assert run(scenario()) == 1
+
+
+def test_release_from_another_thread():
+    async def scenario():
+        limiter = RouteLimiter("import", 1, 1.0)
+        ticket = await limiter.acquire()
+        thread = threading.Thread(target=ticket.release)
+        thread.start()
+        thread.join()
+        (await limiter.acquire()).release()
+
+    run(scenario())
+
+
+def test_unlimited_route():
+    async def scenario():
+        limiter = RouteLimiter("files", 0, 0.01)
+        return [await limiter.acquire() for _ in range(3)]
+
+    assert all(ticket.statement_timeout_ms >= 0 for ticket in run(scenario()))
+
+
+def test_total_limit_follows_the_pool(monkeypatch):
+    from src.utils import database
+
+    monkeypatch.setattr(admission, "ADMISSION_TOTAL_LIMIT", None)
+    monkeypatch.setattr(admission, "ADMISSION_RESERVED_CONNECTIONS", 2)
+    monkeypatch.setattr(database, "get_pool_options", lambda: {"pool_size": 10, "max_overflow": 2})
+    assert admission.total_admission_limit() == 10
+
+    monkeypatch.setattr(database, "get_pool_options", lambda: {"pool_size": 2, "max_overflow": 0})
+    assert admission.total_admission_limit() == 1
+
+    monkeypatch.setattr(database, "get_pool_options", lambda: {"poolclass": object})
+    assert admission.total_admission_limit() == 0
+
+    monkeypatch.setattr(admission, "ADMISSION_TOTAL_LIMIT", 7)
+    assert admission.total_admission_limit() == 7
+
+
+def stream_response(send):
+    """Envoyer une AdmittedStreamingResponse avec `send`: sa place doit être rendue (sinon 503)."""
+    async def scenario():
+        limiter = RouteLimiter("export", 1, 0.05)
+        ticket = await limiter.acquire()
+        ticket.detach()
+        response = admission.AdmittedStreamingResponse(iter(["[", "]"]), ticket, media_type="application/json")
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        try:
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        except ClientDisconnect:
+            pass
+        (await limiter.acquire()).release()
+
+    run(scenario())
+
+
+def test_streamed_response_releases_its_slot():
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    stream_response(send)
+    assert b"".join(message.get("body", b"") for message in messages) == b"[]"
+
+
+def test_streamed_response_releases_its_slot_when_the_client_is_gone():
+    async def send(message):
+        raise OSError("client déconnecté")
+
+    stream_response(send)
@@ -0,0 +1,176 @@
+import datetime
+import time
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from sqlalchemy import text
+
+from src.utils.analytics import READY_MARKER, SNAPSHOT_COLUMN_NAMES, AnalyticsSnapshot
+from src.utils.filters import build_filter_sql
+from src.utils.queries import STATS_COLUMNS, aggregate_ctes, distribution_select, stats_select, with_ctes
+
+FILE_NAME = "test_parite.csv"
+
+ROWS = [
+    # reference, etat, source, creation, creation_date
+    ("P1", "Ouvert", "scan", "01/02/2024", datetime.date(2024, 2, 1)),
+    ("P2", "Clos", "scan", "15/02/2024", datetime.date(2024, 2, 15)),
+    ("P3", "Ouvert", None, "03/03/2024", datetime.date(2024, 3, 3)),
+    ("P1", "Clos", "manuel", "2024-03-20", datetime.date(2024, 3, 20)),
+    ("P4", None, "manuel", None, None),
+    ("P5", "Ouvert", "scan", "01/01/2023", datetime.date(2023, 1, 1)),
+    ("P6", "En cours", "scan", "02/01/2023", datetime.date(2023, 1, 2)),
+]
+
+
+def ready_snapshot(directory, timezone="UTC"):
+    snapshot = AnalyticsSnapshot(str(directory), "duckdb", 3, verify_interval=3600)
+    snapshot._timezone = timezone
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / READY_MARKER).touch()
+    snapshot._mark_verified(set())
+    return snapshot
+
+
+def write_fixture(snapshot, file_name=FILE_NAME):
+    columns = {name: [] for name in SNAPSHOT_COLUMN_NAMES}
+    for index, (reference, etat, source, creation, creation_date) in enumerate(ROWS, start=1):
+        row = dict.fromkeys(SNAPSHOT_COLUMN_NAMES)
+        row.update(id=index, reference=reference, etat=etat, source=source, creation=creation,
+                   creation_date=creation_date, file_name=file_name)
+        for name in SNAPSHOT_COLUMN_NAMES:
+            columns[name].append(row[name])
+    snapshot._write_part(snapshot._file_dir(file_name), snapshot._table(columns))
+
+
+def test_snapshot_queries(tmp_path):
+    snapshot = ready_snapshot(tmp_path / "snapshot")
+    write_fixture(snapshot)
+
+    assert snapshot.stats() == (7, 1, "2024-03-20", 2)
+    assert sorted(snapshot.distribution("etat"), key=str) == sorted(
+        [("Ouvert", 3), ("Clos", 2), ("En cours", 1), (None, 1)], key=str
+    )
+    aggregated = snapshot.aggregate("mois", search="ouv")
+    assert [(period, count) for period, count, _ in aggregated] == [("2023-01", 1), ("2024-02", 1), ("2024-03", 1)]
+    assert aggregated[1][2] == [
+        {"id": 1, "reference": "P1", "etat": "Ouvert", "creation": "01/02/2024", "file_name": FILE_NAME}
+    ]
+    assert snapshot.stats(file_name="absent.csv") == (0, 0, None, 0)
+
+
+def test_stale_files_are_answered_from_postgres(tmp_path):
+    snapshot = ready_snapshot(tmp_path / "snapshot")
+    write_fixture(snapshot)
+    write_fixture(snapshot, "autre.csv")
+
+    snapshot._mark_verified({"autre.csv"})
+
+    # Le fichier désynchronisé et les requêtes sur tous les fichiers passent par PostgreSQL
+    assert snapshot.stats(file_name="autre.csv") is None
+    assert snapshot.stats() is None
+    assert snapshot.stats(file_name=FILE_NAME)[0] == 7
+
+
+def test_verify_detects_drift(tmp_path, monkeypatch):
+    snapshot = ready_snapshot(tmp_path / "snapshot")
+    write_fixture(snapshot)
+    repaired = []
+    monkeypatch.setattr(snapshot, "repair", repaired.append)
+
+    class Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+    from src.utils import database
+    monkeypatch.setattr(database, "get_engine", lambda: type("Engine", (), {"connect": lambda self: Connection()})())
+
+    # Une ligne validée dans PostgreSQL sans avoir été ajoutée à l'instantané
+    monkeypatch.setattr(snapshot, "_database_signatures", lambda connection: {FILE_NAME: (8, 8), "new.csv": (1, 9)})
+    assert snapshot.verify() == {FILE_NAME, "new.csv"}
+    assert not snapshot.is_consistent(FILE_NAME)
+    assert not snapshot.is_consistent(None)
+
+    monkeypatch.setattr(snapshot, "_database_signatures", lambda connection: {FILE_NAME: (7, 7)})
+    assert snapshot.verify() == set()
+    assert snapshot.is_consistent(None)
+    # Seule la première vérification a demandé un réexport (dans un thread)
+    for _ in range(100):
+        if repaired:
+            break
+        time.sleep(0.01)
+    assert [sorted(files) for files in repaired] == [sorted([FILE_NAME, "new.csv"])]
+
+
+@pytest.fixture
+def database_connection():
+    from src.utils.database import get_engine
+
+    try:
+        connection = get_engine().connect()
+        connection.execute(text("SELECT 1 FROM file_data LIMIT 1"))
+    except Exception as e:
+        pytest.skip(f"Base de données indisponible: {e}")
+    # Les lignes de test ne sont jamais validées
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def insert_fixture(connection):
+    codes = {}
+    for column, value in {(c, v) for _, e, s, _, _ in ROWS for c, v in (("etat", e), ("source", s)) if v}:
+        connection.execute(
+            text(f"INSERT INTO dict_{column} (value) VALUES (:value) ON CONFLICT (value) DO NOTHING"), {"value": value}
+        )
+        codes[(column, value)] = connection.execute(
+            text(f"SELECT id FROM dict_{column} WHERE value = :value"), {"value": value}
+        ).scalar()
+    for reference, etat, source, creation, creation_date in ROWS:
+        connection.execute(
+            text(
+                "INSERT INTO file_data (reference, etat_id, source_id, creation, creation_date, file_name, import_date) "
+                "VALUES (:reference, :etat_id, :source_id, :creation, :creation_date, :file_name, now())"
+            ),
+            {
+                "reference": reference,
+                "etat_id": codes.get(("etat", etat)),
+                "source_id": codes.get(("source", source)),
+                "creation": creation,
+                "creation_date": creation_date,
+                "file_name": FILE_NAME,
+            }
+        )
+
+
+@pytest.mark.parametrize("search", [None, "ouv", "P1"])
+def test_snapshot_matches_postgres(tmp_path, database_connection, search):
+    connection = database_connection
+    insert_fixture(connection)
+    timezone = connection.execute(text("SHOW TimeZone")).scalar()
+    snapshot = ready_snapshot(tmp_path / "snapshot", timezone)
+    snapshot._export_file(connection, FILE_NAME)
+
+    where_sql, params = build_filter_sql(search, FILE_NAME)
+
+    for group_by in ["jour", "semaine", "mois", "annee"]:
+        expected = connection.execute(text(with_ctes(*aggregate_ctes(group_by, "file_data", where_sql))), params).fetchall()
+        assert snapshot.aggregate(group_by, search, FILE_NAME) == [tuple(row) for row in expected]
+
+    for field in ["etat", "source", "reference", "creation"]:
+        expected = connection.execute(text(distribution_select(field, "file_data", where_sql)), params).fetchall()
+        assert sorted(snapshot.distribution(field, search, FILE_NAME), key=str) == sorted(map(tuple, expected), key=str)
+
+    expected = connection.execute(text(
+        f"WITH filtered_data AS (SELECT {', '.join(STATS_COLUMNS)} FROM file_data WHERE {where_sql}) "
+        + stats_select("filtered_data")
+    ), params).fetchone()
+    assert snapshot.stats(search, FILE_NAME) == tuple(expected)
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+
+from src.app.routes import file_data
+from src.app.routes.file_data import parse_widgets
+
+
+def test_parse_widgets():
+    widgets = parse_widgets(["stats", "aggregate:mois", "distribution:etat", "distribution:file_name"])
+
+    assert widgets == [
+        ("stats", ""),
+        ("aggregate", "mois"),
+        ("distribution", "etat"),
+        ("distribution", "file_name"),
+    ]
+
+
+def test_parse_widgets_removes_duplicates():
+    widgets = parse_widgets(["distribution:etat", "stats", "distribution:etat", "stats"])
+
+    assert widgets == [("distribution", "etat"), ("stats", "")]
+
+
+@pytest.mark.parametrize("widget", [
+    "inconnu",
+    "stats:mois",
+    "aggregate",
+    "aggregate:trimestre",
+    "distribution:",
+    "distribution:id",
+    "distribution:etat;DROP TABLE file_data",
+])
+def test_parse_widgets_rejects_invalid_widget(widget):
+    with pytest.raises(HTTPException) as error:
+        parse_widgets([widget])
+
+    assert error.value.status_code == 400
+    assert widget in error.value.detail
+
+
+def test_parse_widgets_limits_count(monkeypatch):
+    monkeypatch.setattr(file_data, "DASHBOARD_MAX_WIDGETS", 2)
+
+    # Les doublons ne comptent pas dans la limite
+    assert len(parse_widgets(["stats", "aggregate:mois", "stats", "aggregate:mois"])) == 2
+
+    with pytest.raises(HTTPException) as error:
+        parse_widgets(["stats", "aggregate:mois", "distribution:etat"])
+    assert error.value.status_code == 400
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+
+from src.utils.dictionary import DictionaryCache, encode_rows
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDictionary:
+    """Table dict_<colonne> en mémoire, avec la contrainte unique sur value."""
+
+    def __init__(self, values=()):
+        self.values = {value: code for code, value in enumerate(values, start=1)}
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if sql.startswith("INSERT"):
+            for value in params["values"]:
+                self.values.setdefault(value, len(self.values) + 1)
+            return FakeResult([])
+        if "ANY(:values)" in sql:
+            return FakeResult([(value, self.values[value]) for value in params["values"] if value in self.values])
+        return FakeResult(list(self.values.items()))
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+
+def test_encode_creates_missing_values_once():
+    table = FakeDictionary(["En cours"])
+    cache = DictionaryCache(["etat"])
+
+    assert cache.encode(table, "etat", ["En cours", None, "Clos", "En cours"]) == {"En cours": 1, "Clos": 2}
+    queries = len(table.statements)
+    # Valeurs en cache: aucune requête
+    assert cache.encode(table, "etat", ["Clos"]) == {"Clos": 2}
+    assert len(table.statements) == queries
+
+
+def test_encode_matches_exactly():
+    table = FakeDictionary(["En cours"])
+    cache = DictionaryCache(["etat"])
+
+    codes = cache.encode(table, "etat", ["EN COURS"])
+
+    assert codes == {"EN COURS": 2}
+    assert cache.decode("etat", 2) == "EN COURS"
+    assert cache.decode("etat", 1, bind=table) == "En cours"
+
+
+def test_decode_reloads_on_cache_miss():
+    table = FakeDictionary(["En cours", "Clos"])
+    cache = DictionaryCache(["etat"])
+
+    assert cache.decode("etat", None) is None
+    assert cache.decode("etat", 2, bind=table) == "Clos"
+    queries = len(table.statements)
+    assert cache.decode("etat", 1, bind=table) == "En cours"
+    assert len(table.statements) == queries
+    # Code inconnu même après rechargement
+    assert cache.decode("etat", 99, bind=table) is None
+
+
+def test_clear_forgets_codes():
+    table = FakeDictionary(["En cours"])
+    cache = DictionaryCache(["etat"])
+    cache.encode(table, "etat", ["En cours"])
+    cache.clear()
+
+    assert cache.decode("etat", 1, bind=table) == "En cours"
+
+
+def test_encode_rows(monkeypatch):
+    from src.utils import dictionary
+
+    table = FakeDictionary()
+    monkeypatch.setattr(dictionary, "dictionary_cache", DictionaryCache(dictionary.DICTIONARY_COLUMNS))
+
+    rows = encode_rows(table, [{"reference": "R1", "etat": "Clos", "source": None}])
+
+    assert rows[0]["reference"] == "R1"
+    assert rows[0]["etat_id"] == 1
+    assert rows[0]["source_id"] is None
+    assert "etat" not in rows[0]
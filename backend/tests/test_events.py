@@ -0,0 +1,122 @@
+import asyncio
+import json
+from datetime import date
+
+from src.app.routes.events import stream_events
+from src.utils import events
+from src.utils.events import ChangeEventBroker, periods_of_dates, publish_event
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeWebSocket:
+    """WebSocket dont le client envoie `frames` (le dernier reste en attente), puis attend indéfiniment."""
+
+    def __init__(self, frames, on_connected=None):
+        self.frames = list(frames)
+        self.on_connected = on_connected
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.sent.append(data)
+        if data["type"] == "connected" and self.on_connected:
+            self.on_connected()
+
+    async def receive(self):
+        if not self.frames:
+            await asyncio.sleep(3600)
+        delay, frame = self.frames.pop(0)
+        await asyncio.sleep(delay)
+        return frame
+
+
+def publish(broker, event):
+    for queue, _ in list(broker._subscribers):
+        queue.put_nowait(event)
+
+
+def test_stream_ignores_client_frames_and_ends_on_disconnect(monkeypatch):
+    broker = ChangeEventBroker("test", 8)
+    monkeypatch.setattr("src.app.routes.events.event_broker", broker)
+    websocket = FakeWebSocket([
+        (0, {"type": "websocket.receive", "bytes": b"\x00"}),
+        (0, {"type": "websocket.receive", "text": "ping"}),
+        (0.05, {"type": "websocket.disconnect", "code": 1000}),
+    ], on_connected=lambda: publish(broker, {"type": "file_added"}))
+
+    run(stream_events(websocket))
+
+    # Les messages du client sont ignorés, l'événement prêt en même temps est envoyé
+    assert websocket.sent == [{"type": "connected"}, {"type": "file_added"}]
+    assert broker.subscriber_count == 0
+
+
+def test_stream_unsubscribes_when_send_fails(monkeypatch):
+    broker = ChangeEventBroker("test", 8)
+    monkeypatch.setattr("src.app.routes.events.event_broker", broker)
+
+    class ClosedWebSocket(FakeWebSocket):
+        async def send_json(self, data):
+            await super().send_json(data)
+            if data["type"] != "connected":
+                raise RuntimeError("WebSocket fermé")
+
+    websocket = ClosedWebSocket([], on_connected=lambda: publish(broker, {"type": "file_removed"}))
+    run(stream_events(websocket))
+
+    assert broker.subscriber_count == 0
+
+
+def test_slow_client_gets_a_resync():
+    async def scenario():
+        broker = ChangeEventBroker("test", 2)
+        queue = broker.subscribe()
+        for index in range(3):
+            broker.dispatch({"type": "file_added", "index": index})
+        await asyncio.sleep(0)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert run(scenario()) == [{"type": "resync", "reason": "queue_full"}]
+
+
+def test_dispatch_drops_clients_of_closed_loops():
+    broker = ChangeEventBroker("test", 2)
+    loop = asyncio.new_event_loop()
+    broker._subscribers.add((asyncio.Queue(), loop))
+    loop.close()
+
+    broker.dispatch({"type": "file_added"})
+    assert broker.subscriber_count == 0
+
+
+def test_periods_of_dates(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_MAX_PERIODS", 2)
+    periods = periods_of_dates([date(2024, 3, 2), None, date(2023, 12, 1), date(2024, 1, 5)])
+
+    assert periods == {
+        "date_from": "2023-12-01",
+        "date_to": "2024-03-02",
+        "mois": ["2023-12", "2024-01"],
+        "annee": ["2023", "2024"],
+        "truncated": True,
+    }
+
+
+def test_publish_event_drops_months_of_large_payloads():
+    class RecordingSession:
+        def execute(self, statement, params):
+            self.params = params
+
+    db = RecordingSession()
+    months = [f"{year}-{month:02d}" for year in range(1900, 2100) for month in range(1, 13)]
+    publish_event(db, {"type": "file_removed", "periods": {"mois": months, "annee": [], "truncated": False}})
+
+    payload = json.loads(db.params["payload"])
+    assert len(db.params["payload"].encode()) <= events.MAX_PAYLOAD_BYTES
+    assert payload["periods"]["mois"] == []
+    assert payload["periods"]["truncated"]
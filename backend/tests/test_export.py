@@ -0,0 +1,109 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from psycopg2 import errors as pg_errors
+from sqlalchemy.exc import DBAPIError
+
+from src.app.routes import file_data
+from src.app.routes.file_data import stream_export
+
+
+class Statement:
+    def execution_options(self, **options):
+        self.options = options
+        return self
+
+
+class FakeSession:
+    """Session dont le curseur produit `items`, puis lève `error` s'il y en a une."""
+
+    def __init__(self, items, error=None):
+        self.items = items
+        self.error = error
+        self.closed = False
+
+    def scalars(self, statement):
+        yield from self.items
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def item(reference):
+    return SimpleNamespace(
+        **{column: None for column in [
+            "id_lin", "id_ccu", "etat", "creation", "mise_a_jour", "idrh", "device_id", "retour_metier",
+            "commentaires_cloture", "nom_bureau_poste", "regate", "source", "solution_scan", "rg", "ruo",
+            "import_date",
+        ]},
+        reference=reference,
+        file_name="a.csv",
+    )
+
+
+@pytest.fixture
+def session(monkeypatch):
+    sessions = []
+    timeouts = []
+
+    def configure(items, error=None):
+        sessions.append(FakeSession(items, error))
+        return sessions[-1]
+
+    monkeypatch.setattr(file_data, "SessionLocal", lambda bind: sessions[-1])
+    monkeypatch.setattr(file_data, "apply_statement_timeout", lambda db, timeout_ms: timeouts.append(timeout_ms))
+    configure.timeouts = timeouts
+    return configure
+
+
+def export(timeout_ms=1000):
+    statement = Statement()
+    body = "".join(stream_export(statement, bind=None, statement_timeout_ms=timeout_ms))
+    assert statement.options == {"yield_per": file_data.EXPORT_STREAM_BATCH_SIZE}
+    return json.loads(body)
+
+
+def test_stream_export_is_a_json_array(session):
+    db = session([item("R1"), item("R2")])
+
+    rows = export(1500)
+    assert [row["reference"] for row in rows] == ["R1", "R2"]
+    assert rows[0] == file_data.export_row(item("R1"))
+    assert session.timeouts == [1500]
+    assert db.closed
+
+
+def test_stream_export_without_rows(session):
+    session([])
+    assert export() == []
+
+
+def test_stream_export_flags_timeouts(session):
+    canceled = DBAPIError("SELECT", {}, pg_errors.QueryCanceled())
+    db = session([item("R1")], canceled)
+
+    rows = export()
+    # Les en-têtes sont déjà envoyés: le tableau reste valide et se termine par l'erreur
+    assert rows[0]["reference"] == "R1"
+    assert rows[-1] == {"error": "Export interrompu: délai maximal d'exécution dépassé, le résultat est incomplet"}
+    assert db.closed
+
+
+def test_stream_export_flags_errors_before_the_first_row(session):
+    session([], RuntimeError("connexion perdue"))
+
+    assert export() == [{"error": "Export interrompu par une erreur, le résultat est incomplet"}]
+
+
+def test_stream_export_closes_its_session_when_abandoned(session):
+    db = session([item("R1"), item("R2")])
+
+    chunks = stream_export(Statement(), bind=None, statement_timeout_ms=0)
+    assert next(chunks) == "["
+    next(chunks)
+    # Client parti en cours de flux
+    chunks.close()
+    assert db.closed
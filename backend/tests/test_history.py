@@ -0,0 +1,48 @@
+from src.utils import history
+from src.utils.history import HISTORY_LOCK_BUCKETS, HISTORY_LOCK_NAMESPACE, refresh_reference_history
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return self
+
+    def fetchall(self):
+        return []
+
+
+def test_refresh_locks_then_recomputes_references():
+    db = RecordingSession()
+    refresh_reference_history(db, ["B", None, "A", "B"])
+
+    (lock, lock_params), (delete, delete_params), (insert, insert_params) = db.statements
+    assert "pg_advisory_xact_lock" in lock
+    assert f"& {HISTORY_LOCK_BUCKETS - 1}" in lock
+    assert "ORDER BY bucket" in lock
+    assert lock_params == {"references": ["A", "B"], "namespace": HISTORY_LOCK_NAMESPACE}
+    assert delete.startswith("DELETE FROM reference_transitions")
+    assert delete_params == {"references": ["A", "B"]}
+    assert "INSERT INTO reference_transitions" in insert
+    assert "AND reference = ANY(:references)" in insert
+    assert "COALESCE(mise_a_jour_date, creation_date, CAST(import_date AS DATE))" in insert
+    assert insert_params == {"references": ["A", "B"]}
+
+
+def test_refresh_without_references_does_nothing():
+    db = RecordingSession()
+    refresh_reference_history(db, [None, None])
+
+    assert db.statements == []
+
+
+def test_lock_buckets_are_a_power_of_two():
+    # Le masque hashtext(reference) & (HISTORY_LOCK_BUCKETS - 1) suppose une puissance de deux
+    assert HISTORY_LOCK_BUCKETS & (HISTORY_LOCK_BUCKETS - 1) == 0
+
+
+def test_rebuild_reads_every_reference():
+    assert "TRUNCATE reference_transitions" in history.REBUILD_HISTORY_SQL
+    assert "ANY(:references)" not in history.REBUILD_HISTORY_SQL
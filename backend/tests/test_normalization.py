@@ -0,0 +1,107 @@
+import datetime
+
+import pandas as pd
+
+from src.utils.normalization import canonicalize, normalize_records, parse_dates
+
+
+def record(**values):
+    base = {"reference": "REF1", "etat": "Ouvert", "creation": "01/02/2024", "file_name": "a.csv"}
+    base.update(values)
+    return base
+
+
+def test_parse_dates_detects_formats():
+    values = pd.Series(["01/02/2024", "2024-02-03T10:00:00", "31/02/2024", "demain", None])
+    parsed, detected = parse_dates(values)
+
+    assert parsed[0] == pd.Timestamp(2024, 2, 1)
+    assert parsed[1] == pd.Timestamp(2024, 2, 3)
+    assert parsed[2:].isna().all()
+    assert detected[:4].tolist() == ["dd/mm/yyyy", "iso", "invalide", "invalide"]
+    assert pd.isna(detected[4])
+
+
+def test_canonicalize_keeps_most_frequent_spelling():
+    values = pd.Series(["En  cours", "en cours", "en cours", "Clos", None])
+    canonical, changed = canonicalize(values)
+
+    assert canonical.tolist() == ["en cours", "en cours", "en cours", "Clos", None]
+    assert changed.tolist() == [True, False, False, False, False]
+
+
+def test_canonicalize_empty_column():
+    values = pd.Series([None, None], dtype=object)
+    canonical, changed = canonicalize(values)
+
+    assert canonical.isna().all()
+    assert not changed.any()
+
+
+def test_normalize_trims_and_parses_dates():
+    frame, report = normalize_records([
+        record(reference="  REF1 ", commentaires_cloture="", mise_a_jour="2024-03-01"),
+    ])
+
+    row = frame.iloc[0]
+    assert row["reference"] == "REF1"
+    assert row["commentaires_cloture"] is None
+    assert row["creation_date"] == datetime.date(2024, 2, 1)
+    assert row["mise_a_jour_date"] == datetime.date(2024, 3, 1)
+    assert report["columns"]["reference"]["trimmed"] == 1
+    assert report["date_formats"]["mise_a_jour"]["iso"] == 1
+    assert report["invalid_rows"] == 0
+
+
+def test_normalize_keeps_empty_rows():
+    frame, report = normalize_records([
+        record(),
+        {"reference": " ", "etat": "", "file_name": "a.csv"},
+        record(reference="REF2"),
+    ])
+
+    # Une ligne par ligne reçue, dans le même ordre
+    assert frame["reference"].tolist() == ["REF1", None, "REF2"]
+    assert report["total_rows"] == 3
+    assert report["empty_rows"] == 1
+    # Une ligne vide n'est pas comptée comme invalide
+    assert report["issues"]["reference_manquante"] == 0
+    assert report["invalid_rows"] == 0
+
+
+def test_normalize_reports_issues():
+    _, report = normalize_records([
+        record(),
+        record(),
+        record(reference=None),
+        record(creation="32/13/2024"),
+        record(mise_a_jour="01/01/2024"),
+    ])
+
+    assert report["issues"]["doublon"] == 1
+    assert report["issues"]["reference_manquante"] == 1
+    assert report["issues"]["creation_invalide"] == 1
+    assert report["issues"]["dates_incoherentes"] == 1
+    assert report["invalid_rows"] == 4
+    assert report["invalid_row_indexes"]["doublon"] == [1]
+
+
+def test_normalize_reports_each_file():
+    frame, report = normalize_records([
+        record(etat="ouvert", file_name="a.csv"),
+        record(reference=None, file_name="a.csv"),
+        record(file_name="b.csv"),
+        record(file_name="b.csv", reference="REF2"),
+        record(file_name="b.csv", reference="REF3"),
+    ])
+
+    assert frame["etat"].tolist() == ["Ouvert"] * 5
+    assert report["file_names"] == ["a.csv", "b.csv"]
+    assert report["total_rows"] == 5
+
+    a, b = report["files"]["a.csv"], report["files"]["b.csv"]
+    assert (a["total_rows"], a["invalid_rows"]) == (2, 1)
+    assert (b["total_rows"], b["invalid_rows"]) == (3, 0)
+    assert a["columns"]["etat"]["canonicalized"] == 1
+    assert b["columns"]["etat"]["canonicalized"] == 0
+    assert a["invalid_row_indexes"] == {"reference_manquante": [1]}
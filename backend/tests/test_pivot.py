@@ -0,0 +1,39 @@
+from src.app.routes.file_data import PIVOT_OTHER_LABEL, pivot_axis, pivot_label
+
+
+def test_pivot_axis_orders_by_rank():
+    entries = [("b", False, 2), ("a", False, 1), ("b", False, 2), ("c", False, 3), ("a", False, 1)]
+
+    assert pivot_axis(entries, chronological=False) == [("a", False), ("b", False), ("c", False)]
+
+
+def test_pivot_axis_orders_periods_chronologically():
+    entries = [("2024-03", False, 1), ("2024-01", False, 3), ("2024-02", False, 2)]
+
+    assert pivot_axis(entries, chronological=True) == [
+        ("2024-01", False), ("2024-02", False), ("2024-03", False),
+    ]
+
+
+def test_pivot_axis_puts_other_bucket_last():
+    entries = [(None, True, 3), ("b", False, 2), (None, True, 4), ("a", False, 1)]
+
+    assert pivot_axis(entries, chronological=False) == [("a", False), ("b", False), (None, True)]
+    assert pivot_axis(entries, chronological=True) == [("a", False), ("b", False), (None, True)]
+
+
+def test_pivot_axis_keeps_null_label_apart_from_other_bucket():
+    entries = [(None, False, 2), ("a", False, 1), (None, True, 3)]
+
+    assert pivot_axis(entries, chronological=False) == [("a", False), (None, False), (None, True)]
+
+
+def test_pivot_axis_empty():
+    assert pivot_axis([], chronological=False) == []
+
+
+def test_pivot_label():
+    assert pivot_label(("En cours", False)) == "En cours"
+    assert pivot_label((2024, False)) == "2024"
+    assert pivot_label((None, False)) == "Non défini"
+    assert pivot_label((None, True)) == PIVOT_OTHER_LABEL
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from src.utils import profiling
+from src.utils.profiling import MAX_BATCH_STATEMENT_LENGTH, SlowQueryRecorder, is_explainable
+
+
+def test_is_explainable():
+    assert is_explainable("SELECT id FROM file_data WHERE file_name = %(file_name)s")
+    assert is_explainable("WITH codes AS (SELECT 1) SELECT * FROM codes")
+    assert not is_explainable("INSERT INTO file_data (reference) VALUES (%(reference)s)")
+    assert not is_explainable("WITH d AS (DELETE FROM file_data RETURNING id) SELECT count(*) FROM d")
+    assert not is_explainable("SELECT pg_notify('file_data_events', %(payload)s)")
+    assert not is_explainable("SELECT nextval('file_data_id_seq')")
+    assert not is_explainable("SELECT id FROM file_data FOR UPDATE")
+
+
+def record_slow_query(monkeypatch, statement, parameters, context=None, executemany=False):
+    recorder = SlowQueryRecorder(10)
+    monkeypatch.setattr(profiling, "slow_query_recorder", recorder)
+    monkeypatch.setattr(profiling, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(profiling, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0)
+    connection = SimpleNamespace(info={})
+    profiling._before_cursor_execute(connection, None, statement, parameters, context, executemany)
+    profiling._after_cursor_execute(connection, None, statement, parameters, context, executemany)
+    return recorder.entries()[0]
+
+
+def test_records_read_parameters(monkeypatch):
+    entry = record_slow_query(monkeypatch, "SELECT id FROM file_data WHERE reference = %(reference)s", {"reference": "R1"})
+
+    assert entry["parameters"] == {"reference": "R1"}
+
+
+def test_summarizes_insertmanyvalues_batches(monkeypatch):
+    values = ", ".join(f"(%(reference__{i})s)" for i in range(500))
+    parameters = {f"reference__{i}": f"R{i}" for i in range(500)}
+    context = SimpleNamespace(execute_style=ExecuteStyle.INSERTMANYVALUES)
+    entry = record_slow_query(monkeypatch, f"INSERT INTO file_data (reference) VALUES {values}", parameters, context)
+
+    assert entry["parameters"] == {"values": 500}
+    assert len(entry["statement"]) <= MAX_BATCH_STATEMENT_LENGTH + 4
+    assert "R1" not in str(entry)
+
+
+def test_summarizes_executemany_batches(monkeypatch):
+    parameters = [{"reference": f"R{i}"} for i in range(3)]
+    entry = record_slow_query(monkeypatch, "INSERT INTO file_data (reference) VALUES (%(reference)s)",
+                              parameters, executemany=True)
+
+    assert entry["parameters"] == {"parameter_sets": 3}
+    assert entry["executemany"] is True
@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from src.utils import replication
+from src.utils.replication import ALL_FILES, ReplayPosition, ReplicaLagMonitor, should_read_from_replica
+
+
+class FakeEngine:
+    """Moteur dont chaque requête renvoie la valeur suivante de `results` (ou lève une exception)."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        self.value = result
+        return self
+
+    def scalar(self):
+        return self.value
+
+
+class Monitor:
+    def __init__(self, healthy):
+        self.healthy = healthy
+
+    def is_healthy(self, engine):
+        return self.healthy
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    def configure(healthy=True, replayed=0):
+        monkeypatch.setattr(replication, "replica_lag_monitor", Monitor(healthy))
+        position = ReplayPosition()
+        position._position = replayed
+        monkeypatch.setattr(replication, "replay_position", position)
+    return configure
+
+
+def test_no_replica_reads_from_primary(routing):
+    routing()
+    assert not should_read_from_replica(FakeEngine(), None)
+
+
+def test_unhealthy_replica_reads_from_primary(routing):
+    routing(healthy=False)
+    primary = FakeEngine()
+    assert not should_read_from_replica(primary, FakeEngine(), "a.csv")
+    assert primary.statements == []
+
+
+def test_file_never_written_reads_from_replica(routing):
+    routing()
+    primary = FakeEngine(None)
+    assert should_read_from_replica(primary, FakeEngine(), "a.csv")
+    assert primary.statements[0][1] == {"file_name": "a.csv"}
+
+
+@pytest.mark.parametrize("file_name", [None, "all"])
+def test_unfiltered_read_waits_for_every_write(routing, file_name):
+    routing()
+    primary = FakeEngine(None)
+    should_read_from_replica(primary, FakeEngine(), file_name)
+    assert primary.statements[0][1] == {"file_name": ALL_FILES}
+
+
+def test_read_your_writes(routing):
+    routing(replayed=100)
+    # Déjà rejoué d'après la position connue: le réplica n'est pas interrogé
+    replica = FakeEngine()
+    assert should_read_from_replica(FakeEngine(100), replica, "a.csv")
+    assert replica.statements == []
+
+    # Écriture plus récente pas encore rejouée
+    assert not should_read_from_replica(FakeEngine(150), FakeEngine(120), "a.csv")
+    # Rejouée depuis
+    assert should_read_from_replica(FakeEngine(150), FakeEngine(160), "a.csv")
+    assert replication.replay_position._position == 160
+
+
+def test_replay_position_on_primary_is_always_visible():
+    # REPLAY_POSITION_QUERY renvoie NULL quand le serveur n'est pas un standby
+    assert ReplayPosition().has_replayed(FakeEngine(None), 10)
+
+
+def test_unknown_write_mark_reads_from_primary(routing):
+    routing()
+    assert not should_read_from_replica(FakeEngine(RuntimeError("primaire injoignable")), FakeEngine(), "a.csv")
+    assert not should_read_from_replica(FakeEngine(150), FakeEngine(RuntimeError("réplica injoignable")), "a.csv")
+
+
+@pytest.mark.parametrize("lag, healthy", [(0, True), (5.0, True), (5.5, False), (None, False)])
+def test_monitor_compares_lag(lag, healthy):
+    monitor = ReplicaLagMonitor(max_lag_seconds=5, check_interval=60)
+    assert monitor.is_healthy(FakeEngine(lag)) is healthy
+
+
+def test_monitor_unreachable_replica_is_unhealthy():
+    monitor = ReplicaLagMonitor(max_lag_seconds=5, check_interval=60)
+    assert not monitor.is_healthy(FakeEngine(OSError("connexion refusée")))
+
+
+def test_monitor_caches_measure(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replication.time, "monotonic", lambda: now[0])
+    monitor = ReplicaLagMonitor(max_lag_seconds=5, check_interval=10)
+    replica = FakeEngine(0, 30)
+
+    assert monitor.is_healthy(replica)
+    now[0] += 5
+    assert monitor.is_healthy(replica)
+    assert len(replica.statements) == 1
+
+    now[0] += 10
+    assert not monitor.is_healthy(replica)
+    assert len(replica.statements) == 2
+
+
+def test_monitor_measures_in_one_thread_at_a_time(monkeypatch):
+    monitor = ReplicaLagMonitor(max_lag_seconds=5, check_interval=10)
+    measuring, release = threading.Event(), threading.Event()
+
+    def slow_measure(engine):
+        measuring.set()
+        release.wait(5)
+        return 0.0
+
+    monkeypatch.setattr(monitor, "measure_lag", slow_measure)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(monitor.is_healthy(None)))
+    thread.start()
+    assert measuring.wait(5)
+
+    # Pendant la mesure, les autres requêtes utilisent le résultat précédent (aucun: primaire)
+    monkeypatch.setattr(monitor, "measure_lag", lambda engine: pytest.fail("mesure concurrente"))
+    assert not monitor.is_healthy(None)
+
+    release.set()
+    thread.join(5)
+    assert results == [True]
+    assert monitor.is_healthy(None)
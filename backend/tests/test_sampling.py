@@ -0,0 +1,59 @@
+import random
+
+from src.utils import sampling
+from src.utils.sampling import choose_method, reservoir_sample
+
+
+def test_reservoir_sample_is_deterministic_for_a_seed():
+    first, _ = reservoir_sample(range(10_000), 20, random.Random(42))
+    second, _ = reservoir_sample(range(10_000), 20, random.Random(42))
+    other, _ = reservoir_sample(range(10_000), 20, random.Random(7))
+
+    assert first == second
+    assert first != other
+
+
+def test_reservoir_sample_size_and_count():
+    sample, count = reservoir_sample(iter(range(1_000)), 50, random.Random(1))
+
+    assert len(sample) == 50
+    assert len(set(sample)) == 50
+    assert set(sample) <= set(range(1_000))
+    assert count == 1_000
+
+
+def test_reservoir_sample_smaller_population():
+    sample, count = reservoir_sample(["a", "b", "c"], 10, random.Random(1))
+
+    assert sample == ["a", "b", "c"]
+    assert count == 3
+
+
+def test_reservoir_sample_empty_stream():
+    assert reservoir_sample([], 5, random.Random(1)) == ([], 0)
+
+
+def test_reservoir_sample_is_uniform():
+    hits = [0] * 10
+    rng = random.Random(3)
+    for _ in range(5_000):
+        sample, _ = reservoir_sample(range(10), 3, rng)
+        for value in sample:
+            hits[value] += 1
+
+    # Chaque valeur est retenue avec une probabilité de 3/10
+    assert all(abs(count / 5_000 - 0.3) < 0.03 for count in hits)
+
+
+def test_choose_method(monkeypatch):
+    monkeypatch.setattr(sampling, "SAMPLE_EXACT_THRESHOLD", 1_000)
+    monkeypatch.setattr(sampling, "SAMPLE_INDEX_SELECTIVITY", 0.1)
+
+    # Petit sous-ensemble: exact
+    assert choose_method(500, 1_000_000) == "reservoir"
+    # Filtre sélectif (un fichier): lu via les index plutôt que toute la table
+    assert choose_method(50_000, 1_000_000) == "reservoir"
+    # Grand sous-ensemble: tirage ligne par ligne, jamais par pages
+    assert choose_method(500_000, 1_000_000) == "bernoulli"
+    # Table jamais analysée
+    assert choose_method(500_000, 0) == "bernoulli"